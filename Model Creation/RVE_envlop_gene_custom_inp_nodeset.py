@@ -1,257 +1,307 @@
 # code to create an envelope and RVE around an inp file for enrichment homogenization
 
 
+import argparse
 import gmsh
-import math
 import os
+import shutil
 import sys
-import re
-from tkinter import Tk     # from tkinter import Tk for Python 3.x
-from tkinter.filedialog import askopenfilenames
-from tkinter.filedialog import askdirectory
-from create_model_inp import main_combine
-
-class NodeData:
-    def __init__(self):
-        self.nodes = {}
-        self.minpos = [float('inf')] * 3  # Initialized to a very large value
-        self.maxpos = [float('-inf')] * 3
-
-    def add_node(self, node_id, coordinates):
-        self.nodes[node_id] = coordinates
-        coord = list(coordinates)
-        for i in range(3):
-            # Update minpos for each coordinate
-            if self.minpos[i] > coord[i]:
-                self.minpos[i] = coord[i]
-            # Update maxpos for each coordinate
-            if self.maxpos[i] < coord[i]:
-                self.maxpos[i] = coord[i]
-       
-          
-def main(ep, density, dimension, mat_def):
+import numpy as np
+from create_model_inp import main_combine, parse_file
+from boundary_nodesets import AXES, edge_and_corner_sets, write_nsets
+from envelope_cache import EnvelopeCache, cache_key
+
+
+def outer_faces(lo, hi, ep):
+    """Surface tags of the faces of the box [lo, hi]: {(axis, 'MIN'/'MAX'): [tags]}"""
+    eps = 1e-3*min(hi[k]-lo[k] for k in range(3))
+    if ep > 0:
+        eps = min(eps, 0.5*ep)  # the inner box faces are ep away
+    faces = {}
+    for k in range(3):
+        for bound, value in (('MIN', lo[k]), ('MAX', hi[k])):
+            a = [lo[i]-eps for i in range(3)]
+            b = [hi[i]+eps for i in range(3)]
+            a[k] = value-eps
+            b[k] = value+eps
+            faces[(k, bound)] = [tag for dim, tag in gmsh.model.getEntitiesInBoundingBox(*a, *b, 2)]
+    return faces
+
+
+def set_periodic_faces(faces, lo, hi):
+    """Mesh each NMAX face as the copy of the NMIN face translated by the period"""
+    for k in range(3):
+        translation = [1, 0, 0, 0,   0, 1, 0, 0,   0, 0, 1, 0,   0, 0, 0, 1]
+        translation[4*k+3] = hi[k]-lo[k]
+        gmsh.model.mesh.setPeriodic(2, faces[(k, 'MAX')], faces[(k, 'MIN')], translation)
+
+
+def face_node_sets(faces):
+    """NMINX..NMAXZ from the nodes of the face entities, plus edges and corners"""
+    sets = {}
+    for k in range(3):
+        for bound in ('MIN', 'MAX'):
+            tags = [gmsh.model.mesh.getNodes(2, t, includeBoundary=True)[0] for t in faces[(k, bound)]]
+            sets['N' + bound + AXES[k]] = np.unique(np.concatenate(tags)).astype(np.int64)
+    sets.update(edge_and_corner_sets(sets))
+    return sets
+
+
+def periodic_pairs(faces):
+    """{axis: (master, slave)} node tables of the periodic faces as reported by gmsh"""
+    pairs = {}
+    for k in range(3):
+        masters = []
+        slaves = []
+        for t in faces[(k, 'MAX')]:
+            tag_master, node_tags, master_tags, affine = gmsh.model.mesh.getPeriodicNodes(2, t, True)
+            slaves.append(node_tags)
+            masters.append(master_tags)
+        pairs[k] = (np.concatenate(masters).astype(np.int64), np.concatenate(slaves).astype(np.int64))
+    return pairs
+
+def main(ep, density, dimension, mat_def, equations=False):
+    # tkinter is only needed for the file dialog, not for the headless API
+    from tkinter import Tk     # from tkinter import Tk for Python 3.x
+    from tkinter.filedialog import askopenfilenames
     Tk().withdraw()  # we don't want a full GUI, so keep the root window from appearing
     files = askopenfilenames(filetypes = [('Input files','*.inp')]) #list or not 
-    working_folder = os.path.abspath(os.path.join(files[0],os.pardir))
-    os.chdir(working_folder)
-    for file in files:
-        file = os.path.basename(file)
-        name, ext = os.path.splitext(file)
-    
-        # Create a folder with the same name as the file
-        subfolder_name = name
-        if not os.path.exists(subfolder_name):
-            os.mkdir(subfolder_name)
-        # Move the file into the folder
-        os.rename(file, os.path.join(subfolder_name, file))
-        try:
-            name_orient = name + '-orient.dat'
-            os.rename(name_orient, os.path.join(subfolder_name,name_orient))
-    
-        except:
-            False
-    
-        # name_embedded = 'fiber-1'
-        name_embedded = 'hexagonal'
-        re_number = re.compile(r'(\d*)\s\d*\s\d*\s\d*', re.VERBOSE)
-        re_pos_inp = re.compile(r'\s*\d*\,\s*(\S+\.?\d*)\,\s+(\S+\.?\d*)\,\s+(\S+\.?\d*)', re.VERBOSE)  # inpfile
-        re_pos_msh = re.compile(r'\d*\s(\S+\.?\d*)\s(\S+\.?\d*)\s(\S+\.?\d*)\s0+?',re.VERBOSE) #mshfile
-        re_numset = re.compile(r'(\d+)(?:,)?')
-    
-        with open(subfolder_name+'//'+file, 'r') as f:
-            lines = f.readlines()
-            print(f)
-    
-        is_node_section = False
-        nodes = NodeData()
-        for line in lines:
-            if "*node" in line.lower():
-                is_node_section = True
-            elif "*" in line:  # Any other section
-                is_node_section = False
-            elif is_node_section:
-                parts = line.strip().split(',')
-                node_id = int(parts[0])
-                coords = tuple(map(float, parts[1:]))
-                nodes.add_node(node_id, coords)
-               
-    
-        gmsh.initialize()
-        gmsh.model.add("t18")
-    
-        # Let's use the OpenCASCADE geometry kernel to build two geometries.
-        
-        minp = nodes.minpos
-        maxp = nodes.maxpos
-        print(ep)
-        print(maxp)
-        print(minp)
-    
-        long = maxp[0]-minp[0]
-        larg = maxp[1]-minp[1]
-        haut = maxp[2]-minp[2]
-        indens = density
-        outdens = density
-    
-        outbox = gmsh.model.occ.addBox(0, 0, 0,
-                                       (long+2*ep), (larg+2*ep), (haut+2*ep), 1)
-    
-        gmsh.model.occ.synchronize()
-        gmsh.model.mesh.setSize(gmsh.model.getEntities(0), outdens)
-    
-        # To impose that the mesh on surface 2 (the right side of the cube) should
-        # match the mesh from surface 1 (the left side), the following periodicity
-        # constraint is set:
-        translation = [1, 0, 0, long+2*ep,    0, 1, 0, 0,     0, 0, 1, 0,    0, 0, 0, long+2*ep]
-        gmsh.model.mesh.setPeriodic(2, [2], [1], translation)
-        # The periodicity transform is provided as a 4x4 affine transformation matrix,
-        # given by row.
-    
-        # During mesh generation, the mesh on surface 2 will be created by copying
-        # the mesh from surface 1.
-    
-        # Multiple periodicities can be imposed in the same way:
-        gmsh.model.mesh.setPeriodic(2, [4], [3],
-                                    [1, 0, 0, 0,   0, 1, 0, larg+2*ep,   0, 0, 1, 0,   0, 0, 0, larg+2*ep])
-        gmsh.model.mesh.setPeriodic(2, [6], [5],
-                                    [1, 0, 0, 0,   0, 1, 0, 0,   0, 0, 1, haut+2*ep,   0, 0, 0, haut+2*ep])
-    
-        inbox = gmsh.model.occ.addBox(0, 0, 0, (long), (larg), (haut), 2)
-        gmsh.model.occ.translate([(3, 1)], -ep, -ep, -ep)
-    
-        ov, ovv = gmsh.model.occ.fragment([(3, 2)], [(3, 1)])
-        gmsh.model.occ.translate(ov, minp[0], minp[1], minp[2])
-        gmsh.model.occ.synchronize()
-    
-        gmsh.option.setNumber("Geometry.OCCBoundsUseStl", 1)
-    
-        gmsh.model.addPhysicalGroup(3, [0], 1)
-        gmsh.model.addPhysicalGroup(3, [1], 2)
-    
-        # The tag of the cube will change though, so we need to access it
-        # programmatically:
-    
-        # Override this constraint on the points of the five spheres:
-        gmsh.model.mesh.setSize(gmsh.model.getBoundary([(3, 2)], False, False, True),
-                                indens)
-    
-        transfinite = True
-        transfiniteAuto = True
-    
-        if transfinite:
-            NN = int(10/density)
-            inte = 0
-            for c in gmsh.model.getEntities(1):
-                if inte >= 12:
-                    gmsh.model.mesh.setTransfiniteCurve(c[1], NN)
-                inte = inte+1
-            inte = 0
-            for s in gmsh.model.getEntities(2):
-                if inte >= 6:
-                    gmsh.model.mesh.setTransfiniteSurface(s[1])
-                    # gmsh.model.mesh.setRecombine(s[0], s[1])
-                    # gmsh.model.mesh.setSmoothing(s[0], s[1], 100)
-                inte = inte+1
-    
-        # gmsh.model.occ.synchronize()
-        gmsh.option.setNumber('Mesh.SaveGroupsOfElements', -1001)
-        
-        gmsh.model.mesh.generate(3)
-    
-    
-    
-        filepath_inp = os.path.join(working_folder, subfolder_name, '%s-VER.inp' %(name))
-        filepath_txt = os.path.join(working_folder, subfolder_name, '%s.e2a' %(name))
-    
-        gmsh.write(filepath_inp)
-        #gmsh.write('C://temp//%s-VER.msh' %(name))
-    
-        with open(filepath_txt, 'w') as f:
-            #f.writelines('%s.inp' %(name)+ '\n')
-            #f.writelines('%s-VER.inp' %(name) + '\n')
-            #f.writelines('%s-VER.inp' %(name)) for orient purpose
-            f.writelines(str(long)+'\n')
-            f.writelines(str(larg)+'\n')
-            f.writelines(str(haut)+'\n')
-            f.writelines(str(ep)+'\n')
-            f.writelines(str(maxp[0])+'\n')
-            f.writelines(str(minp[0])+'\n')
-            f.writelines(str(maxp[1])+'\n')
-            f.writelines(str(minp[1])+'\n')
-            f.writelines(str(maxp[2])+'\n')
-            f.writelines(str(minp[2])+'\n')
-    
-        top = []
-        bottom = []
-        front = []
-        back = []
-        left = []
-        right = []
-    
-        nodesetname = ['maxy', 'miny', 'minz', 'maxz', 'maxx', 'minx']
-    
-        with open(filepath_inp, "r") as f:
-            lines = f.readlines()
-            x = []
-            y = []
-            z = []
-            indl = 3
-            pos = re_pos_inp.search(lines[indl])
-            while pos != None:
-                x.append(float(pos.group(1)))
-                y.append(float(pos.group(2)))
-                z.append(float(pos.group(3)))
-    
-                if math.isclose(x[-1], minp[0]-ep, rel_tol=1e-8):
-                    right.append(indl-2)
-                elif math.isclose(x[-1], maxp[0]+ep, rel_tol=1e-8):
-                    left.append(indl-2)
-                if math.isclose(y[-1], minp[1]-ep, rel_tol=1e-8):
-                    bottom.append(indl-2)
-                elif math.isclose(y[-1], maxp[1]+ep, rel_tol=1e-8):
-                    top.append(indl-2)
-                if math.isclose(z[-1], minp[2]-ep, rel_tol=1e-8):
-                    front.append(indl-2)
-                elif math.isclose(z[-1], maxp[2]+ep, rel_tol=1e-8):
-                    back.append(indl-2)
-                indl = indl+1
-                pos = re_pos_inp.search(lines[indl])
-    
-        nodelist = [top, bottom, front, back, left, right]
-    
-        lite = 0
-        listite = 0
-        lv = 4
-        for list in nodelist:
-            lines.insert(indl+lite, '*NSET,NSET=N%s\n' % nodesetname[listite])
-            for i in range(math.ceil(len(list)/lv)):
-                val = str(list[lv*i:min(len(list),lv*(i+1))])
-                if val != '[]':
-                    lines.insert(indl+lite+1, val[1:len(val)-1]+',\n')
-                    lite = lite + 1
-            lite = lite + 1
-            listite = listite + 1
-            
-        mat_name = ['Matrix', 'Embedded']
-        i=-1
-        with open(filepath_inp, "w") as f:
-            
-            contents = "".join(lines)
-            f.write(contents)
-            f.writelines('**\n** MATERIALS\n**')
-            for key in mat_def.keys():
-                i = i+1
-                f.writelines('\n*Material, name=%s\n' %mat_name[i])
-                if 'Elastic' in key:
-                    f.writelines('*Elastic\n')
-                elif 'Eng constant' in key:
-                    f.writelines('*Elastic, type=ENGINEERING CONSTANTS\n')
-                elif 'Orthotropic' in key:
-                    f.writelines('*Elastic, type=ORTHOTROPIC\n')
-                f.writelines(', '.join(mat_def[key]))
+    generate_envelope(files, ep, density, dimension, mat_def, equations=equations)
+
+
+def generate_envelope(paths, ep, density, dimension, mat_def, out_dir=None, equations=False, threads=0,
+                      cache=None):
+    """Headless entry point: build the envelope, VER mesh and model of each file.
+
+    Without out_dir every input is moved into a folder named after it, next
+    to it (the GUI behaviour). With out_dir the inputs are copied into
+    out_dir/<name>/ and left in place. The working directory is never
+    changed. Returns the paths of the -model.inp files.
+    """
+    if isinstance(paths, str):
+        paths = [paths]
+    return [process_file(path, ep, density, dimension, mat_def, equations, threads, out_dir, cache)
+            for path in paths]
+
+
+def process_file(file_path, ep, density, dimension, mat_def, equations=False, threads=0, out_dir=None,
+                 cache=None):
+    """Envelope, VER mesh and combined model of one embedded .inp.
+
+    threads > 0 sets the number of threads gmsh may use (batch workers).
+    With an EnvelopeCache the VER mesh, .e2a and node sets are reused when
+    the same box, ep, density and dimension were already meshed.
+    """
+    working_folder = os.path.dirname(os.path.abspath(file_path))
+    file = os.path.basename(file_path)
+    name, ext = os.path.splitext(file)
+
+    # Create a folder with the same name as the file
+    subfolder_name = os.path.join(os.path.abspath(out_dir) if out_dir else working_folder, name)
+    if not os.path.exists(subfolder_name):
+        os.makedirs(subfolder_name)
+    # Move (or copy to out_dir) the file and its orientations into the folder
+    transfer = shutil.copy if out_dir else os.rename
+    transfer(os.path.join(working_folder, file), os.path.join(subfolder_name, file))
+    try:
+        name_orient = name + '-orient.dat'
+        transfer(os.path.join(working_folder, name_orient), os.path.join(subfolder_name,name_orient))
+
+    except:
+        False
+
+    # name_embedded = 'fiber-1'
+    name_embedded = 'hexagonal'
+
+    nodes, material = parse_file(os.path.join(subfolder_name, file), nodes_only=True)
+    if len(nodes.node_ids) == 0:
+        raise ValueError('No *Node data in %s' % file_path)
+
+    minp = nodes.minpos
+    maxp = nodes.maxpos
+    print(ep)
+    print(maxp)
+    print(minp)
+
+    filepath_inp = os.path.join(subfolder_name, '%s-VER.inp' %(name))
+    filepath_txt = os.path.join(subfolder_name, '%s.e2a' %(name))
+
+    entry = None
+    if cache is not None:
+        key, params = cache_key(minp, maxp, ep, density, dimension, gmsh.__version__)
+        entry = cache.get(key)
+    if entry is not None:
+        print('VER mesh %s reused from %s' % (key[:12], cache.root))
+        shutil.copy(entry['mesh'], filepath_inp)
+        shutil.copy(entry['e2a'], filepath_txt)
+        nodesets = entry['nodesets']
+        pairs = entry['pairs']
+    else:
+        nodesets, pairs = mesh_ver(minp, maxp, ep, density, filepath_inp, filepath_txt, threads)
+        if cache is not None:
+            cache.put(key, params, filepath_inp, filepath_txt, nodesets, pairs)
+
+    mat_name = ['Matrix', 'Embedded']
+    i=-1
+    with open(filepath_inp, "a") as f:
+        write_nsets(f, nodesets)
+        f.writelines('**\n** MATERIALS\n**')
+        for key in mat_def.keys():
+            i = i+1
+            f.writelines('\n*Material, name=%s\n' %mat_name[i])
+            if 'Elastic' in key:
+                f.writelines('*Elastic\n')
+            elif 'Eng constant' in key:
+                f.writelines('*Elastic, type=ENGINEERING CONSTANTS\n')
+            elif 'Orthotropic' in key:
+                f.writelines('*Elastic, type=ORTHOTROPIC\n')
+            f.writelines(', '.join(mat_def[key]))
+
+    main_combine(os.path.join(subfolder_name, file),filepath_inp,equations=equations,pairs=pairs)
+    return os.path.join(subfolder_name, '%s-model.inp' %(name))
+
+
+def mesh_ver(minp, maxp, ep, density, filepath_inp, filepath_txt, threads=0):
+    """gmsh mesh of the envelope box around [minp, maxp] written to filepath_inp,
+    dimensions written to the .e2a; returns the boundary node sets and the
+    periodic pair tables"""
+    gmsh.initialize()
+    if threads > 0:
+        gmsh.option.setNumber("General.NumThreads", threads)
+    gmsh.model.add("t18")
+
+    # Let's use the OpenCASCADE geometry kernel to build two geometries.
+
+    long = maxp[0]-minp[0]
+    larg = maxp[1]-minp[1]
+    haut = maxp[2]-minp[2]
+    indens = density
+    outdens = density
+
+    outbox = gmsh.model.occ.addBox(0, 0, 0,
+                                   (long+2*ep), (larg+2*ep), (haut+2*ep), 1)
+
+    gmsh.model.occ.synchronize()
+    gmsh.model.mesh.setSize(gmsh.model.getEntities(0), outdens)
+
+    inbox = gmsh.model.occ.addBox(0, 0, 0, (long), (larg), (haut), 2)
+    gmsh.model.occ.translate([(3, 1)], -ep, -ep, -ep)
+
+    ov, ovv = gmsh.model.occ.fragment([(3, 2)], [(3, 1)])
+    gmsh.model.occ.translate(ov, minp[0], minp[1], minp[2])
+    gmsh.model.occ.synchronize()
+
+    # The periodicity is imposed on the faces of the fragmented outer box
+    # (the fragment renumbers the surfaces): the mesh of each NMAX face is
+    # created by copying the mesh of the opposite NMIN face.
+    lo = [minp[k]-ep for k in range(3)]
+    hi = [maxp[k]+ep for k in range(3)]
+    faces = outer_faces(lo, hi, ep)
+    set_periodic_faces(faces, lo, hi)
+    slave_faces = [t for k in range(3) for t in faces[(k, 'MAX')]]
+
+    gmsh.option.setNumber("Geometry.OCCBoundsUseStl", 1)
+
+    gmsh.model.addPhysicalGroup(3, [0], 1)
+    gmsh.model.addPhysicalGroup(3, [1], 2)
+
+    # The tag of the cube will change though, so we need to access it
+    # programmatically:
+
+    # Override this constraint on the points of the five spheres:
+    gmsh.model.mesh.setSize(gmsh.model.getBoundary([(3, 2)], False, False, True),
+                            indens)
+
+    transfinite = True
+    transfiniteAuto = True
+
+    if transfinite:
+        NN = int(10/density)
+        inte = 0
+        for c in gmsh.model.getEntities(1):
+            if inte >= 12:
+                gmsh.model.mesh.setTransfiniteCurve(c[1], NN)
+            inte = inte+1
+        inte = 0
+        for s in gmsh.model.getEntities(2):
+            if inte >= 6 and s[1] not in slave_faces:  # slave faces are copies
+                gmsh.model.mesh.setTransfiniteSurface(s[1])
+                # gmsh.model.mesh.setRecombine(s[0], s[1])
+                # gmsh.model.mesh.setSmoothing(s[0], s[1], 100)
+            inte = inte+1
+
+    # gmsh.model.occ.synchronize()
+    gmsh.option.setNumber('Mesh.SaveGroupsOfElements', -1001)
     
-        gmsh.finalize()
-        main_combine(os.path.join(subfolder_name, file),filepath_inp)
+    gmsh.model.mesh.generate(3)
+
+
+
+    gmsh.write(filepath_inp)
+    #gmsh.write('C://temp//%s-VER.msh' %(name))
+
+    with open(filepath_txt, 'w') as f:
+        #f.writelines('%s.inp' %(name)+ '\n')
+        #f.writelines('%s-VER.inp' %(name) + '\n')
+        #f.writelines('%s-VER.inp' %(name)) for orient purpose
+        f.writelines(str(long)+'\n')
+        f.writelines(str(larg)+'\n')
+        f.writelines(str(haut)+'\n')
+        f.writelines(str(ep)+'\n')
+        f.writelines(str(maxp[0])+'\n')
+        f.writelines(str(minp[0])+'\n')
+        f.writelines(str(maxp[1])+'\n')
+        f.writelines(str(minp[1])+'\n')
+        f.writelines(str(maxp[2])+'\n')
+        f.writelines(str(minp[2])+'\n')
+
+    # boundary node sets and periodic node pairs straight from gmsh
+    nodesets = face_node_sets(faces)
+    pairs = periodic_pairs(faces)
+    gmsh.finalize()
+    return nodesets, pairs
+
+
+
+def add_arguments(parser):
+    """Options shared by the command line of the generator and of the batch mode"""
+    parser.add_argument('inputs', nargs='+', help='embedded .inp files')
+    parser.add_argument('--ep', type=float, required=True, help='envelope thickness')
+    parser.add_argument('--density', type=float, required=True, help='mesh density')
+    parser.add_argument('--dimension', default='3D')
+    parser.add_argument('--material', nargs='+', action='append', required=True,
+                        metavar=('TYPE', 'VALUE'),
+                        help='matrix then embedded material, e.g. --material Elastic 3000 0.3')
+    parser.add_argument('--out-dir', default=None,
+                        help='write the models in OUT_DIR/<name>/ (inputs are copied, not moved)')
+    parser.add_argument('--equations', action='store_true', help='write the periodic *Equation blocks')
+    parser.add_argument('--cache', nargs='?', const='', default=None, metavar='DIR',
+                        help='reuse VER meshes from the cache (default folder if DIR is omitted)')
+    parser.add_argument('--cache-size', type=float, default=5000., help='cache size cap in MB')
+
+
+def cache_from_args(args):
+    if args.cache is None:
+        return None
+    return EnvelopeCache(args.cache or None, args.cache_size * 1024**2)
+
+
+def material_definition(materials):
+    """[[type, values...], ...] -> mat_def with the GUI keys (material type + index)"""
+    mat_def = {}
+    for i, material in enumerate(materials):
+        mat_def[material[0] + str(i+1)] = material[1:]
+    return mat_def
+
+
+def cli():
+    parser = argparse.ArgumentParser(description='Generate the envelope and VER model of embedded .inp files')
+    add_arguments(parser)
+    parser.add_argument('--gmsh-threads', type=int, default=0, help='gmsh threads (0: gmsh default)')
+    args = parser.parse_args()
+    generate_envelope(args.inputs, args.ep, args.density, args.dimension,
+                      material_definition(args.material), args.out_dir, args.equations, args.gmsh_threads,
+                      cache_from_args(args))
         
 
 #ep = float(sys.argv[1])
@@ -265,4 +315,7 @@ def main(ep, density, dimension, mat_def):
 #        files.remove(file)
 # add a check to remove any file named Job-XX.inp
 
-#main(working_folder,files,ep,density,dimension)
\ No newline at end of file
+#main(working_folder,files,ep,density,dimension)
+
+if __name__ == '__main__':
+    cli()
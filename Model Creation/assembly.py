@@ -0,0 +1,55 @@
+# Vectorized stiffness assembly of the RVE decks: the elements of each block
+# (CPS3, CPS4R, C3D4, C3D8) are grouped by material, their stiffness computed
+# in batches by fe_elements.batch_stiffness, and the COO triplets of the whole
+# mesh are written at once into preallocated arrays.
+
+import numpy as np
+import scipy.sparse as sp
+
+from fe_elements import batch_stiffness
+
+CHUNK = 20000  # elements per batch_stiffness call, bounding its (m, strains, d*n) temporaries
+
+
+def group_stiffness(family, xe, names, D):
+    """Stiffness (m, nd, nd) and volumes (m) of the elements of one block.
+
+    names is the material of each element (MATRIX, ENRICH, EMBEDDED, VOID...)
+    and D the elasticity matrix of each material name.
+    """
+    m, n, d = xe.shape
+    ke = np.empty((m, n*d, n*d))
+    volume = np.empty(m)
+    for name in sorted(set(names)):
+        elements = np.nonzero(np.equal(names, name))[0]
+        for start in range(0, len(elements), CHUNK):
+            part = elements[start:start + CHUNK]
+            ke[part], volume[part] = batch_stiffness(family, xe[part], D[name])
+    return ke, volume
+
+
+def coo_triplets(blocks, ndof):
+    """(rows, cols, values) of the element matrices [(element DOFs (m, nd), stiffness (m, nd, nd))].
+
+    The indices are int32 when the DOF count allows it.
+    """
+    index = np.int32 if ndof < 2**31 else np.int64
+    total = sum(ke.size for dofs, ke in blocks)
+    rows = np.empty(total, dtype=index)
+    cols = np.empty(total, dtype=index)
+    vals = np.empty(total)
+    start = 0
+    for dofs, ke in blocks:
+        m, nd = dofs.shape
+        stop = start + ke.size
+        rows[start:stop].reshape(m, nd, nd)[...] = dofs[:, :, None]
+        cols[start:stop].reshape(m, nd, nd)[...] = dofs[:, None, :]
+        vals[start:stop] = ke.ravel()
+        start = stop
+    return rows, cols, vals
+
+
+def assemble_csr(blocks, ndof):
+    """Global (ndof, ndof) CSR matrix of the element matrices, duplicates summed"""
+    rows, cols, vals = coo_triplets(blocks, ndof)
+    return sp.coo_matrix((vals, (rows, cols)), shape=(ndof, ndof)).tocsr()
@@ -0,0 +1,114 @@
+# Batch generation of enveloped VER models: every embedded .inp is processed
+# by its own worker process, with gmsh limited to its share of the cores
+
+import argparse
+import glob
+import multiprocessing
+import os
+import time
+import traceback
+
+import gmsh
+from RVE_envlop_gene_custom_inp_nodeset import process_file, add_arguments, material_definition, cache_from_args
+
+
+def collect_inputs(patterns):
+    """Embedded .inp files matching the paths/globs, generated decks left out"""
+    files = []
+    for pattern in patterns:
+        matches = glob.glob(pattern) if glob.has_magic(pattern) else [pattern]
+        for path in matches:
+            name = os.path.basename(path)
+            if name.endswith('-VER.inp') or name.endswith('-model.inp'):
+                continue
+            path = os.path.abspath(path)
+            if path not in files:
+                files.append(path)
+    return sorted(files)
+
+
+def _run_one(task):
+    """Worker: process one file, never raise, report the elapsed time"""
+    file_path, ep, density, dimension, mat_def, equations, threads, out_dir, cache = task
+    start = time.time()
+    result = {'file': file_path, 'status': 'ok', 'seconds': 0., 'error': ''}
+    try:
+        process_file(file_path, ep, density, dimension, mat_def, equations, threads, out_dir, cache)
+    except Exception:
+        result['status'] = 'failed'
+        result['error'] = traceback.format_exc()
+        if gmsh.isInitialized():
+            gmsh.finalize()
+    result['seconds'] = time.time() - start
+    return result
+
+
+def run_batch(patterns, ep, density, dimension, mat_def, processes=None,
+              gmsh_threads=None, equations=False, out_dir=None, cache=None):
+    """Generate the envelope of every input file in parallel.
+
+    processes defaults to the number of cores (at most one per file) and
+    gmsh_threads to the cores left to each worker, so the machine is not
+    oversubscribed. Returns one result dict per file (file, status,
+    seconds, error) and prints a summary.
+    """
+    files = collect_inputs(patterns)
+    if not files:
+        print('No input file found')
+        return []
+    cpus = multiprocessing.cpu_count()
+    if processes is None:
+        processes = cpus
+    processes = max(1, min(processes, len(files)))
+    if gmsh_threads is None:
+        gmsh_threads = max(1, cpus // processes)
+    print('%d files, %d workers, %d gmsh threads per worker' % (len(files), processes, gmsh_threads))
+
+    tasks = [(f, ep, density, dimension, mat_def, equations, gmsh_threads, out_dir, cache) for f in files]
+    start = time.time()
+    results = []
+    if processes == 1:
+        for task in tasks:
+            results.append(_run_one(task))
+    else:
+        # one task per worker process: gmsh state never leaks between files
+        pool = multiprocessing.Pool(processes, maxtasksperchild=1)
+        try:
+            for result in pool.imap_unordered(_run_one, tasks):
+                print('%-6s %8.1f s  %s' % (result['status'], result['seconds'], result['file']))
+                results.append(result)
+        finally:
+            pool.close()
+            pool.join()
+    results.sort(key=lambda r: files.index(r['file']))
+    print_summary(results, time.time() - start)
+    return results
+
+
+def print_summary(results, wall_time):
+    failed = [r for r in results if r['status'] != 'ok']
+    print('\n%-50s %-8s %10s' % ('File', 'Status', 'Time [s]'))
+    for r in results:
+        print('%-50s %-8s %10.1f' % (os.path.basename(r['file']), r['status'], r['seconds']))
+    total = sum(r['seconds'] for r in results)
+    print('%d files, %d failed, %.1f s of work in %.1f s' % (len(results), len(failed), total, wall_time))
+    for r in failed:
+        print('\n--- %s ---\n%s' % (r['file'], r['error']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate the envelope and VER model of many embedded .inp files')
+    add_arguments(parser)
+    parser.add_argument('--processes', type=int, default=None, help='number of worker processes')
+    parser.add_argument('--gmsh-threads', type=int, default=None, help='gmsh threads per worker')
+    args = parser.parse_args()
+
+    results = run_batch(args.inputs, args.ep, args.density, args.dimension,
+                        material_definition(args.material), args.processes, args.gmsh_threads,
+                        args.equations, args.out_dir, cache_from_args(args))
+    if any(r['status'] != 'ok' for r in results):
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+# Micro-benchmark of the vectorized assembly (assembly.py) on structured meshes
+# of 10k, 100k and 1M elements, against the per-element loop it replaces
+# (timed on a sample and extrapolated).
+#
+#     python benchmark_assembly.py --family tet4 --sizes 10000 100000 1000000
+
+import argparse
+import time
+import numpy as np
+
+from assembly import group_stiffness, assemble_csr
+from fe_elements import NODES, element_volumes, elastic_matrix, plane_stress, gauss_points, shape_functions, \
+    strain_matrix
+
+DIMENSION = {'tri3': 2, 'quad4': 2, 'tet4': 3, 'hex8': 3}
+# elements per grid cell and their corners, cells numbered by their bit pattern (x + 2y + 4z)
+CELL_SPLIT = {
+    'quad4': [[0, 1, 3, 2]],
+    'tri3': [[0, 1, 3], [0, 3, 2]],
+    'hex8': [[0, 1, 3, 2, 4, 5, 7, 6]],
+    'tet4': [[0, 1, 3, 7], [0, 3, 2, 7], [0, 2, 6, 7], [0, 6, 4, 7], [0, 4, 5, 7], [0, 5, 1, 7]],
+}
+SAMPLE = 2000  # elements of the timed per-element loop
+
+
+def structured_mesh(family, size):
+    """(node coordinates, connectivity) of about size elements in a unit square or cube"""
+    d = DIMENSION[family]
+    per_cell = len(CELL_SPLIT[family])
+    n = max(1, int(round((size / per_cell) ** (1. / d))))
+    grid = np.stack(np.meshgrid(*[np.arange(n + 1)] * d, indexing='ij'), axis=-1).reshape(-1, d)
+    coords = grid / float(n)
+    stride = (n + 1) ** np.arange(d)[::-1]
+    cells = np.stack(np.meshgrid(*[np.arange(n)] * d, indexing='ij'), axis=-1).reshape(-1, d)
+    bits = (np.arange(2**d)[:, None] >> np.arange(d)) & 1  # offsets (x, y, z) of the corner k of a cell
+    corners = np.dot(cells[:, None, :] + bits[None], stride)  # (cells, 2**d)
+    conn = np.concatenate([corners[:, split] for split in CELL_SPLIT[family]])
+    if family in ('tri3', 'tet4'):
+        # positive orientation
+        xe = coords[conn]
+        edges = xe[:, 1:] - xe[:, :1]
+        flip = np.linalg.det(edges) < 0
+        conn[flip, 1], conn[flip, 2] = conn[flip, 2].copy(), conn[flip, 1].copy()
+    return coords, conn
+
+
+def loop_stiffness(family, xe, D):
+    """Per-element loop of the former assembly, for reference"""
+    points, weights = gauss_points(family)
+    N, dN = shape_functions(family, points)
+    for e in range(len(xe)):
+        ke = np.zeros((xe[e].size, xe[e].size))
+        for p in range(len(weights)):
+            J = np.dot(xe[e].T, dN[p])
+            B = strain_matrix(np.dot(dN[p], np.linalg.inv(J)))
+            ke += weights[p] * np.linalg.det(J) * np.dot(B.T, np.dot(D, B))
+
+
+def benchmark(family, size):
+    d = DIMENSION[family]
+    coords, conn = structured_mesh(family, size)
+    m = len(conn)
+    xe = coords[conn]
+    dofs = (conn[:, :, None] * d + np.arange(d)).reshape(m, -1)
+    # two materials, as MATRIX and ENRICH, to go through the material table
+    names = np.where(np.arange(m) % 2 == 0, 'MATRIX', 'ENRICH')
+    D = {}
+    for name, values in (('MATRIX', (1., 0.2)), ('ENRICH', (3., 0.3))):
+        D[name] = elastic_matrix('ISOTROPIC', values)
+        if d == 2:
+            D[name] = plane_stress(D[name])
+
+    start = time.time()
+    ke, volume = group_stiffness(family, xe, names, D)
+    kernel = time.time() - start
+    start = time.time()
+    K = assemble_csr([(dofs, ke)], len(coords) * d)
+    csr = time.time() - start
+    assert np.isclose(volume.sum(), 1.) and np.isclose(element_volumes(family, xe[:10]).sum(), volume[:10].sum())
+
+    sample = min(m, SAMPLE)
+    start = time.time()
+    loop_stiffness(family, xe[:sample], D['MATRIX'])
+    loop = (time.time() - start) * m / sample
+    return m, K.shape[0], kernel, csr, loop
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Micro-benchmark of the vectorized element assembly')
+    parser.add_argument('--family', choices=sorted(NODES), default='tet4')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000],
+                        help='element counts')
+    args = parser.parse_args()
+    print('%10s %10s %12s %12s %14s %8s' % ('elements', 'DOFs', 'kernel (s)', 'CSR (s)', 'loop est. (s)',
+                                          'speedup'))
+    for size in args.sizes:
+        m, ndof, kernel, csr, loop = benchmark(args.family, size)
+        print('%10d %10d %12.3f %12.3f %14.1f %8.0f' % (m, ndof, kernel, csr, loop, loop / kernel))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+# Micro-benchmark of the grid-hash node pairing (pbc_tools.pair_nodes) on
+# opposite faces of 1k, 10k and 100k nodes, against the O(n^2) search of
+# PeriodicBoundary.MakeNodeSetsandEquations it replaces (timed on a sample
+# and extrapolated).
+#
+#     python benchmark_pairing.py --sizes 1000 10000 100000
+
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+PLUGIN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'abaqus_plugin')
+if PLUGIN_DIR not in sys.path:
+    sys.path.append(PLUGIN_DIR)
+from pbc_tools import pair_nodes
+
+SAMPLE = 500  # nodes of set 1 in the timed nested loop
+TOLERANCE = 1e-3
+
+
+def face_nodes(size, seed=0):
+    """Nodes of the faces x = 0 and x = 1 of a unit cube: set 1 in grid order,
+    set 2 shuffled and slightly perturbed, as a free mesh"""
+    n = max(2, int(round(np.sqrt(size))))
+    y, z = np.meshgrid(np.linspace(0., 1., n), np.linspace(0., 1., n), indexing='ij')
+    c1 = np.column_stack([np.zeros(n * n), y.ravel(), z.ravel()])
+    rng = np.random.RandomState(seed)
+    c2 = c1[rng.permutation(n * n)] + [1., 0., 0.]
+    c2[:, 1:] += rng.uniform(-0.1, 0.1, (n * n, 2)) * TOLERANCE
+    return c1, c2
+
+
+def loop_pairs(c1, c2, translation, tol):
+    """Nested loop of the former MakeNodeSetsandEquations, for reference"""
+    free = list(range(len(c2)))
+    pairs = []
+    for i in range(len(c1)):
+        for j in free:
+            c = c2[j] - translation
+            dist = np.sqrt((c1[i][0] - c[0])**2 + (c1[i][1] - c[1])**2 + (c1[i][2] - c[2])**2)
+            if dist < tol:
+                pairs.append((i, j))
+                free.remove(j)
+                break
+    return pairs
+
+
+def benchmark(size):
+    c1, c2 = face_nodes(size)
+    translation = np.array([1., 0., 0.])
+    start = time.time()
+    idx1, idx2 = pair_nodes(c1, c2, translation, TOLERANCE)
+    grid = time.time() - start
+    assert len(idx1) == len(c1)
+
+    sample = min(len(c1), SAMPLE)
+    start = time.time()
+    pairs = loop_pairs(c1[:sample], c2, translation, TOLERANCE)
+    loop = time.time() - start
+    # the loop scans on average half of set 2 per node: quadratic in the face size
+    loop *= (len(c1) / float(sample))
+    assert pairs == list(zip(idx1[:sample].tolist(), idx2[:sample].tolist()))
+    return len(c1), grid, loop
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Micro-benchmark of the periodic node pairing')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help='nodes per face')
+    args = parser.parse_args()
+    print('%10s %12s %14s %8s' % ('nodes', 'grid (s)', 'loop est. (s)', 'speedup'))
+    for size in args.sizes:
+        n, grid, loop = benchmark(size)
+        print('%10d %12.4f %14.1f %8.0f' % (n, grid, loop, loop / grid))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+# Boundary node sets of a box-shaped mesh (VER or RVE) computed on coordinate
+# arrays: the faces NMINX..NMAXZ, the edges and the corners
+
+import itertools
+import numpy as np
+
+AXES = ['X', 'Y', 'Z']
+
+
+def classify_boundary(labels, coords, minpos, maxpos, dimension=3, tol=None):
+    """Sort the boundary nodes of the box [minpos, maxpos] into named sets.
+
+    Returns a dict name -> sorted node labels with
+      - the faces NMINX, NMAXX, NMINY, ... (every node lying on the face),
+      - in 3D the edges, e.g. NMINX_MINY (edge nodes without the corners),
+      - the corners, e.g. NMINX_MINY_MINZ (NMINX_MINY in 2D).
+    A node lies on a face when its coordinate is within tol of the bound;
+    by default tol is 1e-8 times the largest bound, the relative test of
+    math.isclose used by the envelope generator.
+    """
+    labels = np.asarray(labels, dtype=np.int64)
+    coords = np.asarray(coords, dtype=float)[:, :dimension]
+    lo = np.asarray(minpos, dtype=float)[:dimension]
+    hi = np.asarray(maxpos, dtype=float)[:dimension]
+    if tol is None:
+        tol = 1.e-8 * max(np.abs(lo).max(), np.abs(hi).max(), (hi - lo).max())
+
+    sets = {}
+    for k in range(dimension):
+        sets['NMIN' + AXES[k]] = np.sort(labels[np.abs(coords[:, k] - lo[k]) <= tol])
+        sets['NMAX' + AXES[k]] = np.sort(labels[np.abs(coords[:, k] - hi[k]) <= tol])
+    sets.update(edge_and_corner_sets(sets, dimension))
+    return sets
+
+
+def edge_and_corner_sets(faces, dimension=3):
+    """Edges (3D) and corners from the face sets NMINX..NMAXZ.
+
+    A node belongs to the set of len(axes) faces when it lies on exactly
+    these faces: edge sets therefore leave the corners out.
+    """
+    sides = {}
+    for k in range(dimension):
+        for bound in ('MIN', 'MAX'):
+            sides[(k, bound)] = np.asarray(faces['N' + bound + AXES[k]], dtype=np.int64)
+    sets = {}
+    for count in range(2, dimension+1):
+        for axes in itertools.combinations(range(dimension), count):
+            others = [sides[(k, b)] for k in range(dimension) if k not in axes for b in ('MIN', 'MAX')]
+            outside = np.concatenate(others) if others else np.zeros(0, dtype=np.int64)
+            for bounds in itertools.product(('MIN', 'MAX'), repeat=count):
+                common = sides[(axes[0], bounds[0])]
+                for k, b in zip(axes[1:], bounds[1:]):
+                    common = np.intersect1d(common, sides[(k, b)])
+                name = '_'.join(b + AXES[k] for k, b in zip(axes, bounds))
+                sets['N' + name] = np.setdiff1d(common, outside)
+    return sets
+
+
+def format_nsets(sets, per_line=16, instance=None):
+    """*Nset blocks of all the non-empty sets as a single string"""
+    blocks = []
+    option = ', instance=%s' % instance if instance else ''
+    for name, labels in sets.items():
+        if len(labels) == 0:
+            continue
+        text = np.asarray(labels, dtype=np.int64).astype(str)
+        rows = [', '.join(text[i:i+per_line]) for i in range(0, len(text), per_line)]
+        blocks.append('*Nset, nset=%s%s\n%s\n' % (name, option, '\n'.join(rows)))
+    return ''.join(blocks)
+
+
+def write_nsets(f, sets, per_line=16, instance=None):
+    """Write all the *Nset blocks with one write call"""
+    f.write(format_nsets(sets, per_line, instance))
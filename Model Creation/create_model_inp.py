@@ -1,60 +1,13 @@
 import re
 import os
 import sys
+import numpy as np
+from pbc_equations import periodic_links, links_from_pairs, write_equations, detect_dimension, pairing_tolerance
 
-class MeshData:
-    def __init__(self):
-        self.nodes = {}
-        self.elements = []
-        self.nodeSets = {}
-        self.elemsets = {}
-        self.minpos = [float('inf')] * 3  # Initialized to a very large value
-        self.maxpos = [float('-inf')] * 3
-
-    def add_node(self, node_id, coordinates):
-        self.nodes[node_id] = coordinates
-        coord = list(coordinates)
-        for i in range(3):
-            # Update minpos for each coordinate
-            if self.minpos[i] > coord[i]:
-                self.minpos[i] = coord[i]
-            # Update maxpos for each coordinate
-            if self.maxpos[i] < coord[i]:
-                self.maxpos[i] = coord[i]
-                
-    def get_minmax_coordinates(self):
-        return self.minpos, self.maxpos
-        
-    def add_element(self, element_id, element_type, support_nodes,elset):
-        self.elements.append({
-            'element_id': element_id,
-            'element_type': element_type,
-            'support_nodes': support_nodes
-        })
-        if elset != '':
-            self.add_elements_to_elemset(elset,element_id)
-        
-    def get_elements_by_type(self, element_type):
-        return [element for element in self.elements if element['element_type'] == element_type]
-    
-    def add_nodeSet(self, name, nodeSet_data):
-        if name not in self.nodeSets:
-            self.nodeSets[name] = []
-        try:
-            self.nodeSets[name].extend(nodeSet_data)
-        except:
-            self.nodeSets[name].append(nodeSet_data)
-        
-    def add_elements_to_elemset(self, name, elements):
-        if name not in self.elemsets:
-            self.elemsets[name] = []
-        try:
-            self.elemsets[name].extend(elements)
-        except:
-            self.elemsets[name].append(elements)
-        
-    def get_elem_from_set(self,elemset_name):
-        return self.elemsets.get(elemset_name, [])
+PLUGIN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'abaqus_plugin')
+if PLUGIN_DIR not in sys.path:
+    sys.path.append(PLUGIN_DIR)
+from inp_reader import parse_file
 
 
 class ElemSet:
@@ -68,74 +21,26 @@ class ElemSet:
     def get_elements(self):
         return self.elements
 
-def nameSet(line):
-    re_nameSet = re.compile(r'(?:\*ELEMENT\,\stype\=\w*)(?:,\ ELSET=([\w]*))?')
-    try:
-        res = re_nameSet.search(line).group(1)
-    except:
-        res='test'
-    return res
 
-def parse_file(filename):
-    re_type_elem = re.compile(r'\*ELEMENT\,\stype\=(\w*)')
-    re_nodeSet_name = re.compile(r'\*NSET\,NSET\=(\w*)')
-    mesh = MeshData()
-    material = []
-    with open(filename, 'r') as file:
-        lines = file.readlines()
-        element_type = ''
-        is_node_section = False
-        is_nodeset_section = False
-        is_element_section = False
-        is_material_section = False
-        for line in lines:
-            if "*Node" in line or "*NODE" in line:
-                is_node_section = True
-                is_nodeset_section = False
-                is_element_section = False
-                is_material_section = False
-            elif "*NSET" in line:
-                nodeSet_name = re_nodeSet_name.search(line).group(1)
-                is_node_section = False
-                is_nodeset_section = True
-                is_element_section = False
-                is_material_section = False
-            elif "*ELEMENT" in line or "*Element" in line:
-                element_type = findElemType(line)
-                if nameSet(line) != None:
-                    elset = nameSet(line)
-                else:
-                    elset = ''
-                is_node_section = False
-                is_nodeset_section = False
-                is_element_section = True
-                is_material_section = False
-            elif "** MATERIALS" in line:
-                is_node_section = False
-                is_nodeset_section = False
-                is_element_section = False
-                is_material_section = True
-            elif "*" in line and '*Material' not in line and '*Elastic' not in line:  # Any other section
-                is_node_section = False
-                is_element_section = False
-            elif is_node_section:
-                parts = line.strip().split(',')
-                node_id = int(parts[0])
-                coords = tuple(map(float, parts[1:]))
-                mesh.add_node(node_id, coords)
-            elif is_nodeset_section:
-                parts = line.strip().split(',')
-                parts.remove('')
-                nodes_in_set = list(map(int, parts))
-                mesh.add_nodeSet(nodeSet_name,nodes_in_set)
-            elif is_element_section:
-                parts = line.strip().split(',')
-                element_id = int(parts[0])
-                support_nodes = list(map(int, parts[1:]))
-                mesh.add_element(element_id, element_type, support_nodes,elset)
-            elif is_material_section:
-                material.append(line)
-    return mesh, material
+def write_rows(f, values, per_line, end=''):
+    """Write integer labels per_line by per_line, comma separated"""
+    values = np.asarray(values, dtype=np.int64)
+    full = len(values) - len(values) % per_line
+    if full:
+        np.savetxt(f, values[:full].reshape(-1, per_line), fmt='%d', delimiter=', ', newline=end+'\n')
+    if full < len(values):
+        f.write(', '.join(map(str, values[full:].tolist())) + end + '\n')
+
+
+def write_nodes(f, mesh):
+    for node_id, coords in zip(mesh.node_ids.tolist(), mesh.coords[:, :mesh.ndim].tolist()):
+        f.write(str(node_id) + ', ' + ', '.join(map(str, coords)) + '\n')
+
+
+def write_elements(f, mesh):
+    for element_type, (ids, conn) in mesh.elements.items():
+        f.write('*Element, type=%s\n' % element_type)
+        np.savetxt(f, np.column_stack([ids, conn]), fmt='%d', delimiter=', ')
 
 
 def linetype(line,re_node,re_elem,re_type_elem):
@@ -153,13 +58,7 @@ def find_line_number(filename, pattern):
             if re.search(pattern, line):
                 return line_num
             return None
-def findElemType(line):
-    line = line.upper()
-    re_elemType = re.compile(r'(TYPE\=\w*)')
-    print(re_elemType.search(line))
-    res = re_elemType.search(line).group(1)
-    return res
-def main_combine(file1,file2):
+def main_combine(file1,file2,equations=False,pairs=None):
     inp_data1, material1 = parse_file(file1)
     inp_data2, material2 = parse_file(file2)
     
@@ -189,15 +88,8 @@ def main_combine(file1,file2):
     with open(filepath_env, 'w') as f:
         f.writelines("*Heading\n** Job name: Job-40 Model name: Model-1\n** Generated by: Abaqus/CAE 2022\n**\n** PARTS\n**\n*Part, name=Embedded\n*Node\n")
         
-        # Example: Printing out the parsed data
-        for node_id, coords in inp_data1.nodes.items():
-            f.writelines(str(node_id) + ', ' + ', '.join(map(str, coords))+'\n')            
-        elemtype = inp_data1.elements[0]['element_type']
-        f.writelines('*ELement, '+ elemtype+'\n')
-        for elem in inp_data1.elements:
-            if elem['element_type'] != elemtype:
-                f.writelines(elem['element_type'])
-            f.writelines(str(elem['element_id'])+ ', ' + ', '.join(map(str, elem['support_nodes'] ))+'\n')
+        write_nodes(f, inp_data1)
+        write_elements(f, inp_data1)
             
         #for nameSet in list(inp_data1.elemsets.keys()):
         #    f.writelines('*Elset, elset=%s, generate\n' %(nameSet))
@@ -208,14 +100,8 @@ def main_combine(file1,file2):
             
             
         f.writelines('*End Part\n**\n*Part, name=RVEplus\n*Node\n')
-        for node_id, coords in inp_data2.nodes.items():
-            f.writelines(str(node_id) + ', ' + ', '.join(map(str, coords))+'\n')
-        elemtype = inp_data2.elements[0]['element_type']
-        f.writelines('*ELement, '+ elemtype+'\n')
-        for elem in inp_data2.elements:
-            if elem['element_type'] != elemtype:
-                f.writelines(elem['element_type'])
-            f.writelines(str(elem['element_id'])+ ', ' + ', '.join(map(str, elem['support_nodes'] ))+'\n')
+        write_nodes(f, inp_data2)
+        write_elements(f, inp_data2)
         for nameSet in list(inp_data2.elemsets.keys()):
             # Convert old names to standardized names
             if nameSet == 'VOLUME2' or nameSet == 'Volume2':
@@ -226,10 +112,7 @@ def main_combine(file1,file2):
                 standardized_name = nameSet
                 
             f.writelines('*Elset, elset=%s\n' % (standardized_name))
-            elem_from_set = list(inp_data2.elemsets[nameSet])
-            for i in range(0, len(elem_from_set), 4):
-                row_elements = elem_from_set[i:i+4]
-                f.writelines(', '.join(map(str, row_elements))+'\n')
+            write_rows(f, inp_data2.elemsets[nameSet], 4)
         #f.writelines('** Section: matrice\n*Solid Section, elset=RVE, orientation=Ori-2, stack direction=1, material=epopo\n')
         #f.writelines('** Section: enrich\n*Solid Section, elset=ENVELOPE, orientation=Ori-2, stack direction=1, material=enrich\n')
         f.writelines('*End Part\n**\n**\n** ASSEMBLY\n**\n*Assembly, name=Assembly\n**\n*Instance, name=RVEplus-1, part=RVEplus\n*End Instance\n**\n*Instance, name=Embedded-1, part=Embedded\n')
@@ -244,10 +127,7 @@ def main_combine(file1,file2):
         
         for nodeSet in inp_data2.nodeSets:
             f.writelines('*Nset, nset=%s, instance=RVEplus-1\n' %nodeSet)
-            node_from_set = list(inp_data2.nodeSets[nodeSet])
-            for i in range(0, len(node_from_set), 16):
-                row_elements = node_from_set[i:i+16]
-                f.writelines(', '.join(map(str, row_elements))+'\n')
+            write_rows(f, inp_data2.nodeSets[nodeSet], 16)
         f.writelines('*Nset, nset=RefMacro1\n1,\n*Nset, nset=RefMacro2\n2,\n*Nset, nset=RefMacro3\n3,\n')
         #f.writelines('*Elset, elset=VOLUME1, instance=RVEplus-1\n')
         #elemVol1 = inp_data2.get_elem_from_set('Volume1')
@@ -257,27 +137,37 @@ def main_combine(file1,file2):
         #f.writelines(str(min(elemVol1)) + ', ' + str(max(elemVol1)) + ', 1\n')
         
         #f.writelines('*Elset, elset=VOLUME2, instance=RVEplus-1\n')
-        elemMatrix = inp_data2.get_elem_from_set('MATRIX') or inp_data2.get_elem_from_set('VOLUME2') or []
-        elemEnvelope = inp_data2.get_elem_from_set('ENVELOPE') or inp_data2.get_elem_from_set('VOLUME3') or []
+        elemMatrix = inp_data2.get_elem_from_set('MATRIX')
+        if not len(elemMatrix):
+            elemMatrix = inp_data2.get_elem_from_set('VOLUME2')
+        elemEnvelope = inp_data2.get_elem_from_set('ENVELOPE')
+        if not len(elemEnvelope):
+            elemEnvelope = inp_data2.get_elem_from_set('VOLUME3')
         
-        if elemMatrix or elemEnvelope:
+        if len(elemMatrix) or len(elemEnvelope):
             f.writelines('*Elset, elset=Set-1, instance=RVEPLUS-1, generate\n')
-            min_elem = min(elemMatrix) if elemMatrix else min(elemEnvelope)
-            max_elem = max(elemEnvelope) if elemEnvelope else max(elemMatrix)
+            min_elem = elemMatrix.min() if len(elemMatrix) else elemEnvelope.min()
+            max_elem = elemEnvelope.max() if len(elemEnvelope) else elemMatrix.max()
             f.writelines(f"{min_elem}, {max_elem}, 1\n")
         
-        if elemMatrix:
+        if len(elemMatrix):
             f.writelines('*Elset, elset=MATRIX, instance=RVEPLUS-1\n')
-            for i in range(0, len(elemMatrix), 4):
-                row_elements = elemMatrix[i:i+4]
-                f.writelines(', '.join(map(str, row_elements))+'\n')
+            write_rows(f, elemMatrix, 4)
             
-        if elemEnvelope:
+        if len(elemEnvelope):
             f.writelines('*Elset, elset=ENVELOPE, instance=RVEPLUS-1\n')
-            for i in range(0, len(elemEnvelope), 4):
-                row_elements = elemEnvelope[i:i+4]
-                f.writelines(', '.join(map(str, row_elements))+'\n')
+            write_rows(f, elemEnvelope, 4)
         #f.writelines('** Constraint: Constraint-1\n*Embedded Element, host elset=RVEplus-1.Set-1, exterior tolerance=0.1\nEmbedded-1.Set-2\n')
+        if equations:
+            # periodic constraints written in the deck, the plugin then skips its own
+            # pairs: {axis: (master, slave)} node tables reported by gmsh, if known
+            tol = pairing_tolerance(inp_data2)
+            if pairs is not None:
+                dependent, independent, dx = links_from_pairs(inp_data2.node_ids, inp_data2.coords, pairs)
+            else:
+                dependent, independent, dx = periodic_links(inp_data2.node_ids, inp_data2.coords, inp_data2.nodeSets,
+                                                            tol=tol)
+            write_equations(f, dependent, independent, dx, detect_dimension(inp_data2.nodeSets), tol=tol)
         f.writelines('*End Assembly\n**\n')
         for line in material2:
             f.writelines(line)
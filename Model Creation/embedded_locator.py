@@ -0,0 +1,225 @@
+# Host elements of the embedded nodes, found once offline: a bounding volume
+# hierarchy over the host elements of the -VER.inp gives the candidate hosts
+# of every embedded node, the shape functions at its natural coordinates the
+# weights. The constraints are written as *Equation blocks in an include file
+# (NAME-embedded.inp) so the jobs do not redo the EmbeddedRegion search, and
+# the nodes outside every host are reported.
+#
+#     python embedded_locator.py NAME-model.inp
+#     python embedded_locator.py NAME-VER.inp EMBEDDED.inp -o NAME-embedded.inp
+
+import argparse
+import os
+import time
+import numpy as np
+import scipy.sparse as sp
+
+from fe_elements import element_family, shape_functions, natural_coordinates, inside_distance, clamp_natural
+from inp_reader import HOST_PART, EMBEDDED_PART, element_blocks, parse_file, read_model
+
+EMBED_TOLERANCE = 0.1  # fractional tolerance of the EmbeddedRegion, in natural coordinates
+WEIGHT_TOLERANCE = 1e-6  # weightFactorTolerance of the EmbeddedRegion
+LEAF_SIZE = 8  # elements per leaf of the hierarchy
+QUERY_CHUNK = 100000  # points traversing the hierarchy together
+
+
+class BoundingVolumeHierarchy:
+    """Implicit binary tree over boxes (lo, hi), built and traversed level by level.
+
+    Each node holds a contiguous range of the boxes sorted along the
+    longest extent of their centres and splits it in two halves, so level l
+    has 2**l nodes and the tree needs no pointers. A leaf holds at most
+    leaf_size boxes.
+    """
+    def __init__(self, lo, hi, leaf_size=LEAF_SIZE):
+        n = len(lo)
+        centre = (lo + hi) / 2.
+        self.depth = int(np.ceil(np.log2(n / float(leaf_size)))) if n > leaf_size else 0
+        order = np.arange(n)
+        starts, stops = np.array([0]), np.array([n])
+        for level in range(self.depth):
+            counts = stops - starts
+            segment = np.repeat(np.arange(len(starts)), counts)
+            c = centre[order]
+            extent = np.maximum.reduceat(c, starts) - np.minimum.reduceat(c, starts)
+            key = c[np.arange(n), np.argmax(extent, axis=1)[segment]]
+            order = order[np.lexsort((key, segment))]
+            middle = starts + counts // 2
+            starts = np.column_stack([starts, middle]).ravel()
+            stops = np.column_stack([middle, stops]).ravel()
+        self.order, self.starts, self.stops = order, starts, stops
+        self.lo, self.hi = lo, hi
+        if n == 0:
+            self.levels = [(np.zeros((1, lo.shape[1])) + np.inf, np.zeros((1, lo.shape[1])) - np.inf)]
+            return
+        levels = [(np.minimum.reduceat(lo[order], starts), np.maximum.reduceat(hi[order], starts))]
+        for level in range(self.depth):
+            below_lo, below_hi = levels[0]
+            levels.insert(0, (np.minimum(below_lo[0::2], below_lo[1::2]), np.maximum(below_hi[0::2], below_hi[1::2])))
+        self.levels = levels
+
+    def query(self, points):
+        """(point, box) pairs of the boxes containing each point"""
+        pp = np.arange(len(points))
+        pn = np.zeros(len(points), dtype=np.int64)
+        for level, (lo, hi) in enumerate(self.levels):
+            inside = np.all((points[pp] >= lo[pn]) & (points[pp] <= hi[pn]), axis=1)
+            pp, pn = pp[inside], pn[inside]
+            if level < self.depth:
+                pp = np.repeat(pp, 2)
+                pn = (2 * pn[:, None] + np.arange(2)).ravel()
+        counts = self.stops[pn] - self.starts[pn]
+        local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        box = self.order[np.repeat(self.starts[pn], counts) + local]
+        pp = np.repeat(pp, counts)
+        inside = np.all((points[pp] >= self.lo[box]) & (points[pp] <= self.hi[box]), axis=1)
+        return pp[inside], box[inside]
+
+
+def locate(points, coords, blocks, tol=EMBED_TOLERANCE):
+    """Host of every point among the elements of blocks.
+
+    The host is the candidate element the point is least outside of
+    (inside_distance of its natural coordinates). Returns the block,
+    element, natural coordinates and distance of each point; the distance
+    is inf for points in no element box (inflated by tol).
+    """
+    d = points.shape[1]
+    lo, hi, offsets = [], [], [0]
+    for family, ids, conn in blocks:
+        xe = coords[conn]
+        size = (xe.max(axis=1) - xe.min(axis=1)).max(axis=1)
+        lo.append(xe.min(axis=1) - tol * size[:, None])
+        hi.append(xe.max(axis=1) + tol * size[:, None])
+        offsets.append(offsets[-1] + len(conn))
+    bvh = BoundingVolumeHierarchy(np.concatenate(lo), np.concatenate(hi))
+    offsets = np.array(offsets)
+
+    best = np.empty(len(points))
+    best.fill(np.inf)
+    best_block = np.zeros(len(points), dtype=np.int64)
+    best_elem = np.zeros(len(points), dtype=np.int64)
+    best_xi = np.zeros((len(points), d))
+    for start in range(0, len(points), QUERY_CHUNK):
+        chunk = points[start:start + QUERY_CHUNK]
+        pp, box = bvh.query(chunk)
+        block = np.searchsorted(offsets, box, side='right') - 1
+        dist = np.empty(len(pp))
+        xi = np.zeros((len(pp), d))
+        for b, (family, ids, conn) in enumerate(blocks):
+            sel = np.nonzero(block == b)[0]
+            if len(sel):
+                xi[sel] = natural_coordinates(family, coords[conn[box[sel] - offsets[b]]], chunk[pp[sel]])
+                dist[sel] = inside_distance(family, xi[sel])
+        # first candidate of each point by increasing distance
+        order = np.lexsort((dist, pp))
+        first = order[np.r_[True, pp[order][1:] != pp[order][:-1]]] if len(order) else order
+        rows = start + pp[first]
+        best[rows] = dist[first]
+        best_block[rows] = block[first]
+        best_elem[rows] = box[first] - offsets[block[first]]
+        best_xi[rows] = xi[first]
+    return best_block, best_elem, best_xi, best
+
+
+def host_weights(points, coords, blocks, tol=EMBED_TOLERANCE):
+    """Host element interpolation of embedded nodes.
+
+    Points more than tol outside every element (natural coordinates) are
+    reported. Returns a sparse (points, host nodes) weight matrix and the
+    indices of the points without host.
+    """
+    best_block, best_elem, best_xi, best = locate(points, coords, blocks, tol)
+    found = best <= tol
+    rows, cols, vals = [], [], []
+    for b, (family, ids, conn) in enumerate(blocks):
+        sel = np.nonzero(found & (best_block == b))[0]
+        N, dN = shape_functions(family, clamp_natural(family, best_xi[sel]))
+        rows.append(np.repeat(sel, conn.shape[1]))
+        cols.append(conn[best_elem[sel]].ravel())
+        vals.append(N.ravel())
+    W = sp.csr_matrix((np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))),
+                      shape=(len(points), len(coords)))
+    return W, np.nonzero(~found)[0]
+
+
+def write_embedded_equations(f, embedded_labels, host_labels, W, dimension, embedded_instance='EMBEDDED-1',
+                             host_instance='RVEPLUS-1', weight_tol=WEIGHT_TOLERANCE):
+    """Write u(embedded node) = sum w u(host node) for every row of W as one *Equation block.
+
+    Weights below weight_tol are dropped and the others scaled back to a
+    unit sum, as the EmbeddedRegion does. Rows without host are skipped.
+    """
+    W = W.tocsr()
+    f.write('** Constraint: embedded elements\n*Equation\n')
+    count = 0
+    for i, label in enumerate(np.asarray(embedded_labels).tolist()):
+        cols = W.indices[W.indptr[i]:W.indptr[i+1]]
+        w = W.data[W.indptr[i]:W.indptr[i+1]]
+        keep = np.abs(w) >= weight_tol
+        if not keep.any():
+            continue
+        cols, w = cols[keep], w[keep] / w[keep].sum()
+        for dof in range(1, dimension+1):
+            terms = ['%s.%d, %d, 1.' % (embedded_instance, label, dof)]
+            terms += ['%s.%d, %d, %.12g' % (host_instance, n, dof, -v)
+                      for n, v in zip(np.asarray(host_labels)[cols].tolist(), w.tolist())]
+            f.write('%d\n' % len(terms))
+            for k in range(0, len(terms), 4):
+                f.write(', '.join(terms[k:k+4]) + '\n')
+            count += 1
+    return count
+
+
+def embedded_constraints(host, embedded, dimension, path, tol=EMBED_TOLERANCE, embedded_instance='EMBEDDED-1',
+                         host_instance='RVEPLUS-1'):
+    """Locate the nodes of the embedded elements in the host mesh and write the include file.
+
+    host and embedded are meshes with node_ids, coords, elements and
+    node_rows (inp_reader.MeshData). Returns the labels of the
+    embedded nodes outside every host element.
+    """
+    start = time.time()
+    host_blocks = element_blocks(host, dimension)
+    used = np.unique(np.concatenate([conn.ravel() for family, ids, conn in element_blocks(embedded, dimension)]))
+    W, outside = host_weights(embedded.coords[used, :dimension], host.coords[:, :dimension], host_blocks, tol)
+    with open(path, 'w') as f:
+        count = write_embedded_equations(f, embedded.node_ids[used], host.node_ids, W, dimension,
+                                         embedded_instance, host_instance)
+    print('%d embedded nodes located in %d host elements, %d equations written to %s (%.1f s)'
+          % (len(used), sum(len(ids) for family, ids, conn in host_blocks), count, path, time.time() - start))
+    labels = embedded.node_ids[used[outside]]
+    if len(labels):
+        print('%d embedded nodes outside every host element (tolerance %g), e.g. %s'
+              % (len(labels), tol, labels[:10].tolist()))
+    return labels
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Embedded element constraints computed offline as *Equation')
+    parser.add_argument('host', help='NAME-model.inp (parts RVEPLUS and EMBEDDED), or NAME-VER.inp')
+    parser.add_argument('embedded', nargs='?', default=None, help='mesh of the embedded elements, with NAME-VER.inp')
+    parser.add_argument('-o', '--output', default=None, help='include file (default NAME-embedded.inp)')
+    parser.add_argument('--tol', type=float, default=EMBED_TOLERANCE,
+                        help='fractional tolerance outside the host elements (default %g)' % EMBED_TOLERANCE)
+    parser.add_argument('--embedded-instance', default='EMBEDDED-1')
+    parser.add_argument('--host-instance', default='RVEPLUS-1')
+    args = parser.parse_args()
+
+    if args.embedded is None:
+        deck = read_model(args.host)
+        host, embedded = deck.parts[HOST_PART], deck.parts[EMBEDDED_PART]
+    else:
+        host, material = parse_file(args.host)
+        embedded, material = parse_file(args.embedded)
+    dimension = element_family(next(iter(host.elements)))[1]
+    name = os.path.splitext(args.host)[0]
+    for suffix in ('-model', '-VER'):
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+    output = args.output or name + '-embedded.inp'
+    embedded_constraints(host, embedded, dimension, output, args.tol, args.embedded_instance, args.host_instance)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+# Content-addressed cache of the VER meshes built by gmsh: the mesh only depends
+# on the bounding box of the embedded nodes, ep, density, dimension and the
+# gmsh version, so a campaign re-run reuses it instead of meshing again
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+import numpy as np
+
+DEFAULT_ROOT = os.environ.get('HOMTOOLS_CACHE',
+                              os.path.join(os.path.expanduser('~'), '.cache', 'homtools', 'ver'))
+DEFAULT_MAX_BYTES = 5 * 1024**3
+
+MESH_FILE = 'mesh.inp'
+E2A_FILE = 'ver.e2a'
+SETS_FILE = 'sets.npz'
+INFO_FILE = 'info.json'
+
+
+def cache_key(minpos, maxpos, ep, density, dimension, gmsh_version):
+    """sha256 of the parameters the VER mesh depends on (floats written exactly)"""
+    params = {
+        'minpos': [repr(float(v)) for v in minpos],
+        'maxpos': [repr(float(v)) for v in maxpos],
+        'ep': repr(float(ep)),
+        'density': repr(float(density)),
+        'dimension': str(dimension),
+        'gmsh': str(gmsh_version),
+    }
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest(), params
+
+
+def write_info(path, info):
+    """Write info.json aside then replace it, so concurrent readers never see half of it"""
+    tmp = '%s.tmp%d' % (path, os.getpid())
+    with open(tmp, 'w') as f:
+        json.dump(info, f, indent=1)
+    os.replace(tmp, path)
+
+
+class EnvelopeCache:
+    """One folder per key holding the raw gmsh mesh, the .e2a, the node sets
+    and the periodic pair tables; least recently used entries are evicted
+    once the cache is larger than max_bytes"""
+    def __init__(self, root=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = os.path.abspath(root or DEFAULT_ROOT)
+        self.max_bytes = max_bytes
+
+    def _folder(self, key):
+        return os.path.join(self.root, key)
+
+    def get(self, key):
+        """Entry paths and arrays of key, or None on a miss.
+
+        An entry evicted or still unreadable while it is read (another
+        worker of batch_envelope) counts as a miss.
+        """
+        folder = self._folder(key)
+        info_path = os.path.join(folder, INFO_FILE)
+        if not os.path.exists(info_path):
+            return None
+        try:
+            with open(info_path) as f:
+                info = json.load(f)
+            info['last_used'] = time.time()
+            write_info(info_path, info)
+            with np.load(os.path.join(folder, SETS_FILE)) as data:
+                nodesets = {name[4:]: data[name] for name in info['sets']}
+                pairs = {k: (data['master%d' % k], data['slave%d' % k]) for k in info['pairs']}
+        except (OSError, ValueError, KeyError):
+            return None
+        return {'mesh': os.path.join(folder, MESH_FILE), 'e2a': os.path.join(folder, E2A_FILE),
+                'nodesets': nodesets, 'pairs': pairs, 'info': info}
+
+    def put(self, key, params, mesh_path, e2a_path, nodesets, pairs):
+        """Store an entry (written aside then renamed, so readers never see half of it)"""
+        folder = self._folder(key)
+        if os.path.exists(folder):
+            return
+        tmp = '%s.tmp%d' % (folder, os.getpid())
+        os.makedirs(tmp, exist_ok=True)
+        shutil.copy(mesh_path, os.path.join(tmp, MESH_FILE))
+        shutil.copy(e2a_path, os.path.join(tmp, E2A_FILE))
+        arrays = {'set_' + name: np.asarray(labels) for name, labels in nodesets.items()}
+        for k, (masters, slaves) in pairs.items():
+            arrays['master%d' % k] = np.asarray(masters)
+            arrays['slave%d' % k] = np.asarray(slaves)
+        np.savez(os.path.join(tmp, SETS_FILE), **arrays)
+        now = time.time()
+        info = {'params': params, 'sets': ['set_' + name for name in nodesets],
+                'pairs': [int(k) for k in pairs], 'created': now, 'last_used': now}
+        write_info(os.path.join(tmp, INFO_FILE), info)
+        try:
+            os.rename(tmp, folder)
+        except OSError:  # stored meanwhile by another worker
+            shutil.rmtree(tmp, ignore_errors=True)
+        self.evict()
+
+    def entries(self):
+        """[(key, size in bytes, info)] from the least to the most recently used"""
+        result = []
+        if not os.path.isdir(self.root):
+            return result
+        for key in os.listdir(self.root):
+            if '.tmp' in key:  # entry being stored
+                continue
+            info_path = os.path.join(self.root, key, INFO_FILE)
+            if not os.path.exists(info_path):
+                continue
+            try:
+                with open(info_path) as f:
+                    info = json.load(f)
+                folder = self._folder(key)
+                size = sum(os.path.getsize(os.path.join(folder, name)) for name in os.listdir(folder))
+            except (OSError, ValueError):  # evicted meanwhile by another worker
+                continue
+            result.append((key, size, info))
+        result.sort(key=lambda entry: entry[2]['last_used'])
+        return result
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes"""
+        entries = self.entries()
+        total = sum(size for key, size, info in entries)
+        removed = 0
+        for key, size, info in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(self._folder(key), ignore_errors=True)
+            total -= size
+            removed += 1
+        return removed
+
+    def clear(self):
+        removed = len(self.entries())
+        if os.path.isdir(self.root):
+            shutil.rmtree(self.root)
+        return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect or clear the VER mesh cache')
+    parser.add_argument('command', choices=['list', 'clear', 'evict'])
+    parser.add_argument('--root', default=None, help='cache folder (default %s)' % DEFAULT_ROOT)
+    parser.add_argument('--max-size', type=float, default=None, help='size cap in MB for evict')
+    args = parser.parse_args()
+
+    cache = EnvelopeCache(args.root)
+    if args.command == 'list':
+        entries = cache.entries()
+        for key, size, info in entries:
+            p = info['params']
+            print('%s  %8.1f MB  last used %s  ep=%s density=%s dim=%s gmsh %s' % (
+                key[:12], size / 1024.**2, time.strftime('%Y-%m-%d %H:%M', time.localtime(info['last_used'])),
+                p['ep'], p['density'], p['dimension'], p['gmsh']))
+        print('%d entries, %.1f MB in %s' % (len(entries), sum(e[1] for e in entries) / 1024.**2, cache.root))
+    elif args.command == 'clear':
+        print('%d entries removed from %s' % (cache.clear(), cache.root))
+    else:
+        if args.max_size is not None:
+            cache.max_bytes = args.max_size * 1024**2
+        print('%d entries evicted' % cache.evict())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+# Linear elastic continuum elements of the RVE decks (CPS3, CPS4R, C3D4, C3D8)
+# and the Abaqus *Elastic definitions, for the Python homogenization solver.
+# Strains in Voigt order 11, 22, 33, 12, 13, 23 (11, 22, 12 in 2D), engineering shears.
+
+import os
+import sys
+import numpy as np
+
+PLUGIN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'abaqus_plugin')
+if PLUGIN_DIR not in sys.path:
+    sys.path.append(PLUGIN_DIR)
+# element types, shape functions and element volumes are shared with the plugin
+from inp_reader import ELEMENT_TYPES, NODES, SIMPLEX, element_family, gauss_points, shape_functions, element_volumes
+
+
+def strain_matrix(dNdx):
+    """B (strains, d*n) from the shape function gradients dN/dx (n, d)"""
+    n, d = dNdx.shape
+    if d == 2:
+        B = np.zeros((3, 2*n))
+        B[0, 0::2] = dNdx[:, 0]
+        B[1, 1::2] = dNdx[:, 1]
+        B[2, 0::2] = dNdx[:, 1]
+        B[2, 1::2] = dNdx[:, 0]
+        return B
+    B = np.zeros((6, 3*n))
+    B[0, 0::3] = dNdx[:, 0]
+    B[1, 1::3] = dNdx[:, 1]
+    B[2, 2::3] = dNdx[:, 2]
+    B[3, 0::3] = dNdx[:, 1]
+    B[3, 1::3] = dNdx[:, 0]
+    B[4, 0::3] = dNdx[:, 2]
+    B[4, 2::3] = dNdx[:, 0]
+    B[5, 1::3] = dNdx[:, 2]
+    B[5, 2::3] = dNdx[:, 1]
+    return B
+
+
+def strain_matrices(dNdx):
+    """B (m, strains, d*n) of a stack of shape function gradients dN/dx (m, n, d)"""
+    m, n, d = dNdx.shape
+    if d == 2:
+        B = np.zeros((m, 3, 2*n))
+        B[:, 0, 0::2] = dNdx[:, :, 0]
+        B[:, 1, 1::2] = dNdx[:, :, 1]
+        B[:, 2, 0::2] = dNdx[:, :, 1]
+        B[:, 2, 1::2] = dNdx[:, :, 0]
+        return B
+    B = np.zeros((m, 6, 3*n))
+    B[:, 0, 0::3] = dNdx[:, :, 0]
+    B[:, 1, 1::3] = dNdx[:, :, 1]
+    B[:, 2, 2::3] = dNdx[:, :, 2]
+    B[:, 3, 0::3] = dNdx[:, :, 1]
+    B[:, 3, 1::3] = dNdx[:, :, 0]
+    B[:, 4, 0::3] = dNdx[:, :, 2]
+    B[:, 4, 2::3] = dNdx[:, :, 0]
+    B[:, 5, 1::3] = dNdx[:, :, 2]
+    B[:, 5, 2::3] = dNdx[:, :, 1]
+    return B
+
+
+def _inverse_det(J):
+    """Inverses and determinants of a stack of (2, 2) or (3, 3) jacobians, in closed form"""
+    if J.shape[-1] == 2:
+        det = J[:, 0, 0] * J[:, 1, 1] - J[:, 0, 1] * J[:, 1, 0]
+        adj = np.empty_like(J)
+        adj[:, 0, 0] = J[:, 1, 1]
+        adj[:, 1, 1] = J[:, 0, 0]
+        adj[:, 0, 1] = -J[:, 0, 1]
+        adj[:, 1, 0] = -J[:, 1, 0]
+    else:
+        adj = np.empty_like(J)
+        for i in range(3):
+            for j in range(3):
+                r = [k for k in range(3) if k != j]
+                c = [k for k in range(3) if k != i]
+                adj[:, i, j] = (-1)**(i + j) * (J[:, r[0], c[0]] * J[:, r[1], c[1]]
+                                                - J[:, r[0], c[1]] * J[:, r[1], c[0]])
+        det = np.einsum('mj,mj->m', J[:, 0, :], adj[:, :, 0])
+    return adj / det[:, None, None], det
+
+
+def elasticity_tensor(D):
+    """C[i, k, j, l] of a Voigt elasticity matrix D (engineering shears)"""
+    d = 2 if len(D) == 3 else 3
+    P = strain_matrices(np.eye(d)[:, None, :])  # P[k, v, i]: strain v of du_i/dx_k
+    return np.einsum('kvi,vw,lwj->ikjl', P, D, P)
+
+
+def batch_stiffness(family, xe, D):
+    """Stiffness (m, d*n, d*n) and volumes (m) of the elements with node coordinates xe (m, n, d).
+
+    D is one elasticity matrix for all the elements, or one per element
+    (m, strains, strains). The jacobians and shape function gradients are
+    computed for the whole stack at each integration point. With one D,
+        ke[a i, b j] = C[i k j l] S[a k, b l],
+    S summing w detJ dN_a/dx_k dN_b/dx_l over the integration points, so
+    the material enters through a single matrix product for the stack.
+    Elements with inverted (clockwise) connectivity are integrated with
+    |detJ|, as inp_reader.element_volumes does; a zero jacobian raises.
+    """
+    xe = np.asarray(xe, dtype=float)
+    m, n, d = xe.shape
+    points, weights = gauss_points(family)
+    N, dN = shape_functions(family, points)
+    gradients = np.empty((m, len(weights), n * d))
+    scale = np.empty((m, len(weights)))
+    for p in range(len(weights)):
+        Jinv, detJ = _inverse_det(np.matmul(xe.transpose(0, 2, 1), dN[p]))
+        if not np.all(detJ):
+            raise ValueError('%d elements with a zero jacobian' % np.sum(detJ == 0))
+        gradients[:, p, :] = np.matmul(dN[p], Jinv).reshape(m, n * d)
+        scale[:, p] = weights[p] * np.abs(detJ)
+    volume = scale.sum(axis=1)
+    if np.ndim(D) == 3:
+        ke = np.zeros((m, n*d, n*d))
+        for p in range(len(weights)):
+            B = strain_matrices(gradients[:, p, :].reshape(m, n, d))
+            ke += np.matmul((B * scale[:, p, None, None]).transpose(0, 2, 1), np.matmul(D, B))
+        return ke, volume
+    S = np.matmul((gradients * scale[:, :, None]).transpose(0, 2, 1), gradients)  # (m, a k, b l)
+    S = S.reshape(m, n, d, n, d).transpose(0, 1, 3, 2, 4).reshape(m * n * n, d * d)
+    C = elasticity_tensor(D).transpose(1, 3, 0, 2).reshape(d * d, d * d)  # (k l, i j)
+    ke = np.dot(S, C).reshape(m, n, n, d, d).transpose(0, 1, 3, 2, 4)
+    return ke.reshape(m, n*d, n*d), volume
+
+
+def element_stiffness(family, xe, D):
+    """Stiffness (d*n, d*n) and volume of one element with node coordinates xe (n, d)"""
+    ke, volume = batch_stiffness(family, np.asarray(xe, dtype=float)[None], D)
+    return ke[0], volume[0]
+
+
+def natural_coordinates(family, xe, points, iterations=10):
+    """Natural coordinates of points (m, d) in the elements xe (m, n, d).
+
+    Exact for the simplices, Newton iterations for quads and hexes.
+    """
+    xe = np.asarray(xe, dtype=float)
+    points = np.asarray(points, dtype=float)
+    d = points.shape[1]
+    if family in SIMPLEX:
+        A = np.transpose(xe[:, 1:, :] - xe[:, :1, :], (0, 2, 1))  # (m, d, d)
+        return np.linalg.solve(A, (points - xe[:, 0, :])[:, :, None])[:, :, 0]
+    xi = np.zeros((len(points), d))
+    for it in range(iterations):
+        N, dN = shape_functions(family, xi)
+        residual = np.einsum('mn,mnd->md', N, xe) - points
+        J = np.einsum('mnd,mne->mde', xe, dN)
+        xi = xi - np.linalg.solve(J, residual[:, :, None])[:, :, 0]
+    return xi
+
+
+def inside_distance(family, xi):
+    """How far outside the reference element xi lies (<= 0 inside), in natural units"""
+    if family in SIMPLEX:
+        return np.maximum(-xi.min(axis=1), xi.sum(axis=1) - 1.)
+    return np.abs(xi).max(axis=1) - 1.
+
+
+def clamp_natural(family, xi):
+    """Project natural coordinates back onto the reference element"""
+    if family in SIMPLEX:
+        xi = np.maximum(xi, 0.)
+        total = xi.sum(axis=1)
+        over = total > 1.
+        xi[over] /= total[over][:, None]
+        return xi
+    return np.clip(xi, -1., 1.)
+
+
+def elastic_matrix(elastic_type, values):
+    """(6, 6) stiffness in Voigt order from the values of an *Elastic block"""
+    elastic_type = elastic_type.upper()
+    v = [float(x) for x in values]
+    if elastic_type == 'ISOTROPIC':
+        E, nu = v[0], v[1]
+        lam = E * nu / ((1. + nu) * (1. - 2.*nu))
+        mu = E / (2. * (1. + nu))
+        D = np.zeros((6, 6))
+        D[:3, :3] = lam
+        D[np.arange(3), np.arange(3)] += 2.*mu
+        D[np.arange(3, 6), np.arange(3, 6)] = mu
+        return D
+    if elastic_type == 'ENGINEERING CONSTANTS':
+        E1, E2, E3, nu12, nu13, nu23, G12, G13, G23 = v[:9]
+        S = np.diag([1./E1, 1./E2, 1./E3, 1./G12, 1./G13, 1./G23])
+        S[0, 1] = S[1, 0] = -nu12 / E1
+        S[0, 2] = S[2, 0] = -nu13 / E1
+        S[1, 2] = S[2, 1] = -nu23 / E2
+        return np.linalg.inv(S)
+    if elastic_type == 'ORTHOTROPIC':
+        D = np.zeros((6, 6))
+        D[0, 0], D[0, 1], D[1, 1], D[0, 2], D[1, 2], D[2, 2] = v[:6]
+        D[3, 3], D[4, 4], D[5, 5] = v[6:9]
+        return np.maximum(D, D.T)
+    if elastic_type == 'ANISOTROPIC':
+        # upper triangle column by column: D1111, D1122, D2222, D1133, ...
+        D = np.zeros((6, 6))
+        rows, cols = np.triu_indices(6)
+        order = np.lexsort((rows, cols))
+        D[rows[order], cols[order]] = v[:21]
+        return D + np.triu(D, 1).T
+    raise ValueError('Elastic type %s is not supported' % elastic_type)
+
+
+def plane_stress(D):
+    """(3, 3) plane stress stiffness (11, 22, 12) of a (6, 6) stiffness"""
+    S = np.linalg.inv(D)
+    keep = [0, 1, 3]
+    return np.linalg.inv(S[np.ix_(keep, keep)])
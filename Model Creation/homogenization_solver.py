@@ -0,0 +1,517 @@
+# In-process linear elastic solver for the -model.inp decks of create_model_inp
+# and unv_to_inp_model: the enrichment loop of the Abaqus plugin run with
+# numpy/scipy instead of Abaqus jobs, writing the same PBC-*-nD.dat files
+
+import argparse
+import os
+import sys
+import time
+import numpy as np
+import scipy.sparse as sp
+from scipy.linalg import cho_factor, cho_solve
+from scipy.sparse.linalg import LinearOperator, splu
+
+from pbc_equations import periodic_links, find_set, pairing_tolerance
+from fe_elements import element_family, elastic_matrix, plane_stress
+from assembly import group_stiffness, assemble_csr
+from embedded_locator import host_weights
+from matrix_free import PRECONDITIONERS, PCG_TOLERANCE, ElementOperator, ReducedOperator, pcg, solve_cases
+
+PLUGIN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'abaqus_plugin')
+if PLUGIN_DIR not in sys.path:
+    sys.path.append(PLUGIN_DIR)
+from enrichment import run_enrichment
+from inp_reader import HOST_PART, EMBEDDED_PART, element_blocks, read_model
+from initial_guess import ESTIMATES, initial_enrich, warm_start
+from mesh_volumes import deck_volumes, element_phases, phase_volumes
+from results_store import ResultsStore
+from run_state import RunState, state_path
+
+# material of each phase (mesh_volumes.PHASE_SETS), as assigned by periodicBoundary_env.main
+# (VOID: its 'Void' section)
+PHASE_MATERIALS = {'MATRIX': 'MATRIX', 'ENVELOPE': 'ENRICH', 'INCLUSION': 'EMBEDDED', 'VOID': 'VOID'}
+DEFAULT_MATERIALS = {'MATRIX': ('ISOTROPIC', (1., 0.2)), 'EMBEDDED': ('ISOTROPIC', (135., 0.3)),
+                     'VOID': ('ISOTROPIC', (1.0e-10, 0.2))}
+DENSE_FRACTION = 0.05  # condensed systems fuller than this are factorized as dense matrices
+SCHUR_DENSE_LIMIT = 2000  # interfaces up to this many DOFs get an explicit Schur complement
+
+
+class SchurOperator:
+    """Free block of the condensed system, sparse part minus the Schur correction.
+
+    dot and precondition are those matrix_free.pcg expects; the
+    preconditioner is the factorization of the sparse part.
+    """
+    def __init__(self, Kff, correction, nf):
+        self.Kff = Kff.tocsr()
+        self.correction = correction
+        self.nf = nf
+        self.lu = splu(Kff.tocsc())
+
+    def dot(self, x):
+        padded = np.zeros(self.correction.shape[0])
+        padded[:self.nf] = x
+        return self.Kff * x - self.correction.matvec(padded)[:self.nf]
+
+    def precondition(self, r):
+        return self.lu.solve(r)
+
+
+class RVESolver:
+    """Solver backend of enrichment.run_enrichment for a -model.inp.
+
+    The periodic equations and the embedded constraints are eliminated:
+    every dependent node follows the root of its periodic tree,
+        u(a) = u(root) + H (x_a - x_root),
+    H being the REFMACRO displacements of the load case, and every embedded
+    node follows its host element. The reduced system is solved for each
+    load case and the REFMACRO reactions are G^T K u, with G = du/dH.
+
+    With condense, the inner RVE (every element but ENRICH) is condensed
+    once on the DOFs it shares with the envelope (Schur complement) and each
+    iteration only assembles and solves the envelope plus that block. Past
+    SCHUR_DENSE_LIMIT interface DOFs the complement is never formed and
+    those solves are conjugate gradients (pcg_tol, pcg_log).
+
+    With pcg (a preconditioner of matrix_free.PRECONDITIONERS) the global
+    matrix is never formed: the element matrices are kept, the inner ones
+    once for all, and the reduced system is solved by conjugate gradients
+    from the solution of the previous iteration. pcg_log holds the
+    iterations, residual history and time of every load case of the last
+    solve.
+    """
+    def __init__(self, deck, dimension=None, condense=False, pcg=None, pcg_tol=PCG_TOLERANCE):
+        self.deck = deck
+        host = deck.parts.get(HOST_PART)
+        if host is None:
+            raise ValueError('No part %s in the model' % HOST_PART)
+        self.host = host
+        if dimension is None:
+            dimension = element_family(next(iter(host.elements)))[1]
+        self.dimension = dimension
+        d = dimension
+
+        self.host_blocks = element_blocks(host, d)
+        embedded = deck.parts.get(EMBEDDED_PART)
+        self.embedded = embedded if embedded is not None and embedded.elements else None
+        self.embedded_blocks = element_blocks(self.embedded, d) if self.embedded is not None else []
+
+        self.materials = dict(DEFAULT_MATERIALS)
+        self.materials.update(deck.materials)
+        if 'MATERIAL-1' in deck.materials:  # material of the Void section
+            self.materials['VOID'] = deck.materials['MATERIAL-1']
+        self.materials['ENRICH'] = self.materials['MATRIX']
+        self.element_materials = self.section_assignment()
+
+        set1 = find_set(host.elemsets, 'SET-1')
+        self.volume_elements = set1
+
+        self.build_constraints()
+        self.K = None
+        self.condensed = condense
+        self.schur = None
+        self.correction = None
+        self.boundary = None
+        if pcg is not None and pcg not in PRECONDITIONERS:
+            raise ValueError('Unknown preconditioner %s (%s)' % (pcg, ', '.join(PRECONDITIONERS)))
+        if pcg is not None and condense:
+            raise ValueError('The condensed and matrix-free solvers are exclusive')
+        self.pcg = pcg
+        self.pcg_tol = pcg_tol
+        self.inner_blocks = None
+        self.operator = None
+        self.pcg_solution = None
+        self.pcg_log = []
+
+    def section_assignment(self):
+        """Material name of every host element, one array per element block"""
+        result = []
+        for family, ids, conn in self.host_blocks:
+            phases = element_phases(ids, self.host.elemsets)
+            names = np.empty(len(ids), dtype=object)
+            for phase, material in PHASE_MATERIALS.items():
+                names[np.equal(phases, phase)] = material
+            missing = int(np.sum(np.equal(names, None)))
+            if missing:
+                raise ValueError('%d %s elements without section (not in MATRIX, ENVELOPE or INCLUSION*)'
+                                 % (missing, family))
+            result.append(names)
+        return result
+
+    def build_constraints(self):
+        """Reduction u = T u_r + G h of the host and embedded node displacements"""
+        d = self.dimension
+        host = self.host
+        nh = len(host.node_ids)
+        coords = host.coords[:, :d]
+
+        dependent, independent, dx = periodic_links(host.node_ids, host.coords, host.nodeSets, d,
+                                                    pairing_tolerance(host))
+        dep = host.node_rows(dependent)
+        ind = host.node_rows(independent)
+        # pointer jumping: root of every node and its offset x_a - x_root
+        root = np.arange(nh)
+        offset = np.zeros((nh, d))
+        root[dep] = ind
+        offset[dep] = dx[:, :d]
+        while True:
+            up = root[root]
+            if np.all(up == root):
+                break
+            offset = offset + offset[root]
+            root = up
+
+        active = np.zeros(nh, dtype=bool)
+        for family, ids, conn in self.host_blocks:
+            active[conn.ravel()] = True
+        is_root = root == np.arange(nh)
+        free = np.cumsum(is_root) - 1
+        nr = int(is_root.sum())
+
+        rows = (np.arange(nh)[:, None] * d + np.arange(d)).ravel()
+        T = sp.csr_matrix((np.ones(nh*d), (rows, (free[root][:, None] * d + np.arange(d)).ravel())),
+                          shape=(nh*d, nr*d))
+        # G[a*d+j, j*d+k] = offset[a, k]
+        grow = np.repeat(rows, d)
+        gcol = (np.tile(np.arange(d), nh)[:, None] * d + np.arange(d)).ravel()
+        G = sp.csr_matrix((np.repeat(offset, d, axis=0).ravel(), (grow, gcol)), shape=(nh*d, d*d))
+
+        self.embedded_rows = np.zeros(0, dtype=np.int64)
+        if self.embedded is not None:
+            used = np.unique(np.concatenate([conn.ravel() for family, ids, conn in self.embedded_blocks]))
+            W, outside = host_weights(self.embedded.coords[used, :d], host.coords[:, :d], self.host_blocks)
+            if len(outside):
+                raise ValueError('%d embedded nodes outside the host elements, e.g. %s'
+                                 % (len(outside), self.embedded.node_ids[used[outside[:5]]].tolist()))
+            Wd = sp.kron(W, sp.identity(d), format='csr')
+            T = sp.vstack([T, Wd * T[:nh*d]], format='csr')
+            G = sp.vstack([G, Wd * G[:nh*d]], format='csr')
+            self.embedded_rows = used
+
+        # rigid translations: pin one root used by the mesh; orphan roots carry no stiffness
+        keep = np.repeat(is_root & active, d)[np.repeat(is_root, d)]
+        pinned = free[np.nonzero(is_root & active)[0][0]]
+        keep[pinned*d:(pinned+1)*d] = False
+        self.T = T[:, np.nonzero(keep)[0]].tocsr()
+        self.G = G.tocsr()
+        self.nh = nh
+
+    def material_matrix(self, name):
+        elastic_type, values = self.materials[name]
+        D = elastic_matrix(elastic_type, values)
+        return plane_stress(D) if self.dimension == 2 else D
+
+    def element_matrices(self, envelope=None):
+        """[(element DOFs (m, nd), element stiffness (m, nd, nd))] of every element group, and
+        the SET-1 volume. The DOFs number the host then the embedded node displacements.
+
+        envelope=True keeps only the ENRICH elements, False all the others.
+        """
+        d = self.dimension
+        ne = len(self.embedded_rows)
+        # (family, node coordinates, DOF node of each element node, materials, in SET-1)
+        groups = []
+        for (family, ids, conn), names in zip(self.host_blocks, self.element_materials):
+            if self.volume_elements is not None:
+                in_set = np.isin(ids, self.volume_elements)
+            else:
+                in_set = np.ones(len(ids), dtype=bool)
+            groups.append((family, self.host.coords[conn, :d], conn, names, in_set))
+        if self.embedded is not None:
+            dof_node = np.zeros(len(self.embedded.node_ids), dtype=np.int64)
+            dof_node[self.embedded_rows] = self.nh + np.arange(ne)
+            for family, ids, conn in self.embedded_blocks:
+                names = np.empty(len(ids), dtype=object)
+                names.fill('EMBEDDED')
+                groups.append((family, self.embedded.coords[conn, :d], dof_node[conn], names,
+                               np.zeros(len(ids), dtype=bool)))
+
+        D = {}
+        blocks = []
+        volume = 0.
+        for family, xe, nodes, names, in_set in groups:
+            dofs = (nodes[:, :, None] * d + np.arange(d)).reshape(len(nodes), -1)
+            selected = np.ones(len(nodes), dtype=bool)
+            if envelope is not None:
+                selected = np.equal(names, 'ENRICH') == envelope
+            elements = np.nonzero(selected)[0]
+            if not len(elements):
+                continue
+            for name in set(names[elements]):
+                if name not in D:
+                    D[name] = self.material_matrix(name)
+            ke, ve = group_stiffness(family, xe[elements], names[elements], D)
+            volume += float(ve[in_set[elements]].sum())
+            blocks.append((dofs[elements], ke))
+        return blocks, volume
+
+    def ndof(self):
+        """Host then embedded node DOFs"""
+        return (self.nh + len(self.embedded_rows)) * self.dimension
+
+    def assemble(self, envelope=None):
+        """Global stiffness over the host then the embedded node DOFs, and the SET-1 volume.
+
+        envelope=True keeps only the ENRICH elements, False all the others.
+        """
+        blocks, volume = self.element_matrices(envelope)
+        return assemble_csr(blocks, self.ndof()), volume
+
+    def volumes(self):
+        """mesh_volumes.VOLUMES of the host and embedded parts, as the plugin records them"""
+        return deck_volumes(self.host, self.embedded)
+
+    def initial_enrich(self, method):
+        """ENRICH estimated with one of initial_guess.ESTIMATES"""
+        volumes = self.volumes()
+        phases = []
+        for name in ('MATRIX', 'EMBEDDED'):
+            elastic_type, values = self.materials[name]
+            if elastic_type.upper() != 'ISOTROPIC':
+                raise ValueError('The %s estimate needs an isotropic %s material' % (method, name))
+            phases.append(tuple(float(v) for v in values[:2]))
+        rve_volume, inclusion_volume = phase_volumes(volumes)
+        return initial_enrich(method, rve_volume, inclusion_volume, phases[0], phases[1], self.dimension)
+
+    def condense(self):
+        """Schur complement of the inner RVE on the envelope and REFMACRO DOFs.
+
+        The unknowns are q = (u_r, h), u = [T G] q. The reduced DOFs no ENRICH
+        element depends on are interior: with no load on them, eliminating
+        them from the inner stiffness is exact. Only the interface columns
+        of the coupling block C carry the correction C^T K_ii^-1 C: below
+        SCHUR_DENSE_LIMIT interface DOFs it is formed and added to schur,
+        otherwise it stays a LinearOperator over the factorization of K_ii
+        and schur only holds the sparse boundary block.
+        """
+        start = time.time()
+        A = sp.hstack([self.T, self.G], format='csr')
+        nr = self.T.shape[1]
+        K_in, volume_in = self.assemble(envelope=False)
+        K_env, volume_env = self.assemble(envelope=True)
+        env_rows = np.unique(K_env.tocoo().row)
+        boundary = np.union1d(np.unique(A[env_rows].indices), np.arange(nr, A.shape[1]))
+        interior = np.setdiff1d(np.arange(A.shape[1]), boundary)
+
+        KA = (A.T * (K_in * A)).tocsr()
+        K_IB = KA[interior][:, boundary].tocsc()
+        interface = np.unique(K_IB.tocoo().col)
+        lu = splu(KA[interior][:, interior].tocsc())
+        self.schur = KA[boundary][:, boundary].tocsr()
+        if len(interface) <= SCHUR_DENSE_LIMIT:
+            coupling = K_IB[:, interface].toarray()
+            correction = np.dot(coupling.T, lu.solve(coupling))
+            ii, jj = np.meshgrid(interface, interface, indexing='ij')
+            self.schur = (self.schur
+                          - sp.csr_matrix((correction.ravel(), (ii.ravel(), jj.ravel())),
+                                          shape=(len(boundary), len(boundary)))).tocsr()
+            self.correction = None
+        else:
+            def apply(x):
+                return K_IB.T * lu.solve(np.asarray(K_IB * x, dtype=float))
+            self.correction = LinearOperator((len(boundary), len(boundary)), matvec=apply, matmat=apply,
+                                             dtype=float)
+        self.boundary = boundary
+        self.A_env = A
+        self.volume = volume_in + volume_env
+        print('inner RVE condensed: %d interior, %d envelope and REFMACRO DOFs, %d interface%s (%.1f s)'
+              % (len(interior), len(boundary), len(interface),
+                 '' if self.correction is None else ' (Schur complement kept factorized)', time.time() - start))
+
+    def set_enrich(self, elastic_type, table):
+        self.materials['ENRICH'] = (elastic_type, table)
+        self.K = None
+        self.operator = None
+
+    def solve(self, homotot):
+        """(REFMACRO reactions, SET-1 volume) of every load case.
+
+        The reduced stiffness is factorized once and all the load cases are
+        solved as the columns of one right-hand side.
+        """
+        d = self.dimension
+        H = np.array([[DefMat[j][k] for j in range(d) for k in range(d)] for DefMat in homotot]).T
+        if self.condensed:
+            return self.solve_condensed(H)
+        if self.pcg is not None:
+            return self.solve_pcg(H)
+        if self.K is None:
+            self.K, self.volume = self.assemble()
+        K, T, G = self.K, self.T, self.G
+        Krr = (T.T * (K * T)).tocsc()
+        lu = splu(Krr)
+        U = T * lu.solve(-(T.T * (K * (G * H)))) + G * H
+        R = G.T * (K * U)
+        return [(R[:, c], self.volume) for c in range(H.shape[1])]
+
+    def solve_condensed(self, H):
+        """solve() on the condensed system: envelope stiffness plus the Schur complement"""
+        if self.boundary is None:
+            self.condense()
+        if self.K is None:
+            A = self.A_env
+            K_env, volume = self.assemble(envelope=True)
+            self.K = (self.schur + (A.T * (K_env * A)).tocsr()[self.boundary][:, self.boundary]).tocsr()
+        nh = H.shape[0]
+        nf = len(self.boundary) - nh  # the REFMACRO DOFs are the last columns of [T G]
+        if self.correction is not None:
+            return self.solve_factorized_schur(H, nf)
+        K = self.K
+        Kff = K[:nf][:, :nf]
+        rhs = -(K[:nf][:, nf:] * H)
+        if Kff.nnz > DENSE_FRACTION * nf * nf:
+            # the interface block makes the system dense: dense Cholesky beats SuperLU
+            uf = cho_solve(cho_factor(Kff.toarray()), rhs)
+        else:
+            uf = splu(Kff.tocsc()).solve(rhs)
+        R = K[nf:][:, :nf] * uf + K[nf:][:, nf:] * H
+        return [(R[:, c], self.volume) for c in range(H.shape[1])]
+
+    def solve_factorized_schur(self, H, nf):
+        """solve_condensed() with the Schur correction applied through the inner factorization.
+
+        The free DOFs are solved by conjugate gradients preconditioned by the
+        sparse part of their block (the correction only softens it), from
+        the solution of the previous iteration.
+        """
+        K = self.K
+        operator = SchurOperator(K[:nf][:, :nf], self.correction, nf)
+        U = np.zeros((K.shape[0], H.shape[1]))
+        U[nf:] = H
+        rhs = -(K[:nf] * U - self.correction.matmat(U)[:nf])
+        X0 = self.pcg_solution if self.pcg_solution is not None and self.pcg_solution.shape[1] == H.shape[1] else None
+        self.pcg_log = []
+        for c in range(H.shape[1]):
+            start = time.time()
+            U[:nf, c], residuals = pcg(operator, rhs[:, c], None if X0 is None else X0[:, c], self.pcg_tol)
+            self.pcg_log.append({'case': c + 1, 'iterations': len(residuals) - 1, 'residuals': residuals,
+                                 'seconds': time.time() - start})
+        self.pcg_solution = U[:nf].copy()
+        for entry in self.pcg_log:
+            print('load case %d: %d PCG iterations, residual %.2e (%.1f s)'
+                  % (entry['case'], entry['iterations'], entry['residuals'][-1], entry['seconds']))
+        R = K[nf:] * U - self.correction.matmat(U)[nf:]
+        return [(R[:, c], self.volume) for c in range(H.shape[1])]
+
+    def solve_pcg(self, H):
+        """solve() by matrix-free conjugate gradients, one load case at a time"""
+        if self.inner_blocks is None:
+            self.inner_blocks, self.inner_volume = self.element_matrices(envelope=False)
+        if self.operator is None:
+            env_blocks, volume = self.element_matrices(envelope=True)
+            self.volume = self.inner_volume + volume
+            self.operator = ReducedOperator(ElementOperator(self.inner_blocks + env_blocks, self.ndof()),
+                                            self.T, self.G, self.dimension, self.pcg)
+        X0 = self.pcg_solution if self.pcg_solution is not None and self.pcg_solution.shape[1] == H.shape[1] else None
+        self.pcg_solution, R, self.pcg_log = solve_cases(self.operator, H, X0, self.pcg_tol)
+        for entry in self.pcg_log:
+            print('load case %d: %d PCG iterations, residual %.2e (%.1f s)'
+                  % (entry['case'], entry['iterations'], entry['residuals'][-1], entry['seconds']))
+        return [(R[:, c], self.volume) for c in range(H.shape[1])]
+
+def solve_model(model_path, iteration=4, dimension=None, tol=None, acceleration=None, relaxation=1.0,
+                suffix='', initial='matrix', previous=None, store_path=None, resume=False, condense=False,
+                pcg=None, pcg_tol=PCG_TOLERANCE):
+    """Run the enrichment loop of a -model.inp; returns the run_enrichment history.
+
+    suffix is appended to the name of the PBC-*.dat files (e.g. to keep the
+    runs of a comparison apart). ENRICH starts from the initial estimate
+    (initial_guess.ESTIMATES), or from the PBC-*.dat of a previous RVE.
+    With store_path, the iterations, phase volumes, mesh size and stage
+    times also go to that results store. resume continues from the
+    completed iterations of PBC-*-nD-state.json. condense solves the
+    iterations on the envelope plus the condensed inner RVE; pcg (a
+    preconditioner) solves them matrix-free by conjugate gradients.
+    """
+    start = time.time()
+    deck = read_model(model_path)
+    solver = RVESolver(deck, dimension, condense, pcg, pcg_tol)
+    print('%s: %d host nodes, %d reduced DOFs (%.1f s)' % (os.path.basename(model_path), solver.nh,
+                                                         solver.T.shape[1], time.time() - start))
+    name = os.path.splitext(os.path.basename(model_path))[0]
+    prefix = name[0:-6] if name.endswith('-model') else name
+    start_enrich = None
+    if previous:
+        start_enrich = warm_start(previous, solver.dimension)
+    elif initial != 'matrix':
+        start_enrich = solver.initial_enrich(initial)
+    store = None
+    if store_path:
+        store = ResultsStore(store_path)
+        store.rve_id(prefix + suffix, os.path.dirname(os.path.abspath(model_path)), solver.dimension)
+        store.add_quantities(prefix + suffix, 'volume', solver.volumes())
+        store.add_quantities(prefix + suffix, 'mesh', {
+            'nodes': solver.nh, 'elements': sum(len(ids) for family, ids, conn in solver.host_blocks),
+            'reduced_dofs': solver.T.shape[1]})
+    setup = time.time() - start
+    folder = os.path.dirname(os.path.abspath(model_path))
+    state = RunState(state_path(folder, prefix + suffix, solver.dimension), resume)
+    history = run_enrichment(solver, iteration, solver.dimension, prefix + suffix, folder, tol,
+                             acceleration, relaxation, start_enrich, store, state)
+    if store is not None:
+        store.add_quantities(prefix + suffix, 'timing', {'setup': setup, 'enrichment': time.time() - start - setup})
+        store.close()
+    print('%d iterations, last written to %s (%.1f s)' % (len(history), history[-1]['path'],
+                                                           time.time() - start))
+    return history
+
+
+def compare_updates(model_path, iteration, dimension, tol, acceleration, relaxation, initial='matrix',
+                    previous=None, store_path=None):
+    """Run the plain scheme and the accelerated one, print iterations and wall time"""
+    runs = [('plain', None, 1.0), (acceleration or 'relaxation', acceleration, relaxation)]
+    summary = []
+    for label, method, factor in runs:
+        start = time.time()
+        history = solve_model(model_path, iteration, dimension, tol, method, factor, '-' + label,
+                              initial, previous, store_path)
+        summary.append((label, len(history), history[-1]['change'], time.time() - start))
+    print('%-12s %10s %16s %10s' % ('update', 'iterations', 'last change', 'seconds'))
+    for label, count, change, seconds in summary:
+        print('%-12s %10d %16.3e %10.1f' % (label, count, change or 0., seconds))
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Envelope enrichment of a -model.inp without Abaqus')
+    parser.add_argument('model', help='NAME-model.inp written by create_model_inp or unv_to_inp_model')
+    parser.add_argument('--iterations', type=int, default=4,
+                        help='enrichment iterations (maximum count with --tol)')
+    parser.add_argument('--tol', type=float, default=None,
+                        help='stop once the relative change of the stiffness is below tol')
+    parser.add_argument('--dimension', type=int, choices=[2, 3], default=None,
+                        help='2 or 3 (default: from the element types)')
+    parser.add_argument('--acceleration', choices=['aitken', 'anderson'], default=None,
+                        help='accelerated update of ENRICH between iterations')
+    parser.add_argument('--relaxation', type=float, default=1.0,
+                        help='under-relaxation factor of the update (default 1: none)')
+    parser.add_argument('--compare', action='store_true',
+                        help='also run the plain scheme and report both iteration counts and times')
+    parser.add_argument('--initial', choices=ESTIMATES, default='matrix',
+                        help='ENRICH before the first iteration: copy of MATRIX (default), Voigt, Reuss, '
+                             'Hashin-Shtrikman (mean of the bounds) or Mori-Tanaka estimate')
+    parser.add_argument('--warm-start', default=None, metavar='PBC.dat',
+                        help='start ENRICH from the converged stiffness of a previous RVE')
+    parser.add_argument('--store', default=None, metavar='campaign.db',
+                        help='also record the run in this results store (see results_store.py)')
+    parser.add_argument('--resume', action='store_true',
+                        help='continue an interrupted run from its PBC-*-nD-state.json')
+    parser.add_argument('--condense', action='store_true',
+                        help='condense the inner RVE once, iterations then only solve the envelope')
+    parser.add_argument('--pcg', choices=PRECONDITIONERS, default=None,
+                        help='matrix-free conjugate gradients with this preconditioner instead of '
+                             'the direct factorization (large 3D RVEs)')
+    parser.add_argument('--pcg-tol', type=float, default=PCG_TOLERANCE,
+                        help='relative residual of the conjugate gradients (default %g)' % PCG_TOLERANCE)
+    args = parser.parse_args()
+    if args.compare:
+        compare_updates(args.model, args.iterations, args.dimension, args.tol, args.acceleration,
+                        args.relaxation, args.initial, args.warm_start, args.store)
+    else:
+        solve_model(args.model, args.iterations, args.dimension, args.tol, args.acceleration,
+                    args.relaxation, initial=args.initial, previous=args.warm_start, store_path=args.store,
+                    resume=args.resume, condense=args.condense, pcg=args.pcg, pcg_tol=args.pcg_tol)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,7 +3,7 @@
 
 a = Analysis(
     ['main_GUI.py'],
-    pathex=[],
+    pathex=['../abaqus_plugin'],
     binaries=[],
     datas=[],
     hiddenimports=[],
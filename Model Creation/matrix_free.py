@@ -0,0 +1,140 @@
+# Matrix-free operators of the homogenization solver: the stiffness is applied
+# element group by element group from the stored element matrices (memory
+# linear in the element count, no global matrix and no fill-in), and the
+# reduced system of the periodic elimination is solved by preconditioned
+# conjugate gradients with a Jacobi or node block-Jacobi preconditioner.
+
+import time
+import numpy as np
+
+PRECONDITIONERS = ('jacobi', 'block')
+PCG_TOLERANCE = 1e-8
+PCG_MAX_ITERATIONS = 20000
+
+
+class ElementOperator:
+    """y = K x from the element stiffness matrices of homogenization_solver.element_matrices.
+
+    blocks is [(element DOFs (m, nd), element stiffness (m, nd, nd))]; each
+    product gathers the element DOFs, multiplies the whole group in one
+    einsum and scatters back with bincount.
+    """
+    def __init__(self, blocks, ndof):
+        self.blocks = [(dofs, ke) for dofs, ke in blocks if len(dofs)]
+        self.ndof = ndof
+
+    def dot(self, x):
+        x = np.asarray(x, dtype=float)
+        if x.ndim == 2:
+            return np.column_stack([self.dot(x[:, c]) for c in range(x.shape[1])])
+        y = np.zeros(self.ndof)
+        for dofs, ke in self.blocks:
+            ye = np.einsum('mij,mj->mi', ke, x[dofs])
+            y += np.bincount(dofs.ravel(), ye.ravel(), minlength=self.ndof)
+        return y
+
+    def node_blocks(self, d):
+        """Diagonal (d, d) blocks of K, one per node, as an (ndof / d, d, d) array"""
+        nodes = self.ndof // d
+        result = np.zeros((nodes, d, d))
+        for dofs, ke in self.blocks:
+            m, nd = dofs.shape
+            n = nd // d
+            k = ke.reshape(m, n, d, n, d)[:, np.arange(n), :, np.arange(n), :]  # (n, m, d, d)
+            node = (dofs[:, ::d] // d).T.ravel()
+            k = k.reshape(n * m, d * d)
+            for c in range(d * d):
+                result.reshape(nodes, d * d)[:, c] += np.bincount(node, k[:, c], minlength=nodes)
+        return result
+
+
+class ReducedOperator:
+    """Reduced stiffness T^T K T of the periodic elimination u = T u_r + G h, matrix-free.
+
+    The preconditioner is built from the diagonal node blocks of K summed
+    over each periodic tree (weights squared for the embedded nodes):
+    'jacobi' keeps their diagonal, 'block' inverts the (d, d) blocks. The
+    couplings between nodes of one tree sharing an element are left out.
+    """
+    def __init__(self, operator, T, G, d, preconditioner='block'):
+        if preconditioner not in PRECONDITIONERS:
+            raise ValueError('Unknown preconditioner %s (%s)' % (preconditioner, ', '.join(PRECONDITIONERS)))
+        self.K = operator
+        self.T = T
+        self.G = G
+        self.d = d
+        Tn = T[::d, ::d]  # T is kron(Tn, I_d): node weights
+        blocks = (Tn.multiply(Tn).T * operator.node_blocks(d).reshape(-1, d * d)).reshape(-1, d, d)
+        if preconditioner == 'jacobi':
+            self.inverse = np.zeros_like(blocks)
+            for k in range(d):
+                self.inverse[:, k, k] = 1. / blocks[:, k, k]
+        else:
+            self.inverse = np.linalg.inv(blocks)
+
+    def dot(self, x):
+        return self.T.T * self.K.dot(self.T * x)
+
+    def precondition(self, r):
+        d = self.d
+        return np.einsum('nij,nj->ni', self.inverse, r.reshape(-1, d)).ravel()
+
+    def rhs(self, h):
+        """Load of the prescribed REFMACRO displacements h: -T^T K G h"""
+        return -(self.T.T * self.K.dot(self.G * h))
+
+    def reactions(self, x, h):
+        """REFMACRO reactions G^T K u of u = T x + G h"""
+        return self.G.T * self.K.dot(self.T * x + self.G * h)
+
+
+def pcg(operator, b, x0=None, tol=PCG_TOLERANCE, maxiter=PCG_MAX_ITERATIONS):
+    """Preconditioned conjugate gradients on operator.dot / operator.precondition.
+
+    Stops once |r| <= tol |b|; returns x and the relative residual of every
+    iteration.
+    """
+    x = np.zeros_like(b) if x0 is None else x0.copy()
+    r = b - operator.dot(x) if x0 is not None else b.copy()
+    norm_b = np.linalg.norm(b)
+    if norm_b == 0.:
+        return np.zeros_like(b), [0.]
+    residuals = [np.linalg.norm(r) / norm_b]
+    z = operator.precondition(r)
+    p = z.copy()
+    rz = np.dot(r, z)
+    for k in range(maxiter):
+        if residuals[-1] <= tol:
+            return x, residuals
+        Ap = operator.dot(p)
+        alpha = rz / np.dot(p, Ap)
+        x += alpha * p
+        r -= alpha * Ap
+        residuals.append(np.linalg.norm(r) / norm_b)
+        z = operator.precondition(r)
+        rz, rz_old = np.dot(r, z), rz
+        p = z + (rz / rz_old) * p
+    if residuals[-1] > tol:
+        raise RuntimeError('PCG did not converge in %d iterations (relative residual %.3e)'
+                           % (maxiter, residuals[-1]))
+    return x, residuals
+
+
+def solve_cases(operator, H, X0=None, tol=PCG_TOLERANCE, maxiter=PCG_MAX_ITERATIONS):
+    """Reduced displacements and reactions of the load cases (columns of H).
+
+    X0, the solution of the previous enrichment iteration, is the starting
+    point of each case. Returns (X, R, log), log holding the iteration
+    count, the residual history and the wall time of every load case.
+    """
+    X = np.zeros((operator.T.shape[1], H.shape[1]))
+    R = np.zeros((operator.G.shape[1], H.shape[1]))
+    log = []
+    for c in range(H.shape[1]):
+        start = time.time()
+        x0 = None if X0 is None else X0[:, c]
+        X[:, c], residuals = pcg(operator, operator.rhs(H[:, c]), x0, tol, maxiter)
+        R[:, c] = operator.reactions(X[:, c], H[:, c])
+        log.append({'case': c + 1, 'iterations': len(residuals) - 1, 'residuals': residuals,
+                    'seconds': time.time() - start})
+    return X, R, log
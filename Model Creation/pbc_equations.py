@@ -0,0 +1,198 @@
+# Periodic constraint equations computed offline from the mesh and written
+# straight into the input deck as *EQUATION blocks (no per-node sets)
+
+import argparse
+import os
+import sys
+import numpy as np
+from scipy.spatial import cKDTree
+
+PLUGIN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'abaqus_plugin')
+if PLUGIN_DIR not in sys.path:
+    sys.path.append(PLUGIN_DIR)
+from inp_reader import element_blocks, parse_file
+from pbc_tools import pair_nodes, DofForest
+from periodicity_check import FACTOR, characteristic_length
+
+AXES = ['X', 'Y', 'Z']
+
+
+def find_set(node_sets, name):
+    """Case-insensitive lookup of a node set (gmsh writes Nminx, Abaqus NMINX)"""
+    for key in node_sets:
+        if key.upper() == name.upper():
+            return np.asarray(node_sets[key], dtype=np.int64)
+    return None
+
+
+def detect_dimension(node_sets):
+    return 3 if find_set(node_sets, 'NMINZ') is not None else 2
+
+
+def pairing_tolerance(mesh, factor=FACTOR):
+    """factor times the smallest element edge of a MeshData, the pairing tolerance
+    of periodicity_check (0.1 * the smallest edge)"""
+    blocks = [(family, conn) for family, ids, conn in element_blocks(mesh)]
+    return factor * characteristic_length(mesh.coords, blocks)
+
+
+def face_tolerance(coords, factor=FACTOR):
+    """factor times the smallest distance between two of the nodes coords, for
+    node sets given without their elements"""
+    if len(coords) < 2:
+        return 0.
+    distance, index = cKDTree(coords).query(coords, k=2)
+    spacing = distance[:, 1]
+    spacing = spacing[spacing > 0]
+    return factor * float(spacing.min()) if len(spacing) else 0.
+
+
+def face_sets_tolerance(labels, coords, node_sets, dimension=None, factor=FACTOR):
+    """face_tolerance of the NMIN*/NMAX* nodes, the default pairing tolerance"""
+    labels = np.asarray(labels, dtype=np.int64)
+    coords = np.asarray(coords, dtype=float)
+    if dimension is None:
+        dimension = detect_dimension(node_sets)
+    order = np.argsort(labels)
+    faces = [find_set(node_sets, prefix + AXES[k]) for k in range(dimension) for prefix in ('NMIN', 'NMAX')]
+    faces = [order[np.searchsorted(labels[order], labels_k)] for labels_k in faces if labels_k is not None]
+    return face_tolerance(coords[np.concatenate(faces)], factor) if faces else 0.
+
+
+def periodic_links(labels, coords, node_sets, dimension=None, tol=None):
+    """Pair NMIN*/NMAX* nodes and orient the links so no DOF is eliminated twice.
+
+    Returns (dependent, independent, dx) where dx = x_dependent - x_independent.
+    tol is the pairing distance: pairing_tolerance of the mesh to match the
+    plugin, by default face_tolerance of the NMIN*/NMAX* nodes.
+    """
+    labels = np.asarray(labels, dtype=np.int64)
+    coords = np.asarray(coords, dtype=float)
+    order = np.argsort(labels)
+    sorted_labels = labels[order]
+
+    def rows(set_labels):
+        return order[np.searchsorted(sorted_labels, set_labels)]
+
+    if dimension is None:
+        dimension = detect_dimension(node_sets)
+    period = coords.max(axis=0) - coords.min(axis=0)
+    if tol is None:
+        tol = face_sets_tolerance(labels, coords, node_sets, dimension)
+
+    pairs = {}
+    for k in range(dimension):
+        set_min = find_set(node_sets, 'NMIN' + AXES[k])
+        set_max = find_set(node_sets, 'NMAX' + AXES[k])
+        if set_min is None or set_max is None:
+            print('Missing node sets NMIN%s/NMAX%s, direction skipped' % (AXES[k], AXES[k]))
+            continue
+        translation = np.zeros(3)
+        translation[k] = period[k]
+        i, j = pair_nodes(coords[rows(set_min)], coords[rows(set_max)], translation, tol)
+        if len(i) < len(set_min):
+            print('%d nodes of NMIN%s without periodic partner' % (len(set_min) - len(i), AXES[k]))
+        pairs[k] = (set_min[i], set_max[j])
+    return links_from_pairs(labels, coords, pairs)
+
+
+def links_from_pairs(labels, coords, pairs):
+    """Orient ready-made pair tables {axis: (master labels, slave labels)}.
+
+    Used directly with the node correspondence reported by gmsh for the
+    periodic faces, so no coordinate matching is needed.
+    Returns (dependent, independent, dx) as periodic_links.
+    """
+    labels = np.asarray(labels, dtype=np.int64)
+    coords = np.asarray(coords, dtype=float)
+    if coords.shape[1] < 3:
+        coords = np.hstack([coords, np.zeros((len(coords), 3 - coords.shape[1]))])
+    order = np.argsort(labels)
+    sorted_labels = labels[order]
+
+    forest = DofForest()
+    for k in sorted(pairs):
+        masters, slaves = pairs[k]
+        for n1, n2 in zip(np.asarray(masters).tolist(), np.asarray(slaves).tolist()):
+            forest.addBranch([n1, n2])
+
+    links = np.array(forest.chains(), dtype=np.int64).reshape(-1, 2)
+    dx = coords[order[np.searchsorted(sorted_labels, links[:, 0])]] - \
+        coords[order[np.searchsorted(sorted_labels, links[:, 1])]]
+    return links[:, 0], links[:, 1], dx
+
+
+def write_equations(f, dependent, independent, dx, dimension, instance='RVEplus-1',
+                    ref_sets=('RefMacro1', 'RefMacro2', 'RefMacro3'), tol=0.):
+    """Write the large-strain periodic equations of MakeSingleEquation as one *Equation block.
+
+    Offsets |dx| <= tol, the pairing tolerance, are no period and get no
+    REFMACRO term (tol None: 0).
+    """
+    if tol is None:
+        tol = 0.
+    f.write('** Constraint: periodic boundary conditions\n*Equation\n')
+    for dof in range(1, dimension+1):
+        ref = ref_sets[dof-1]
+        for n1, n2, d in zip(dependent.tolist(), independent.tolist(), dx.tolist()):
+            terms = ['%s.%d, %d, 1.' % (instance, n1, dof), '%s.%d, %d, -1.' % (instance, n2, dof)]
+            for k in range(dimension):
+                if abs(d[k]) > tol:
+                    terms.append('%s, %d, %.12g' % (ref, k+1, -d[k]))
+            f.write('%d\n' % len(terms))
+            for i in range(0, len(terms), 4):
+                f.write(', '.join(terms[i:i+4]) + '\n')
+    return len(dependent) * dimension
+
+
+def insert_equations(model_path, labels, coords, node_sets, dimension=None,
+                     instance='RVEplus-1', ref_sets=('RefMacro1', 'RefMacro2', 'RefMacro3'), tol=None):
+    """Stream model_path into a copy holding the equations before *End Assembly.
+
+    tol defaults to face_sets_tolerance, used both to pair the nodes and to
+    drop the offsets within it.
+    """
+    if dimension is None:
+        dimension = detect_dimension(node_sets)
+    if tol is None:
+        tol = face_sets_tolerance(labels, coords, node_sets, dimension)
+    dependent, independent, dx = periodic_links(labels, coords, node_sets, dimension, tol)
+    tmp_path = model_path + '.tmp'
+    count = 0
+    with open(model_path, 'r') as src, open(tmp_path, 'w') as dst:
+        for line in src:
+            if line.lower().startswith('*end assembly'):
+                count = write_equations(dst, dependent, independent, dx, dimension, instance, ref_sets, tol)
+            dst.write(line)
+    os.replace(tmp_path, model_path)
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Periodic constraints of a VER mesh as *Equation blocks')
+    parser.add_argument('ver', help='NAME-VER.inp')
+    parser.add_argument('model', nargs='?', default=None,
+                        help='NAME-model.inp receiving the equations (default: NAME-VER-equations.inp include)')
+    parser.add_argument('--tol', type=float, default=None,
+                        help='pairing tolerance (default: factor times the smallest element edge)')
+    parser.add_argument('--factor', type=float, default=FACTOR,
+                        help='pairing tolerance as a fraction of the smallest edge (default %g)' % FACTOR)
+    args = parser.parse_args()
+    mesh, material = parse_file(args.ver)
+    labels = mesh.node_ids
+    coords = mesh.coords
+    tol = args.tol if args.tol is not None else pairing_tolerance(mesh, args.factor)
+    if args.model is not None:
+        count = insert_equations(args.model, labels, coords, mesh.nodeSets, tol=tol)
+        print('%d equations written to %s (tolerance %g)' % (count, args.model, tol))
+    else:
+        out = os.path.splitext(args.ver)[0] + '-equations.inp'
+        dimension = detect_dimension(mesh.nodeSets)
+        dependent, independent, dx = periodic_links(labels, coords, mesh.nodeSets, dimension, tol)
+        with open(out, 'w') as f:
+            count = write_equations(f, dependent, independent, dx, dimension, tol=tol)
+        print('%d equations written to %s (use *Include, input=%s)' % (count, out, os.path.basename(out)))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,7 @@
 import os
 import re
 import numpy as np
+from boundary_nodesets import classify_boundary, write_nsets
 
 class UnvData:
     def __init__(self):
@@ -156,23 +157,10 @@ def convert_element_type(unv_type):
 def write_inp_model(unv_data, output_path):
     """Write the INP model file in the required format"""
     # Find border nodes (using small tolerance for float comparison)
-    tolerance = 1e-6
-    nminx = []
-    nmaxx = []
-    nminy = []
-    nmaxy = []
-    
-    for node_id, coords in unv_data.nodes.items():
-        # Check X borders
-        if abs(coords[0] - unv_data.minpos[0]) < tolerance:
-            nminx.append(node_id)
-        if abs(coords[0] - unv_data.maxpos[0]) < tolerance:
-            nmaxx.append(node_id)
-        # Check Y borders
-        if abs(coords[1] - unv_data.minpos[1]) < tolerance:
-            nminy.append(node_id)
-        if abs(coords[1] - unv_data.maxpos[1]) < tolerance:
-            nmaxy.append(node_id)
+    node_ids = np.array(sorted(unv_data.nodes), dtype=np.int64)
+    coords = np.array([unv_data.nodes[n] for n in node_ids.tolist()], dtype=float).reshape(len(node_ids), -1)
+    border_sets = classify_boundary(node_ids, coords, unv_data.minpos, unv_data.maxpos,
+                                    dimension=2, tol=1e-6)
 
     with open(output_path, 'w') as f:
         # Header - matching Abaqus format exactly
@@ -275,19 +263,8 @@ def write_inp_model(unv_data, output_path):
         if all_elements:
             f.write(f"{min(all_elements):>8}, {max(all_elements):>8}, {1:>8}\n")
 
-        for set_name, nodes in [
-            ('NMINX', nminx),
-            ('NMAXX', nmaxx),
-            ('NMINY', nminy),
-            ('NMAXY', nmaxy)
-        ]:
-            if nodes:
-                f.write(f"*Nset, nset={set_name}, instance=RVEPLUS-1\n")
-                # Write 16 nodes per line with proper spacing
-                for i in range(0, len(nodes), 16):
-                    line_nodes = nodes[i:i+16]
-                    f.write(", ".join(f"{node:>8}" for node in line_nodes) + "\n")
-        
+        write_nsets(f, border_sets, instance='RVEPLUS-1')
+
         f.write("*End Assembly\n")
 
     # Create the .e2a file with model dimensions
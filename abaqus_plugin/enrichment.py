@@ -0,0 +1,286 @@
+# Boucle d'enrichissement de l'enveloppe, commune a tous les solveurs: cas de
+# charge d'homogeneisation, fichiers de rigidite PBC-*-nD.dat et mise a jour
+# du materiau ENRICH.
+
+from __future__ import division, print_function
+
+import os
+import time
+
+import numpy as np
+
+from run_state import RunState
+
+
+def load_cases(dimension):
+    """Macroscopic displacement gradients imposed on REFMACRO1..3 (homotot)"""
+    if dimension == 2:
+        return [
+            [(0.1, 0.0, 0.0), (0.0, 0.0, 0.0)],           # xx
+            [(0.0, 0.0, 0.0), (0.0, 0.1, 0.0)],           # yy
+            [(0.0, 0.05, 0.0), (0.05, 0.0, 0.0)]          # xy
+        ]
+    return [
+        [(0.1, 0.0, 0.0), (0.0, 0.0, 0.0), (0.0, 0.0, 0.0)],    # xx
+        [(0.0, 0.0, 0.0), (0.0, 0.1, 0.0), (0.0, 0.0, 0.0)],    # yy
+        [(0.0, 0.0, 0.0), (0.0, 0.0, 0.0), (0.0, 0.0, 0.1)],    # zz
+        [(0.0, 0.05, 0.0), (0.05, 0.0, 0.0), (0.0, 0.0, 0.0)],  # xy
+        [(0.0, 0.0, 0.05), (0.0, 0.0, 0.0), (0.05, 0.0, 0.0)],  # xz
+        [(0.0, 0.0, 0.0), (0.0, 0.0, 0.05), (0.0, 0.05, 0.0)]   # yz
+    ]
+
+
+def stress_index(dimension):
+    """Position of s11, s22, (s33,) s12, (s13, s23) in the reference point reactions"""
+    if dimension == 2:
+        return [0, 3, 1]
+    return [0, 4, 8, 1, 2, 5]
+
+
+def stiffness_row(rf, volume, idx):
+    """One row of C: |RF / volume| divided by the 0.1 imposed strain"""
+    return [abs(10 * float(rf[i]) / volume) for i in idx]
+
+
+def dat_path(folder, prefix, iteration, dimension):
+    return os.path.join(folder, 'PBC-%s-%d-%dD.dat' % (prefix, iteration, dimension))
+
+
+def write_stiffness(path, C):
+    f = open(path, 'w')
+    for val in C:
+        for subval in val:
+            f.write(str(subval) + ' ')
+        f.write('\n')
+    f.close()
+
+
+def read_stiffness(path, dimension):
+    """(3, 3) or (6, 6) stiffness written by write_stiffness"""
+    f = open(path, 'r')
+    data = f.read()
+    f.close()
+    size = 3 if dimension == 2 else 6
+    return np.reshape([float(v) for v in data.split()], (size, size))
+
+
+def enrich_elastic(sd, dimension):
+    """Elastic definition of ENRICH from a homogenized stiffness.
+
+    3D: the full ANISOTROPIC table (D1111, D1122, D2222, D1133, ...).
+    2D: the isotropic average (Emed, NUmed) of the plane stress moduli.
+    Returns (elastic type, table).
+    """
+    if dimension == 3:
+        return 'ANISOTROPIC', tuple(sd[i][j] for j in range(6) for i in range(j+1))
+    s11 = sd[0][0]
+    s12 = sd[0][1]
+    s22 = sd[1][1]
+    E1 = s11 - ((s12 * s12) / s22)
+    E2 = s22 - ((s12 * s12) / s11)
+    E3 = (s11 * s22 - (s12 * s12)) / s22
+    E4 = (s11 * s22 - (s12 * s12)) / s11
+    Emed = (E1 + E2 + E3 + E4) / 4
+
+    NU1 = s12 / s22
+    NU2 = s12 / s11
+    NU3 = ((s12 * s12) / (s11 * s22)) ** 0.5
+    NUmed = (NU1 + NU2 + NU3) / 3.
+    return 'ISOTROPIC', (Emed, NUmed)
+
+
+def relative_change(C, previous):
+    """||C - previous|| / ||C|| (Frobenius norms)"""
+    C = np.asarray(C, dtype=float)
+    previous = np.asarray(previous, dtype=float)
+    return float(np.linalg.norm(C - previous) / np.linalg.norm(C))
+
+
+def history_path(folder, prefix, dimension):
+    return os.path.join(folder, 'PBC-%s-%dD-convergence.log' % (prefix, dimension))
+
+
+def admissible(elastic_type, table):
+    """True if an ENRICH table is a usable elastic material"""
+    if elastic_type == 'ISOTROPIC':
+        E, nu = table
+        return E > 0 and -1. < nu < 0.5
+    D = np.zeros((6, 6))
+    k = 0
+    for j in range(6):
+        for i in range(j + 1):
+            D[i][j] = D[j][i] = table[k]
+            k += 1
+    return bool(np.all(np.linalg.eigvalsh(D) > 0))
+
+
+class FixedPointUpdate(object):
+    """Update of the ENRICH table x from its image g(x) through one solve.
+
+    acceleration:
+        None: x <- x + relaxation * (g(x) - x), the plain scheme for 1.
+        'aitken': same with the relaxation factor adapted each iteration
+            (vector Aitken delta-squared, Irons-Tuck, kept in [0.1, 5]),
+            relaxation being the first factor.
+        'anderson': Anderson mixing of the last depth residuals, damped by
+            relaxation.
+    An accelerated table that is not a valid material (negative modulus,
+    stiffness not positive definite) falls back to the plain update.
+    """
+    def __init__(self, acceleration=None, relaxation=1.0, depth=5):
+        if acceleration not in (None, 'aitken', 'anderson'):
+            raise ValueError('Unknown acceleration %s (aitken, anderson)' % acceleration)
+        self.acceleration = acceleration
+        self.relaxation = relaxation
+        self.depth = depth
+        self.omega = relaxation
+        self.xs = []
+        self.residuals = []
+
+    def update(self, elastic_type, x, gx):
+        """Next table from the table x used by the last solve and its image gx"""
+        gx = np.asarray(gx, dtype=float)
+        if x is None:
+            # first update without an initial table: the copy of MATRIX of the first solve is not known here
+            return tuple(gx)
+        x = np.asarray(x, dtype=float)
+        r = gx - x
+        if self.acceleration == 'aitken' and self.residuals:
+            dr = r - self.residuals[-1]
+            if np.dot(dr, dr) > 0:
+                self.omega = -self.omega * np.dot(self.residuals[-1], dr) / np.dot(dr, dr)
+                self.omega = min(max(self.omega, 0.1), 5.)
+        self.xs = (self.xs + [x])[-(self.depth + 1):]
+        self.residuals = (self.residuals + [r])[-(self.depth + 1):]
+
+        plain = x + self.relaxation * r
+        if self.acceleration == 'aitken':
+            new = x + self.omega * r
+        elif self.acceleration == 'anderson' and len(self.residuals) > 1:
+            dR = np.column_stack([self.residuals[k+1] - self.residuals[k]
+                                  for k in range(len(self.residuals) - 1)])
+            dX = np.column_stack([self.xs[k+1] - self.xs[k] for k in range(len(self.xs) - 1)])
+            gamma = np.linalg.lstsq(dR, r, rcond=-1)[0]
+            new = x + self.relaxation * r - np.dot(dX + self.relaxation * dR, gamma)
+        else:
+            new = plain
+        if not admissible(elastic_type, tuple(new)):
+            print('accelerated ENRICH table is not admissible, plain update used')
+            self.omega = self.relaxation
+            new = plain
+        return tuple(new)
+
+    def state(self):
+        """Relaxation factor and history of the updates, as JSON lists (RunState)"""
+        return {'omega': float(self.omega), 'xs': [x.tolist() for x in self.xs],
+                'residuals': [r.tolist() for r in self.residuals]}
+
+    def restore(self, state):
+        """Continue from a state() saved by an interrupted run"""
+        self.omega = state['omega']
+        self.xs = [np.asarray(x, dtype=float) for x in state['xs']]
+        self.residuals = [np.asarray(r, dtype=float) for r in state['residuals']]
+
+
+def log_entry(log, entry):
+    """Write one history entry to the convergence log"""
+    name = os.path.basename(entry['path'])
+    if entry['change'] is None:
+        log.write('%d  -  %.1f  %s\n' % (entry['iteration'], entry['seconds'], name))
+    else:
+        log.write('%d  %.6e  %.1f  %s\n' % (entry['iteration'], entry['change'], entry['seconds'], name))
+    log.flush()
+
+
+def run_enrichment(backend, iteration, dimension, prefix, folder='', tol=None,
+                   acceleration=None, relaxation=1.0, initial=None, store=None, state=None):
+    """Enrichment loop, independent of the solver doing the load cases.
+
+    backend.set_enrich(elastic_type, table) replaces the ENRICH material and
+    backend.solve(homotot) returns one (reactions, volume) pair per load
+    case, reactions being the REFMACRO1..3 forces in the order of the ODB
+    field (RF1, RF2(, RF3) of REFMACRO1, then REFMACRO2, ...).
+    Iteration i writes PBC-prefix-i-nD.dat. With tol, the loop stops as soon
+    as the relative change of the stiffness between two iterations is below
+    tol, iteration being then the maximum count.
+    acceleration and relaxation select the FixedPointUpdate of the ENRICH
+    table between iterations (default: the plain substitution).
+    initial (elastic type, table) replaces ENRICH before the first iteration
+    (see initial_guess), otherwise the backend keeps its copy of MATRIX.
+    store, a results_store.ResultsStore, also records every iteration under
+    the name prefix.
+    state, a run_state.RunState, makes the run resumable: the iterations it
+    records as completed are not run again (their .dat files are read back),
+    an interrupted iteration keeps its ENRICH table and the FixedPointUpdate
+    continues from its saved Aitken factor and Anderson history.
+    Returns the history, one dict (iteration, path, change, seconds) per
+    iteration, seconds counted from the start of the loop, also written to
+    PBC-prefix-nD-convergence.log.
+    """
+    homotot = load_cases(dimension)
+    idx = stress_index(dimension)
+    updater = FixedPointUpdate(acceleration, relaxation)
+    if state is None:
+        state = RunState()
+    if state.updater is not None:
+        updater.restore(state.updater)
+    history = list(state.history)
+    current = initial
+    previous = None
+    if history:
+        current = state.current
+        previous = read_stiffness(history[-1]['path'], dimension)
+        print('resuming after iteration %d' % history[-1]['iteration'])
+    if store is not None:
+        store.rve_id(prefix, os.path.abspath(folder), dimension)
+    start = time.time() - (history[-1]['seconds'] if history else 0.)
+    log = open(history_path(folder, prefix, dimension), 'w')
+    log.write('# iteration  relative change  seconds  file\n')
+    for entry in history:
+        log_entry(log, entry)
+    if history and tol and history[-1]['change'] is not None and history[-1]['change'] <= tol:
+        log.close()
+        return history
+
+    for i in range(len(history), iteration):
+        pending = state.pending_enrich(i + 1)
+        if pending is not None:
+            current = pending
+            backend.set_enrich(current[0], current[1])
+        elif i > 0:
+            sd = read_stiffness(dat_path(folder, prefix, i, dimension), dimension)
+            elastic_type, image = enrich_elastic(sd, dimension)
+            table = None
+            if current is not None and current[0] == elastic_type:
+                table = current[1]
+            current = (elastic_type, updater.update(elastic_type, table, image))
+            backend.set_enrich(elastic_type, current[1])
+        elif initial is not None:
+            backend.set_enrich(initial[0], initial[1])
+        state.begin(i + 1, current, updater.state())
+
+        C = []
+        for rf, volume in backend.solve(homotot):
+            C.append(stiffness_row(rf, volume, idx))
+        path = dat_path(folder, prefix, i + 1, dimension)
+        write_stiffness(path, C)
+
+        change = None
+        if previous is not None:
+            change = relative_change(C, previous)
+        previous = C
+        entry = {'iteration': i + 1, 'path': path, 'change': change, 'seconds': time.time() - start}
+        history.append(entry)
+        state.end(entry)
+        if store is not None:
+            store.add_iteration(prefix, i + 1, C, change, entry['seconds'], dimension)
+        log_entry(log, entry)
+        if change is None:
+            print('iteration %d' % (i + 1))
+        else:
+            print('iteration %d: relative change of the stiffness %.3e' % (i + 1, change))
+        if tol and change is not None and change <= tol:
+            print('converged after %d iterations (tolerance %g)' % (i + 1, tol))
+            break
+    log.close()
+    return history
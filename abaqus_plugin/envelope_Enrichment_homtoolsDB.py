@@ -64,12 +64,65 @@ class Envelope_Enrichment_homtoolsDB(AFXDataDialog):
         FXRadioButton(dimFrame2, 'Conform', form.meshTypeKw, 5,
                      RADIOBUTTON_NORMAL|LAYOUT_CENTER_Y)
 
+        # One job per iteration (load cases of a perturbation step)
+        FXCheckButton(modelTypeBox, 'All load cases in one job', form.loadCasesKw, 0)
+        # Otherwise the ODBs only hold RF of the reference points
+        FXCheckButton(modelTypeBox, 'Full field output (S, U, IVOL, EE, SENER)', form.fullOutputKw, 0)
+        # Continue from PBC-<model>-nD-state.json
+        FXCheckButton(modelTypeBox, 'Resume an interrupted run', form.resumeKw, 0)
+        # Otherwise the periodic nodes pair within 1e-3
+        FXCheckButton(modelTypeBox, 'Pairing tolerance from the smallest element edge', form.meshToleranceKw, 0)
+
         # Iteration spinner
         spinnerFrame = FXHorizontalFrame(mainFrame)
         spinner = AFXSpinner(spinnerFrame, 6, 'Iteration:', 
                            form.iterationKw, 0)
         spinner.setRange(2, 10)
         spinner.setIncrement(1)
+        AFXTextField(p=spinnerFrame, ncols=8, labelText='Tolerance (0: none):',
+                    tgt=form.toleranceKw, sel=0,
+                    opts=AFXTEXTFIELD_FLOAT|LAYOUT_CENTER_Y)
+
+        # Update of ENRICH between iterations
+        updateFrame = FXHorizontalFrame(mainFrame)
+        combo = AFXComboBox(updateFrame, 0, 3, 'Acceleration:', form.accelerationKw, 0)
+        combo.appendItem('none')
+        combo.appendItem('aitken')
+        combo.appendItem('anderson')
+        AFXTextField(p=updateFrame, ncols=6, labelText='Relaxation:',
+                    tgt=form.relaxationKw, sel=0,
+                    opts=AFXTEXTFIELD_FLOAT|LAYOUT_CENTER_Y)
+
+        # ENRICH before the first iteration
+        initialFrame = FXHorizontalFrame(mainFrame)
+        combo = AFXComboBox(initialFrame, 0, 5, 'Initial ENRICH:', form.initialGuessKw, 0)
+        for estimate in ('matrix', 'voigt', 'reuss', 'hs', 'mt'):
+            combo.appendItem(estimate)
+        AFXTextField(p=initialFrame, ncols=16, labelText='Warm start (PBC .dat):',
+                    tgt=form.warmStartKw, sel=0,
+                    opts=AFXTEXTFIELD_STRING|LAYOUT_CENTER_Y)
+
+        # Campaign results (SQLite file, empty: none)
+        storeFrame = FXHorizontalFrame(mainFrame)
+        AFXTextField(p=storeFrame, ncols=24, labelText='Results store:',
+                    tgt=form.resultsStoreKw, sel=0,
+                    opts=AFXTEXTFIELD_STRING|LAYOUT_CENTER_Y)
+
+        # Embedded constraints precomputed by embedded_locator.py (empty: EmbeddedRegion)
+        embeddedFrame = FXHorizontalFrame(mainFrame)
+        AFXTextField(p=embeddedFrame, ncols=24, labelText='Embedded equations (include):',
+                    tgt=form.embeddedEquationsKw, sel=0,
+                    opts=AFXTEXTFIELD_STRING|LAYOUT_CENTER_Y)
+
+        # CPU budget of the jobs (0: all the cores / even share)
+        cpuFrame = FXHorizontalFrame(mainFrame)
+        cpuSpinner = AFXSpinner(cpuFrame, 4, 'CPUs:', form.cpusKw, 0)
+        cpuSpinner.setRange(0, 256)
+        jobSpinner = AFXSpinner(cpuFrame, 4, 'CPUs per job:', form.cpusPerJobKw, 0)
+        jobSpinner.setRange(0, 256)
+        AFXTextField(p=cpuFrame, ncols=6, labelText='Job time limit (h, 0: none):',
+                    tgt=form.jobTimeoutKw, sel=0,
+                    opts=AFXTEXTFIELD_FLOAT|LAYOUT_CENTER_Y)
 
         # Import button
         import_handler = import_buttonHandler(form)
@@ -26,6 +26,20 @@ class Envelope_Enrichment_homtools_plugin(AFXForm):
         self.iterationKw = AFXIntKeyword(self.cmd, 'iteration', True, 4)
         self.dimensionKw = AFXIntKeyword(self.cmd, 'dimension', True, 3)
         self.meshTypeKw = AFXIntKeyword(self.cmd, 'meshType', True, 4)  # Default to Embedded
+        self.loadCasesKw = AFXBoolKeyword(self.cmd, 'loadCases', AFXBoolKeyword.TRUE_FALSE, True, False)
+        self.cpusKw = AFXIntKeyword(self.cmd, 'cpus', True, 0)  # 0: all the cores
+        self.cpusPerJobKw = AFXIntKeyword(self.cmd, 'cpusPerJob', True, 0)  # 0: even share
+        self.toleranceKw = AFXFloatKeyword(self.cmd, 'tolerance', True, 0.0)  # 0: fixed iteration count
+        self.accelerationKw = AFXStringKeyword(self.cmd, 'acceleration', True, 'none')
+        self.relaxationKw = AFXFloatKeyword(self.cmd, 'relaxation', True, 1.0)  # 1: no under-relaxation
+        self.initialGuessKw = AFXStringKeyword(self.cmd, 'initialGuess', True, 'matrix')
+        self.warmStartKw = AFXStringKeyword(self.cmd, 'warmStart', True, '')
+        self.fullOutputKw = AFXBoolKeyword(self.cmd, 'fullOutput', AFXBoolKeyword.TRUE_FALSE, True, False)
+        self.resultsStoreKw = AFXStringKeyword(self.cmd, 'resultsStore', True, '')  # '': no store
+        self.resumeKw = AFXBoolKeyword(self.cmd, 'resume', AFXBoolKeyword.TRUE_FALSE, True, False)
+        self.embeddedEquationsKw = AFXStringKeyword(self.cmd, 'embeddedEquations', True, '')  # '': EmbeddedRegion
+        self.meshToleranceKw = AFXBoolKeyword(self.cmd, 'meshTolerance', AFXBoolKeyword.TRUE_FALSE, True, False)
+        self.jobTimeoutKw = AFXFloatKeyword(self.cmd, 'jobTimeout', True, 0.0)  # hours, 0: no limit
 
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
     def getFirstDialog(self):
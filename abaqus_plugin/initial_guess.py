@@ -0,0 +1,104 @@
+# Estimation analytique du materiau ENRICH avant la premiere iteration: bornes
+# de Voigt/Reuss, Hashin-Shtrikman ou Mori-Tanaka a partir des fractions
+# volumiques des phases, ou reprise de la rigidite convergee d'un autre VER.
+
+from __future__ import division, print_function
+
+from enrichment import enrich_elastic, read_stiffness
+
+ESTIMATES = ('matrix', 'voigt', 'reuss', 'hs', 'mt')
+
+
+def bulk_shear(E, nu, dimension=3):
+    """(K, G) of an isotropic material, K being the area bulk modulus of plane stress in 2D"""
+    if dimension == 2:
+        return E / (2. * (1. - nu)), E / (2. * (1. + nu))
+    return E / (3. * (1. - 2.*nu)), E / (2. * (1. + nu))
+
+
+def young_poisson(K, G, dimension=3):
+    """(E, nu) of an isotropic material"""
+    if dimension == 2:
+        return 4.*K*G / (K + G), (K - G) / (K + G)
+    return 9.*K*G / (3.*K + G), (3.*K - 2.*G) / (2. * (3.*K + G))
+
+
+def voigt(phases):
+    """Arithmetic mean of the moduli, phases being (fraction, K, G)"""
+    return sum(f * K for f, K, G in phases), sum(f * G for f, K, G in phases)
+
+
+def reuss(phases):
+    """Harmonic mean of the moduli"""
+    return 1. / sum(f / K for f, K, G in phases), 1. / sum(f / G for f, K, G in phases)
+
+
+def hashin_shtrikman(phases, K0, G0, dimension=3):
+    """Hashin-Shtrikman estimate with the reference medium (K0, G0), spherical
+    inclusions in 3D, circular ones (fibre sections) in 2D.
+
+    The stiffest moduli give the upper bound, the softest the lower one and
+    the matrix moduli the Mori-Tanaka estimate.
+    """
+    if dimension == 2:
+        K = 1. / sum(f / (Ki + G0) for f, Ki, Gi in phases) - G0
+        zeta = G0 * K0 / (K0 + 2.*G0)
+    else:
+        K = 1. / sum(f / (Ki + 4.*G0/3.) for f, Ki, Gi in phases) - 4.*G0/3.
+        zeta = G0 / 6. * (9.*K0 + 8.*G0) / (K0 + 2.*G0)
+    G = 1. / sum(f / (Gi + zeta) for f, Ki, Gi in phases) - zeta
+    return K, G
+
+
+def phase_fractions(rve_volume, inclusion_volume, matrix, inclusion, dimension=3):
+    """[(fraction, K, G)] of the matrix then the inclusions of the RVE inside the envelope.
+
+    rve_volume is the volume of the host mesh inside the envelope (MATRIX
+    and INCLUSION* sets): embedded fibres overlap the matrix elements, so
+    the matrix fraction is what the inclusions leave of it. matrix and
+    inclusion are the (E, nu) of the phases; the envelope is not a phase,
+    it is the material being estimated.
+    """
+    f = inclusion_volume / rve_volume
+    if not 0. <= f < 1.:
+        raise ValueError('Inclusion volume %g out of the RVE volume %g' % (inclusion_volume, rve_volume))
+    return [(1. - f,) + bulk_shear(matrix[0], matrix[1], dimension),
+            (f,) + bulk_shear(inclusion[0], inclusion[1], dimension)]
+
+
+def estimate(method, phases, dimension=3):
+    """(K, G) of the RVE with one of ESTIMATES, phases[0] being the matrix"""
+    if method == 'matrix':
+        return phases[0][1:]
+    if method == 'voigt':
+        return voigt(phases)
+    if method == 'reuss':
+        return reuss(phases)
+    if method == 'mt':
+        return hashin_shtrikman(phases, phases[0][1], phases[0][2], dimension)
+    if method == 'hs':
+        # mean of the two bounds
+        upper = hashin_shtrikman(phases, max(p[1] for p in phases), max(p[2] for p in phases), dimension)
+        lower = hashin_shtrikman(phases, min(p[1] for p in phases), min(p[2] for p in phases), dimension)
+        return (upper[0] + lower[0]) / 2., (upper[1] + lower[1]) / 2.
+    raise ValueError('Unknown estimate %s (%s)' % (method, ', '.join(ESTIMATES)))
+
+
+def initial_enrich(method, rve_volume, inclusion_volume, matrix, inclusion, dimension=3):
+    """ENRICH definition (elastic type, table) estimated before the first iteration.
+
+    rve_volume and inclusion_volume come from mesh_volumes.phase_volumes;
+    matrix and inclusion are the isotropic (E, nu) of MATRIX and of the
+    inclusions (INCLUSION* sets or EMBEDDED part). In 2D the moduli are
+    those of plane stress, as the CPS elements.
+    """
+    phases = phase_fractions(rve_volume, inclusion_volume, matrix, inclusion, dimension)
+    K, G = estimate(method, phases, dimension)
+    E, nu = young_poisson(K, G, dimension)
+    print('initial ENRICH (%s, inclusion fraction %.3f): E = %g, nu = %g' % (method, phases[1][0], E, nu))
+    return 'ISOTROPIC', (E, nu)
+
+
+def warm_start(path, dimension):
+    """ENRICH definition from the converged PBC-*.dat of a previous RVE of the campaign"""
+    return enrich_elastic(read_stiffness(path, dimension), dimension)
@@ -0,0 +1,429 @@
+# Lecture des decks Abaqus (.inp) commune au plugin et au solveur Python:
+# lecture en continu par blocs de mots-cles, maillage en tableaux (MeshData),
+# parts / instances / assemblage d'un -model.inp (read_model), types
+# d'elements et volumes des elements (regle de Gauss, determinants explicites).
+
+from __future__ import division, print_function
+
+import re
+
+import numpy as np
+
+READ_SIZE = 1 << 24  # bytes read from the deck at once while streaming
+HOST_PART = 'RVEPLUS'
+EMBEDDED_PART = 'EMBEDDED'
+
+# Abaqus element type -> (family, dimension). The reduced-integration types are
+# integrated with the full rule: for linear elasticity this is the stiffness
+# their hourglass control stands for, without its artificial scaling.
+ELEMENT_TYPES = {
+    'CPS3': ('tri3', 2),
+    'CPS4': ('quad4', 2),
+    'CPS4R': ('quad4', 2),
+    'C3D4': ('tet4', 3),
+    'C3D8': ('hex8', 3),
+    'C3D8R': ('hex8', 3),
+}
+
+NODES = {'tri3': 3, 'quad4': 4, 'tet4': 4, 'hex8': 8}
+SIMPLEX = ('tri3', 'tet4')
+
+_QUAD_CORNERS = np.array([[-1, -1], [1, -1], [1, 1], [-1, 1]], dtype=float)
+_HEX_CORNERS = np.array([[-1, -1, -1], [1, -1, -1], [1, 1, -1], [-1, 1, -1],
+                         [-1, -1, 1], [1, -1, 1], [1, 1, 1], [-1, 1, 1]], dtype=float)
+_GAUSS = 1. / np.sqrt(3.)
+
+
+def element_family(element_type):
+    try:
+        return ELEMENT_TYPES[element_type.upper()]
+    except KeyError:
+        raise ValueError('Element type %s is not supported (%s)' % (element_type, ', '.join(sorted(ELEMENT_TYPES))))
+
+
+def gauss_points(family):
+    """(points, weights) of the integration rule in natural coordinates"""
+    if family == 'tri3':
+        return np.array([[1./3., 1./3.]]), np.array([0.5])
+    if family == 'tet4':
+        return np.array([[0.25, 0.25, 0.25]]), np.array([1./6.])
+    corners = _QUAD_CORNERS if family == 'quad4' else _HEX_CORNERS
+    return corners * _GAUSS, np.ones(len(corners))
+
+
+def shape_functions(family, xi):
+    """N (p, n) and dN/dxi (p, n, d) at the natural coordinates xi (p, d)"""
+    xi = np.atleast_2d(np.asarray(xi, dtype=float))
+    p = len(xi)
+    if family in SIMPLEX:
+        d = xi.shape[1]
+        N = np.column_stack([1. - xi.sum(axis=1), xi])
+        dN = np.zeros((p, d + 1, d))
+        dN[:, 0, :] = -1.
+        dN[:, 1:, :] = np.eye(d)
+        return N, dN
+    corners = _QUAD_CORNERS if family == 'quad4' else _HEX_CORNERS
+    d = corners.shape[1]
+    terms = 1. + xi[:, None, :] * corners[None, :, :]  # (p, n, d)
+    N = terms.prod(axis=2) / 2**d
+    dN = np.empty((p, len(corners), d))
+    for k in range(d):
+        others = np.delete(terms, k, axis=2).prod(axis=2)
+        dN[:, :, k] = corners[:, k] * others / 2**d
+    return N, dN
+
+
+def determinants(J):
+    """Determinants of a stack of (2, 2) or (3, 3) matrices, in closed form (no stacked
+    np.linalg.det in the numpy of Abaqus)"""
+    if J.shape[-1] == 2:
+        return J[..., 0, 0] * J[..., 1, 1] - J[..., 0, 1] * J[..., 1, 0]
+    return (J[..., 0, 0] * (J[..., 1, 1] * J[..., 2, 2] - J[..., 1, 2] * J[..., 2, 1])
+            - J[..., 0, 1] * (J[..., 1, 0] * J[..., 2, 2] - J[..., 1, 2] * J[..., 2, 0])
+            + J[..., 0, 2] * (J[..., 1, 0] * J[..., 2, 1] - J[..., 1, 1] * J[..., 2, 0]))
+
+
+def element_volumes(family, xe):
+    """Volumes (areas in 2D) of the elements with node coordinates xe (m, n, d).
+
+    Exact for simplices and for the bilinear/trilinear geometry of quads
+    and hexes (2x2(x2) Gauss rule).
+    """
+    points, weights = gauss_points(family)
+    N, dN = shape_functions(family, points)
+    xe = np.asarray(xe, dtype=float)[:, :, :dN.shape[-1]]  # plane elements given with (x, y, z) coordinates
+    J = np.einsum('mnd,pne->mpde', xe, dN)
+    return np.dot(np.abs(determinants(J)), weights)
+
+
+class MeshData(object):
+    """Array-backed mesh: node labels/coordinates, one connectivity array per
+    element type and sorted label arrays for the node and element sets"""
+    def __init__(self):
+        self.node_ids = np.zeros(0, dtype=np.int64)
+        self.coords = np.zeros((0, 3))
+        self.ndim = 3
+        self.elements = {}  # element type -> (element ids, connectivity)
+        self.nodeSets = {}
+        self.elemsets = {}
+        self.minpos = [float('inf')] * 3  # Initialized to a very large value
+        self.maxpos = [float('-inf')] * 3
+        self._chunks = {'nodes': [], 'elements': {}, 'nsets': {}, 'elsets': {}}
+
+    def add_nodes(self, node_ids, coordinates):
+        self._chunks['nodes'].append((node_ids, coordinates))
+
+    def add_elements(self, element_type, element_ids, connectivity, elset=''):
+        self._chunks['elements'].setdefault(element_type, []).append((element_ids, connectivity))
+        if elset != '':
+            self.add_elements_to_elemset(elset, element_ids)
+
+    def add_nodeSet(self, name, nodeSet_data):
+        self._chunks['nsets'].setdefault(name, []).append(np.asarray(nodeSet_data, dtype=np.int64))
+
+    def add_elements_to_elemset(self, name, elements):
+        self._chunks['elsets'].setdefault(name, []).append(np.asarray(elements, dtype=np.int64))
+
+    def set_parts(self, key, name):
+        """Arrays of the 'nsets'/'elsets' set called name (any case), usable while streaming"""
+        target = self.nodeSets if key == 'nsets' else self.elemsets
+        parts = []
+        for source in (target, self._chunks[key]):
+            for set_name, value in source.items():
+                if set_name.upper() == name.upper():
+                    parts.extend(value if isinstance(value, list) else [value])
+        return parts
+
+    def finalize(self):
+        """Merge the chunks collected while streaming into contiguous arrays"""
+        chunks = self._chunks
+        if chunks['nodes']:
+            self.node_ids = np.concatenate([c[0] for c in chunks['nodes']])
+            ncol = max(c[1].shape[1] for c in chunks['nodes'])
+            self.ndim = ncol
+            coords = np.zeros((len(self.node_ids), 3))
+            row = 0
+            for ids, xyz in chunks['nodes']:
+                coords[row:row+len(ids), :xyz.shape[1]] = xyz
+                row += len(ids)
+            self.coords = coords
+            self.minpos = coords.min(axis=0).tolist()
+            self.maxpos = coords.max(axis=0).tolist()
+        for etype, parts in chunks['elements'].items():
+            ids = np.concatenate([p[0] for p in parts])
+            conn = np.concatenate([p[1] for p in parts])
+            if etype in self.elements:
+                ids = np.concatenate([self.elements[etype][0], ids])
+                conn = np.concatenate([self.elements[etype][1], conn])
+            self.elements[etype] = (ids, conn)
+        for target, key in ((self.nodeSets, 'nsets'), (self.elemsets, 'elsets')):
+            for name, parts in chunks[key].items():
+                if name in target:
+                    parts = [target[name]] + parts
+                target[name] = np.unique(np.concatenate(parts))
+        self._chunks = {'nodes': [], 'elements': {}, 'nsets': {}, 'elsets': {}}
+        return self
+
+    def get_minmax_coordinates(self):
+        return self.minpos, self.maxpos
+
+    def get_elements_by_type(self, element_type):
+        empty = (np.zeros(0, dtype=np.int64), np.zeros((0, 0), dtype=np.int64))
+        return self.elements.get(element_type, empty)
+
+    def get_elem_from_set(self, elemset_name):
+        return self.elemsets.get(elemset_name, np.zeros(0, dtype=np.int64))
+
+    def node_rows(self, labels):
+        """Row index in node_ids/coords of each node label"""
+        order = np.argsort(self.node_ids, kind='mergesort')
+        return order[np.searchsorted(self.node_ids[order], labels)]
+
+
+def element_blocks(mesh, dimension=None):
+    """[(family, element ids, connectivity as node rows)] of a part"""
+    blocks = []
+    for element_type, (ids, conn) in mesh.elements.items():
+        family, dim = element_family(element_type)
+        if dimension is not None and dim != dimension:
+            raise ValueError('%s elements in a %dD model' % (element_type, dimension))
+        conn = conn[:, :NODES[family]]
+        blocks.append((family, ids, mesh.node_rows(conn.ravel()).reshape(conn.shape)))
+    return blocks
+
+
+def parse_keyword(line):
+    """'*Element, type=C3D4, ELSET=Volume2' -> ('ELEMENT', {'TYPE': 'C3D4', 'ELSET': 'Volume2'})"""
+    fields = line.strip()[1:].split(',')
+    params = {}
+    for field in fields[1:]:
+        if '=' in field:
+            key, value = field.split('=', 1)
+            params[key.strip().upper()] = value.strip()
+        elif field.strip():
+            params[field.strip().upper()] = ''
+    return fields[0].strip().upper(), params
+
+
+KEYWORD_LINE = re.compile(r'^\*(?!\*)', re.M)
+COMMENT_LINE = re.compile(r'^\*\*.*\n?', re.M)
+CONTINUED_LINE = re.compile(r',[ \t]*\n')
+BLANK_LINES = re.compile(r'\n\s*\n')
+
+
+class DeckReader(object):
+    """Reads a deck by large text pieces that always end on a line boundary"""
+    def __init__(self, f, read_size=READ_SIZE):
+        self.f = f
+        self.read_size = read_size
+        self.buf = ''
+        self.eof = False
+
+    def fill(self):
+        data = self.f.read(self.read_size)
+        if not data:
+            self.eof = True
+        self.buf += data
+
+    def data(self):
+        """Text pieces up to the next keyword line, comment lines removed"""
+        while True:
+            complete = len(self.buf) if self.eof else self.buf.rfind('\n') + 1
+            match = KEYWORD_LINE.search(self.buf, 0, complete)
+            end = match.start() if match else complete
+            piece = self.buf[:end]
+            self.buf = self.buf[end:]
+            if piece.startswith('**') or '\n**' in piece:
+                piece = COMMENT_LINE.sub('', piece)
+            if piece.strip():
+                yield piece
+            if match or self.eof:
+                return
+            self.fill()
+
+    def header(self):
+        """Next keyword line, None at the end of the file"""
+        while '\n' not in self.buf and not self.eof:
+            self.fill()
+        if not self.buf:
+            return None
+        end = self.buf.find('\n') + 1 or len(self.buf)
+        line = self.buf[:end]
+        self.buf = self.buf[end:]
+        return line
+
+
+def iter_keyword_blocks(filename):
+    """Stream an Abaqus deck as (keyword, params, header line, data pieces).
+
+    The data comes from a generator of text pieces read directly from the
+    file, so a block is never held in memory unless the caller keeps it.
+    """
+    with open(filename, 'r') as f:
+        reader = DeckReader(f)
+        for piece in reader.data():  # anything before the first keyword
+            pass
+        header = reader.header()
+        while header is not None:
+            keyword, params = parse_keyword(header)
+            block = reader.data()
+            yield keyword, params, header, block
+            for piece in block:  # drain what the caller did not read
+                pass
+            header = reader.header()
+
+
+def parse_numbers(text):
+    """Comma or line separated numbers of a data block as a float array, empty fields skipped"""
+    return np.array([v for v in text.replace('\n', ',').split(',') if v.strip()], dtype=float)
+
+
+def iter_number_chunks(pieces, dtype=float):
+    """Convert data pieces into (rows, width) arrays.
+
+    Lines ending with a comma continue on the next line (long elements).
+    """
+    carry = ''
+    width = None
+    for piece in pieces:
+        text = CONTINUED_LINE.sub(',', carry + piece)
+        carry = ''
+        if text.rstrip().endswith(','):  # continued in the next piece
+            carry = text
+            continue
+        if '\n\n' in text or text.startswith('\n'):
+            text = BLANK_LINES.sub('\n', text).lstrip('\n')
+        text = text.rstrip()
+        if width is None:
+            width = text[:text.find('\n') if '\n' in text else len(text)].count(',') + 1
+        values = parse_numbers(text)
+        yield values.reshape(-1, width).astype(dtype)
+    if carry.strip():
+        text = carry.rstrip().rstrip(',')
+        if width is None:
+            width = text.count(',') + 1
+        yield parse_numbers(text).reshape(-1, width).astype(dtype)
+
+
+def read_label_list(pieces, params, known_sets):
+    """Labels of an *Nset/*Elset block, with 'generate' and nested set names"""
+    text = ''.join(pieces).replace('\n', ',')
+    tokens = [t.strip() for t in text.split(',') if t.strip()]
+    if 'GENERATE' in params:
+        values = np.array(tokens, dtype=np.int64).reshape(-1, 3)
+        return np.concatenate([np.arange(a, b+1, max(c, 1)) for a, b, c in values])
+    try:
+        return np.array(tokens, dtype=np.int64)
+    except ValueError:
+        labels = []
+        for t in tokens:
+            if t.lstrip('-').isdigit():
+                labels.append(np.array([int(t)]))
+            else:
+                labels.extend(known_sets(t))
+        return np.concatenate(labels) if labels else np.zeros(0, dtype=np.int64)
+
+
+def parse_file(filename, nodes_only=False):
+    """Single-pass streaming parser returning (MeshData, material lines).
+
+    Nodes go to MeshData.node_ids/coords, elements to one (ids, connectivity)
+    pair per type, NSET/ELSET blocks to sorted label arrays. The material
+    lines are the raw *Material/*Elastic blocks, ready to be copied.
+    """
+    mesh = MeshData()
+    material = []
+    for keyword, params, header, pieces in iter_keyword_blocks(filename):
+        if keyword == 'NODE':
+            for values in iter_number_chunks(pieces):
+                mesh.add_nodes(values[:, 0].astype(np.int64), values[:, 1:])
+        elif keyword == 'ELEMENT' and not nodes_only:
+            element_type = params.get('TYPE', '').upper()
+            elset = params.get('ELSET', '')
+            for values in iter_number_chunks(pieces, np.int64):
+                mesh.add_elements(element_type, values[:, 0], values[:, 1:], elset)
+        elif keyword == 'NSET' and not nodes_only:
+            mesh.add_nodeSet(params.get('NSET', ''), read_label_list(pieces, params, lambda name: mesh.set_parts('nsets', name)))
+        elif keyword == 'ELSET' and not nodes_only:
+            mesh.add_elements_to_elemset(params.get('ELSET', ''), read_label_list(pieces, params, lambda name: mesh.set_parts('elsets', name)))
+        elif keyword in ('MATERIAL', 'ELASTIC'):
+            material.append(header)
+            for piece in pieces:
+                material.extend(piece.splitlines(True))
+    return mesh.finalize(), material
+
+
+class ModelDeck(object):
+    """Parts, instances, assembly data and materials of an assembly deck.
+
+    The mesh outside every *Part and the *Assembly (the whole mesh of a
+    deck without parts, e.g. a -VER.inp) is the part ''.
+    """
+    def __init__(self):
+        self.parts = {'': MeshData()}
+        self.instances = {}
+        self.assembly = MeshData()
+        self.materials = {}
+
+    def host(self):
+        """RVEPLUS part, or the mesh of a deck without parts"""
+        part = self.parts.get(HOST_PART)
+        if part is None or not part.elements:
+            part = self.parts['']
+        return part
+
+
+def read_model(filename):
+    """Stream a -model.inp into a ModelDeck.
+
+    Sets of the assembly given with instance=... go to the part of that
+    instance, those of an unknown instance are skipped with a warning; a
+    set inside a *Part belongs to that part, whatever its instance=
+    (unv_to_inp_model writes one). Part, instance, set and material names
+    are upper-cased as in Abaqus/CAE. *Equation blocks are not read: the
+    periodic constraints are rebuilt from the NMIN*/NMAX* node sets.
+    """
+    deck = ModelDeck()
+    current = deck.parts['']
+    material = None
+    for keyword, params, header, pieces in iter_keyword_blocks(filename):
+        if keyword == 'PART':
+            current = MeshData()
+            deck.parts[params.get('NAME', '').upper()] = current
+        elif keyword in ('END PART', 'END ASSEMBLY'):
+            current = deck.parts['']
+        elif keyword == 'ASSEMBLY':
+            current = deck.assembly
+        elif keyword == 'INSTANCE':
+            deck.instances[params.get('NAME', '').upper()] = params.get('PART', '').upper()
+        elif keyword == 'NODE':
+            for values in iter_number_chunks(pieces):
+                current.add_nodes(values[:, 0].astype(np.int64), values[:, 1:])
+        elif keyword == 'ELEMENT':
+            for values in iter_number_chunks(pieces, np.int64):
+                current.add_elements(params.get('TYPE', '').upper(), values[:, 0], values[:, 1:],
+                                     params.get('ELSET', '').upper())
+        elif keyword in ('NSET', 'ELSET'):
+            target = current
+            key = 'nsets' if keyword == 'NSET' else 'elsets'
+            name = params.get(keyword, '').upper()
+            if current is deck.assembly and 'INSTANCE' in params:
+                instance = params['INSTANCE'].upper()
+                target = deck.parts.get(deck.instances.get(instance))
+                if target is None:
+                    print('%s %s of the unknown instance %s skipped' % (keyword.capitalize(), name, instance))
+                    continue
+            labels = read_label_list(pieces, params, lambda n: target.set_parts(key, n))
+            if keyword == 'NSET':
+                target.add_nodeSet(name, labels)
+            else:
+                target.add_elements_to_elemset(name, labels)
+        elif keyword == 'MATERIAL':
+            material = params.get('NAME', '').upper()
+        elif keyword == 'ELASTIC' and material is not None:
+            text = ''.join(pieces).replace('\n', ',')
+            values = [float(v) for v in text.split(',') if v.strip()]
+            deck.materials[material] = (params.get('TYPE', 'ISOTROPIC').upper(), values)
+    for mesh in list(deck.parts.values()) + [deck.assembly]:
+        mesh.finalize()
+    return deck
@@ -0,0 +1,167 @@
+# Ordonnancement des calculs sous un budget de CPU et de memoire: N jobs a la
+# fois, chaque job est recupere des qu'il se termine. Le lancement passe par un
+# "runner" (Abaqus/CAE, ligne de commande ou simple processus local de test).
+
+from __future__ import division, print_function
+
+import multiprocessing
+import os
+import subprocess
+import time
+
+COMPLETED = 'COMPLETED'
+ABORTED = 'ABORTED'
+TIMEOUT = 'TIMEOUT'  # still running (or no .log yet) after the time limit of the job
+FAILED = 'FAILED'  # completed, but on_finished raised
+
+
+def abaqus_log_status(name, folder=''):
+    """Status of an Abaqus job from its .log file, None while it runs"""
+    path = os.path.join(folder, name + '.log')
+    if not os.path.exists(path):
+        return None
+    f = open(path, 'r')
+    text = f.read()
+    f.close()
+    if 'exited with error' in text:
+        return ABORTED
+    if 'COMPLETED' in text:
+        return COMPLETED
+    return None
+
+
+def resolve_command(args):
+    """Command line of a local process, args[0] resolved as the shell would.
+
+    On Windows the Abaqus launcher is a batch file (abaqus.bat) that
+    CreateProcess does not find from its bare name: args[0] is looked up
+    in the working folder then the PATH with the PATHEXT extensions, and
+    batch files are run through cmd /c.
+    """
+    if os.name != 'nt':
+        return list(args)
+    program = args[0]
+    extensions = os.environ.get('PATHEXT', '.COM;.EXE;.BAT;.CMD').lower().split(';')
+    if os.path.splitext(program)[1].lower() in extensions:
+        extensions = ['']
+    folders = [''] if os.path.dirname(program) else [''] + os.environ.get('PATH', '').split(os.pathsep)
+    for folder in folders:
+        for extension in extensions:
+            path = os.path.join(folder, program + extension)
+            if os.path.isfile(path):
+                if os.path.splitext(path)[1].lower() in ('.bat', '.cmd'):
+                    return ['cmd', '/c', path] + list(args[1:])
+                return [path] + list(args[1:])
+    return list(args)
+
+
+class LocalRunner(object):
+    """Runs every job as a local process.
+
+    command is a list of arguments where %(name)s, %(cpus)d and
+    %(memory)s are replaced, e.g. the Abaqus command line
+        ['abaqus', 'job=%(name)s', 'cpus=%(cpus)d', 'interactive']
+    or any stand-in program when testing without Abaqus. The program is
+    resolved by resolve_command (abaqus.bat on Windows).
+    """
+    def __init__(self, command, folder=None):
+        self.command = command
+        self.folder = folder
+        self.processes = {}
+
+    def submit(self, name, cpus, memory):
+        values = {'name': name, 'cpus': cpus, 'memory': memory}
+        args = resolve_command([arg % values for arg in self.command])
+        self.processes[name] = subprocess.Popen(args, cwd=self.folder)
+
+    def poll(self, name):
+        code = self.processes[name].poll()
+        if code is None:
+            return None
+        del self.processes[name]
+        return COMPLETED if code == 0 else ABORTED
+
+    def kill(self, name):
+        process = self.processes.pop(name)
+        process.kill()
+        process.wait()
+
+
+class JobScheduler(object):
+    """Run jobs through a runner without exceeding a CPU and memory budget.
+
+    cpus defaults to the number of cores and cpus_per_job to an even share
+    of them between the jobs; memory is the total budget (any unit the
+    runner understands, e.g. a percentage for Abaqus/CAE) and is split
+    evenly between the jobs running together unless memory_per_job is given.
+    A job still running timeout seconds after its submission is stopped
+    (runner.kill, when the runner has one) and reported as TIMEOUT.
+    """
+    def __init__(self, runner, cpus=None, memory=None, cpus_per_job=None, memory_per_job=None,
+                 poll_interval=1.0, timeout=None):
+        self.runner = runner
+        self.cpus = cpus or multiprocessing.cpu_count()
+        self.memory = memory
+        self.cpus_per_job = cpus_per_job
+        self.memory_per_job = memory_per_job
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+
+    def slots(self, njobs):
+        """(jobs at a time, cpus per job, memory per job) for njobs jobs"""
+        njobs = max(1, njobs)
+        cpus_per_job = self.cpus_per_job or max(1, self.cpus // njobs)
+        concurrent = max(1, self.cpus // cpus_per_job)
+        memory_per_job = self.memory_per_job
+        if self.memory is not None and memory_per_job:
+            concurrent = min(concurrent, max(1, int(self.memory // memory_per_job)))
+        concurrent = min(concurrent, njobs)
+        if self.memory is not None and not memory_per_job:
+            memory_per_job = self.memory // concurrent
+        return concurrent, cpus_per_job, memory_per_job
+
+    def run(self, names, on_finished=None):
+        """Submit the jobs in order, at most slots() at a time.
+
+        on_finished(name) is called as soon as a job completes (e.g. to read
+        its ODB) while the others keep running; a job whose on_finished
+        raises is FAILED and the others are still collected. Returns a dict
+        name -> {'status', 'seconds', 'result', 'error'}, result being what
+        on_finished returned (None for a job that did not complete) and
+        error the message of its exception.
+        """
+        concurrent, cpus, memory = self.slots(len(names))
+        pending = list(names)
+        running = {}
+        results = {}
+        while pending or running:
+            while pending and len(running) < concurrent:
+                name = pending.pop(0)
+                self.runner.submit(name, cpus, memory)
+                running[name] = time.time()
+            finished = False
+            for name in list(running):
+                status = self.runner.poll(name)
+                seconds = time.time() - running[name]
+                if status is None:
+                    if self.timeout is None or seconds < self.timeout:
+                        continue
+                    status = TIMEOUT
+                    if hasattr(self.runner, 'kill'):
+                        self.runner.kill(name)
+                finished = True
+                del running[name]
+                result = None
+                error = ''
+                if status == COMPLETED and on_finished is not None:
+                    try:
+                        result = on_finished(name)
+                    except Exception as e:
+                        status = FAILED
+                        error = '%s: %s' % (type(e).__name__, e)
+                results[name] = {'status': status, 'seconds': seconds, 'result': result, 'error': error}
+                print('%s %s (%.1f s)%s' % (name, status, seconds, ' ' + error if error else ''))
+                break  # refill the free slot before collecting the next one
+            if not finished:
+                time.sleep(self.poll_interval)
+        return results
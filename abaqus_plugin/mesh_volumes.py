@@ -0,0 +1,83 @@
+# Volumes des phases d'un -model.inp (SET-1, MATRIX, ENVELOPE, INCLUSION,
+# VOID, EMBEDDED), lus et calcules par inp_reader; memes noms de phases pour
+# le plugin et le solveur Python. Le volume servant a normaliser les
+# reactions est ainsi calcule une fois pour toutes, sans sortie IVOL.
+
+from __future__ import division, print_function
+
+import numpy as np
+
+from inp_reader import EMBEDDED_PART, HOST_PART, element_blocks, element_volumes, read_model
+
+# phase of the host elements of each element set, as assigned by periodicBoundary_env.main;
+# the INCLUSION* sets (INCLUSION phase) override them
+PHASE_SETS = [('MATRIX', 'MATRIX'), ('VOLUME2', 'MATRIX'), ('RVE', 'MATRIX'),
+              ('ENVELOPE', 'ENVELOPE'), ('VOLUME3', 'ENVELOPE'), ('VOID', 'VOID')]
+PHASES = ('MATRIX', 'ENVELOPE', 'INCLUSION', 'VOID')
+# keys of the volumes of both solvers: SET-1 (the reactions are normalized with it),
+# the host phases and the embedded part
+VOLUMES = ('SET-1',) + PHASES + ('EMBEDDED',)
+
+
+def part_volumes(part):
+    """(element ids, volumes) of every element of a part"""
+    ids, volumes = [np.zeros(0, dtype=np.int64)], [np.zeros(0)]
+    for family, labels, conn in element_blocks(part):
+        ids.append(labels)
+        volumes.append(element_volumes(family, part.coords[conn]))
+    return np.concatenate(ids), np.concatenate(volumes)
+
+
+def members(ids, labels):
+    """Mask of the ids found in the sorted labels (np.isin is not in older numpy)"""
+    if len(labels) == 0:
+        return np.zeros(len(ids), dtype=bool)
+    pos = np.minimum(np.searchsorted(labels, ids), len(labels) - 1)
+    return labels[pos] == ids
+
+
+def element_phases(ids, elemsets):
+    """Phase of every host element (None outside the phase sets)"""
+    phases = np.empty(len(ids), dtype=object)
+    for set_name, phase in PHASE_SETS:
+        if set_name in elemsets:
+            phases[members(ids, elemsets[set_name])] = phase
+    for set_name in elemsets:
+        if set_name.startswith('INCLUSION'):
+            phases[members(ids, elemsets[set_name])] = 'INCLUSION'
+    return phases
+
+
+def deck_volumes(host, embedded=None):
+    """VOLUMES of a host part and an embedded part (inp_reader.MeshData).
+
+    SET-1 is the volume of the elements of the SET-1 set of the host, of the
+    whole host without one.
+    """
+    ids, volumes = part_volumes(host)
+    phases = element_phases(ids, host.elemsets)
+    result = {}
+    if 'SET-1' in host.elemsets:
+        result['SET-1'] = float(volumes[members(ids, host.elemsets['SET-1'])].sum())
+    else:
+        result['SET-1'] = float(volumes.sum())
+    for phase in PHASES:
+        result[phase] = float(volumes[np.equal(phases, phase)].sum())
+    result['EMBEDDED'] = float(part_volumes(embedded)[1].sum()) if embedded is not None else 0.
+    return result
+
+
+def model_volumes(path):
+    """VOLUMES of a -model.inp: RVEPLUS part and EMBEDDED part"""
+    deck = read_model(path)
+    return deck_volumes(deck.parts[HOST_PART], deck.parts.get(EMBEDDED_PART))
+
+
+def phase_volumes(volumes):
+    """(RVE, inclusion) volumes inside the envelope from deck_volumes.
+
+    The RVE is the host mesh inside the envelope (MATRIX and INCLUSION);
+    the embedded fibres lie over MATRIX elements, so they count in the
+    inclusions but not a second time in the RVE.
+    """
+    return volumes['MATRIX'] + volumes['INCLUSION'], volumes['INCLUSION'] + volumes['EMBEDDED']
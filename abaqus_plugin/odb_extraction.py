@@ -0,0 +1,182 @@
+# Lecture des ODB des cas de charge: reactions des points REFMACRO et volume de
+# SET-1 par sous-ensembles de region et blocs de donnees (bulkDataBlocks), sans
+# boucle Python sur les noeuds ou les points d'integration. Plusieurs ODB
+# peuvent etre lus en parallele par des processus "abaqus python".
+# L'ODB n'est utilise qu'au travers de quelques attributs, un faux ODB peut
+# donc le remplacer hors d'Abaqus (tests).
+#
+# Ligne de commande (un fichier NOM-extract.json par ODB):
+#     abaqus python odb_extraction.py --dimension 3 --processes 4 Job-1.odb Job-2.odb ...
+
+from __future__ import division, print_function
+
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+from job_scheduler import JobScheduler, LocalRunner, COMPLETED
+
+
+def field_blocks(field):
+    """Values of a field output (or subset) as (values, components) arrays.
+
+    One array per FieldBulkData block (a block per instance and element
+    type or position); a field without bulk data gives one array built
+    from field.values instead.
+    """
+    blocks = [np.asarray(block.data, dtype=np.float64) for block in getattr(field, 'bulkDataBlocks', None) or []]
+    if not blocks and len(field.values):
+        blocks = [np.array([np.ravel(value.data) for value in field.values], dtype=np.float64)]
+    return [block.reshape(len(block), -1) for block in blocks]
+
+
+def field_sum(field):
+    """Sum of every value of a field output (or subset), block by block"""
+    total = 0.
+    for block in field_blocks(field):
+        total += float(block.sum())
+    return total
+
+
+def field_array(field):
+    """Values of a field output (or subset) as one (values, components) array"""
+    blocks = field_blocks(field)
+    if not blocks:
+        return np.zeros((0, 0))
+    return np.concatenate(blocks, axis=0)
+
+
+class OdbExtractor(object):
+    """(REFMACRO reactions, SET-1 volume) of the load cases of an ODB.
+
+    opener(path) returns the ODB: odbAccess.openOdb, or any object with
+        rootAssembly.nodeSets[name], rootAssembly.elementSets[name],
+        steps[step].frames (frame.loadCase.name or None),
+        frame.fieldOutputs[name].getSubset(region=...) with bulkDataBlocks
+        (FieldBulkData: data, nodeLabels or elementLabels, instance) or
+        values (FieldValue: data) and close().
+    The reactions are those of REFMACRO1..n in turn, n being the dimension,
+    the volume is the sum of IVOL over SET-1.
+    """
+    def __init__(self, dimension, opener=None, step='Step-1', volume_set='SET-1'):
+        if opener is None:
+            from odbAccess import openOdb as opener
+        self.dimension = dimension
+        self.opener = opener
+        self.step = step
+        self.volume_set = volume_set
+
+    def reactions(self, odb, frame):
+        rf = frame.fieldOutputs['RF']
+        data = []
+        for k in range(self.dimension):
+            region = odb.rootAssembly.nodeSets['REFMACRO%d' % (k + 1)]
+            data.extend(field_array(rf.getSubset(region=region))[0].tolist())
+        return data
+
+    def volume(self, odb, frame):
+        region = odb.rootAssembly.elementSets[self.volume_set]
+        return field_sum(frame.fieldOutputs['IVOL'].getSubset(region=region))
+
+    def frames(self, odb, load_cases=None):
+        """Last frame of the step, or the frame of each load case in turn"""
+        frames = odb.steps[self.step].frames
+        if not load_cases:
+            return [frames[-1]]
+        byCase = {}
+        for frame in frames:
+            if frame.loadCase is not None:
+                byCase[frame.loadCase.name.upper()] = frame
+        return [byCase[name.upper()] for name in load_cases]
+
+    def extract(self, path, load_cases=None, volume=None):
+        """[(reactions, volume)] of the last frame or of each load case.
+
+        volume, when known (mesh_volumes), replaces the IVOL sum, so the
+        job only needs RF at the reference points.
+        """
+        odb = self.opener(path)
+        try:
+            frames = self.frames(odb, load_cases)
+            if volume is None:
+                volume = self.volume(odb, frames[0])
+            return [(self.reactions(odb, frame), volume) for frame in frames]
+        finally:
+            odb.close()
+
+
+def result_path(path):
+    return os.path.splitext(path)[0] + '-extract.json'
+
+
+def write_result(path, cases):
+    f = open(result_path(path), 'w')
+    json.dump([[list(rf), volume] for rf, volume in cases], f)
+    f.close()
+
+
+def read_result(path):
+    f = open(result_path(path), 'r')
+    cases = json.load(f)
+    f.close()
+    return [(rf, volume) for rf, volume in cases]
+
+
+def extract_parallel(paths, dimension, load_cases=None, processes=None, command=None, opener=None,
+                     volume=None):
+    """Read several ODBs in worker processes, at most processes at a time.
+
+    command starts this script (default: abaqus python odb_extraction.py);
+    opener is a "module:function" passed on to the workers instead of
+    odbAccess.openOdb. Returns the extract() result of each path, in order.
+    """
+    if command is None:
+        command = ['abaqus', 'python', os.path.abspath(__file__)]
+    args = list(command) + ['--dimension', str(dimension)]
+    if load_cases:
+        args += ['--load-cases', ','.join(load_cases)]
+    if opener:
+        args += ['--opener', opener]
+    if volume is not None:
+        args += ['--volume', repr(volume)]
+    scheduler = JobScheduler(LocalRunner(args + ['%(name)s']), cpus=processes, cpus_per_job=1,
+                             poll_interval=0.1)
+    done = scheduler.run(paths, read_result)
+    failed = [p for p in paths if done[p]['status'] != COMPLETED]
+    if failed:
+        raise RuntimeError('ODB extraction failed for %s' % ', '.join(failed))
+    return [done[p]['result'] for p in paths]
+
+
+def import_opener(name):
+    """Function from a "module:function" string"""
+    module, function = name.split(':')
+    return getattr(__import__(module, fromlist=[function]), function)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='REFMACRO reactions and SET-1 volume of Abaqus ODBs')
+    parser.add_argument('odbs', nargs='+')
+    parser.add_argument('--dimension', type=int, choices=[2, 3], default=3)
+    parser.add_argument('--load-cases', default='', help='comma separated load case names (perturbation step)')
+    parser.add_argument('--processes', type=int, default=1, help='ODBs read in parallel')
+    parser.add_argument('--opener', default=None, help='module:function opening the ODBs (default odbAccess)')
+    parser.add_argument('--volume', type=float, default=None,
+                        help='volume normalizing the reactions (default: IVOL summed over SET-1)')
+    args = parser.parse_args(argv)
+    load_cases = [c for c in args.load_cases.split(',') if c]
+    if args.processes > 1 and len(args.odbs) > 1:
+        extract_parallel(args.odbs, args.dimension, load_cases, args.processes,
+                         [sys.executable, os.path.abspath(__file__)], args.opener, args.volume)
+        return
+    opener = import_opener(args.opener) if args.opener else None
+    extractor = OdbExtractor(args.dimension, opener)
+    for path in args.odbs:
+        write_result(path, extractor.extract(path, load_cases, args.volume))
+
+
+if __name__ == '__main__':
+    main()
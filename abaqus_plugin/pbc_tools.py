@@ -0,0 +1,175 @@
+# Outils numpy pour les conditions periodiques, utilisables dans Abaqus/CAE
+# (python 2.7) comme en dehors (python 3) sur de simples tableaux de coordonnees.
+
+from __future__ import division
+
+import numpy as np
+
+
+def _as_coords(coords):
+    """Return coords as a (n, 3) float array, padding 2D coordinates with z=0"""
+    c = np.asarray(coords, dtype=float)
+    if c.ndim == 1:
+        c = c.reshape(-1, 3 if c.size % 3 == 0 else 2)
+    if c.shape[1] < 3:
+        c = np.hstack([c, np.zeros((c.shape[0], 3 - c.shape[1]))])
+    return c
+
+
+def pair_nodes(coords1, coords2, translation, tol):
+    """Pair nodes of coords1 with nodes of coords2 shifted by -translation.
+
+    A node j of set 2 matches node i of set 1 when
+    |coords1[i] - (coords2[j] - translation)| < tol, the same test as the
+    nested loop of PeriodicBoundary.MakeNodeSetsandEquations. Candidates are
+    found with a grid hash of cell size >= tol, so the cost is O(n log n).
+    Each node of set 2 is used at most once; when several nodes of set 1
+    compete for it, the first one wins, as in the original loop.
+
+    Returns two int arrays (idx1, idx2) of matched row indices. Nodes of
+    set 1 without a partner are left out.
+    """
+    c1 = _as_coords(coords1)
+    c2 = _as_coords(coords2) - _as_coords(translation)[0]
+    empty = np.zeros(0, dtype=int)
+    if len(c1) == 0 or len(c2) == 0:
+        return empty, empty
+
+    origin = np.minimum(c1.min(axis=0), c2.min(axis=0))
+    extent = np.maximum(c1.max(axis=0), c2.max(axis=0)) - origin
+    # keep the combined cell key inside int64: at most 2**20 cells per axis
+    cell = max(float(tol), float(extent.max()) / 2.**20, 1.e-300)
+
+    ncell = np.floor(extent / cell).astype(np.int64) + 3
+    stride = np.array([1, ncell[0], ncell[0] * ncell[1]], dtype=np.int64)
+
+    def keys(c):
+        ijk = np.floor((c - origin) / cell).astype(np.int64) + 1
+        return np.dot(ijk, stride)
+
+    keys1 = keys(c1)
+    keys2 = keys(c2)
+    order = np.argsort(keys2, kind='mergesort')
+    sorted2 = keys2[order]
+
+    best_d = np.empty(len(c1))
+    best_d.fill(np.inf)
+    best_j = np.zeros(len(c1), dtype=int)
+    for dz in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            for dx in (-1, 0, 1):
+                q = keys1 + (dx * stride[0] + dy * stride[1] + dz * stride[2])
+                lo = np.searchsorted(sorted2, q, side='left')
+                hi = np.searchsorted(sorted2, q, side='right')
+                count = hi - lo
+                for r in range(int(count.max())):
+                    rows = np.nonzero(count > r)[0]
+                    cand = order[lo[rows] + r]
+                    d = np.sqrt(((c1[rows] - c2[cand]) ** 2).sum(axis=1))
+                    better = d < best_d[rows]
+                    best_d[rows[better]] = d[better]
+                    best_j[rows[better]] = cand[better]
+
+    idx1 = np.nonzero(best_d < tol)[0]
+    idx2 = best_j[idx1]
+    # a node of set 2 can only be paired once: keep the first node of set 1
+    uniq, first = np.unique(idx2, return_index=True)
+    first.sort()
+    return idx1[first], idx2[first]
+
+
+def pair_labels(labels1, coords1, labels2, coords2, translation, tol):
+    """Same as pair_nodes but returns the (master, slave) node labels"""
+    idx1, idx2 = pair_nodes(coords1, coords2, translation, tol)
+    return np.asarray(labels1)[idx1], np.asarray(labels2)[idx2]
+
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#      Disjoint-set forest of constrained nodes: a pair is only accepted
+#        if it joins two different trees, so no DOF is constrained twice
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+
+class DofForest(object):
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def __init__(self):
+        self.parent = {}
+        self.rank = {}
+        self.links = {}
+        self.keyword = ''
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def find(self, node):
+        """Root of the tree holding node, with path compression"""
+        parent = self.parent
+        if node not in parent:
+            parent[node] = node
+            self.rank[node] = 0
+            return node
+        root = node
+        while parent[root] != root:
+            root = parent[root]
+        while parent[node] != root:
+            parent[node], node = root, parent[node]
+        return root
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def addBranch(self, branch):
+        """Accept the pair (n1, n2) unless both nodes are already linked"""
+        n1 = branch[0]
+        n2 = branch[1]
+        r1 = self.find(n1)
+        r2 = self.find(n2)
+        if r1 == r2:
+            return False
+        if self.rank[r1] < self.rank[r2]:
+            r1, r2 = r2, r1
+        self.parent[r2] = r1
+        if self.rank[r1] == self.rank[r2]:
+            self.rank[r1] += 1
+        self.links.setdefault(n1, []).append(n2)
+        self.links.setdefault(n2, []).append(n1)
+        return True
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def loadConstraintNames(self, names, keyword):
+        """Rebuild the forest from constraint names keyword+n1_n2_ddl"""
+        self.keyword = keyword
+        for name in names:
+            if(name.find(keyword) > -1):
+                (title, n1, n2, ddl) = name.split('_')
+                if(int(ddl) == 1):
+                    self.addBranch([n1, n2])
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def roots(self):
+        """Map every node to the independent node of its tree"""
+        top = {}
+        for node in self.links:
+            top[node] = self.find(node)
+        return top
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def chains(self):
+        """Oriented links [dependent, independent] of every tree.
+
+        Each tree is walked from its root, so every node except the root is
+        the dependent node of exactly one link: the ordering expected by
+        PeriodicBoundary.checkMasterAndSlaves.
+        """
+        oriented = []
+        seen = set()
+        for node in self.links:
+            root = self.find(node)
+            if root in seen:
+                continue
+            seen.add(root)
+            stack = [root]
+            while stack:
+                cur = stack.pop()
+                for nxt in self.links[cur]:
+                    if nxt not in seen:
+                        seen.add(nxt)
+                        oriented.append([nxt, cur])
+                        stack.append(nxt)
+        return oriented
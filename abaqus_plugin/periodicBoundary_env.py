@@ -53,6 +53,15 @@ import Tkinter, Tkconstants, tkFileDialog
 import time
 import threading
 import subprocess
+from pbc_tools import pair_nodes, DofForest
+from enrichment import run_enrichment
+from initial_guess import initial_enrich, warm_start
+from job_scheduler import JobScheduler, abaqus_log_status, COMPLETED
+from odb_extraction import OdbExtractor
+from mesh_volumes import model_volumes, phase_volumes
+from periodicity_check import format_report, verify_periodicity
+from results_store import ResultsStore
+from run_state import RunState, state_path
 
 def getCurrentModel():
     vpName = session.currentViewportName
@@ -77,131 +86,17 @@ def find(f, seq):
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
 
-class Tree:
+class Tree(DofForest):
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
     def __init__(self, mn):
-        self.thetree = []
-        self.oldtree = []
-        self.keyword = ''
+        DofForest.__init__(self)
         self.modelname = mn
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
     def getCurrentGraph(self, keyword):
-        self.keyword = keyword
         # mod = getCurrentModel(self.modelname)
         mod = mdb.models[self.modelname]
-        conts = mod.constraints
-        for i in range(0, len(conts.keys())):
-            name = conts.keys()[i]
-            if(name.find(keyword) > -1):
-                (title, n1, n2, ddl) = name.split('_')
-                if(int(ddl) == 1):
-                    pos = -1
-                    for j in range(0, len(self.thetree)):
-                        if(n1 in self.thetree[j]):
-                            twig = [n1, n2]
-                            self.insertTwigInBranch(twig, self.thetree[j])
-                            self.reduceTree(twig, self.thetree[j])
-                            pos = j
-                            break
-                        elif(n2 in self.thetree[j]):
-                            twig = [n2, n1]
-                            self.insertTwigInBranch(twig, self.thetree[j])
-                            self.reduceTree(twig, self.thetree[j])
-                            pos = j
-                            break
-                    if(pos == -1):
-                        self.thetree.append([n1, n2])
-    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-
-    def insertTwigInBranch(self, twig, branch):
-        if(twig[0] not in branch):
-            print 'bug in insert twig! twig=', twig, ' branch=', branch
-            return False
-        ind = branch.index(twig[0])
-        if(ind == len(branch)-1):
-            branch.append(twig[1])
-        elif(ind == 0):
-            branch.insert(ind, twig[1])
-        else:
-            return False
-        return True
-    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-
-    def reduceTree(self, twig, curbranch):
-        k = -1
-        for branch in self.thetree:
-            k = k+1
-            if((branch is not curbranch) and (twig[1] in branch) and (twig[1] in curbranch)):
-                ind0 = curbranch.index(twig[1])
-                ind1 = branch.index(twig[1])
-                if(ind0 == 0 and ind1 == len(branch)-1):
-                    for j in range(ind1-1, -1, -1):
-                        curbranch.insert(0, branch[j])
-                    del self.thetree[k]
-                    k = k-1
-#                  return True
-                elif(ind0 == 0 and ind1 == 0):
-                    for j in range(1, len(branch)):
-                        curbranch.insert(0, branch[j])
-                    del self.thetree[k]
-                    k = k-1
-#                  return True
-                elif(ind0 == len(curbranch)-1 and ind1 == len(branch)-1):
-                    for j in range(ind1-1, -1, -1):
-                        curbranch.append(branch[j])
-                    del self.thetree[k]
-                    k = k-1
-#                  return True
-                elif(ind0 == len(curbranch)-1 and ind1 == 0):
-                    for j in range(1, len(branch)):
-                        curbranch.append(branch[j])
-                    del self.thetree[k]
-                    k = k-1
-#                  return True
-                else:
-                    print 'Tree reduction error! (ind0=', ind0, ' ind1=', ind1, ')', 'branch', branch, 'curbranch', curbranch, 'twig', twig
-                    return False
-    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-
-    def addBranch(self, branch):
-        n1 = branch[0]
-        n2 = branch[1]
-        abranch = None
-        self.oldtree = deepcopy(self.thetree)
-        for curbranch in self.thetree:
-            if(n1 in curbranch and n2 in curbranch):
-                return False
-            elif(n1 in curbranch and abranch == None):
-                twig = [n1, n2]
-                if(not self.insertTwigInBranch(twig, curbranch)):
-                    return False
-                self.reduceTree(twig, curbranch)
-                abranch = curbranch
-                return True
-            elif(n2 in curbranch and abranch == None):
-                twig = [n2, n1]
-                if(not self.insertTwigInBranch(twig, curbranch)):
-                    return False
-                self.reduceTree(twig, curbranch)
-                abranch = curbranch
-                return True
-        if(abranch == None):
-            self.thetree.append(branch)
-        return True
-    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-
-    def restoreTree(self):
-        del self.thetree
-        self.thetree = deepcopy(self.oldtree)
-    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-
-    def iscycle(self):
-        for curbranch in self.thetree:
-            for node in curbranch:
-                if(curbranch.count(node) > 1):
-                    return True
-        return False
+        self.loadConstraintNames(mod.constraints.keys(), keyword)
 
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
@@ -215,6 +110,7 @@ class PeriodicBoundary:
         self.set2 = set2
         self.set3 = set3
         self.modelname = mn
+        self.caracLength = 1.e-2  # pairing tolerance 0.1*carac, see setCaracLength
         #self.modelname = self.getCurrentModel(self.modelname)
         # self.a = a = mdb.models[modelname].rootAssembly
         pass
@@ -260,7 +156,7 @@ class PeriodicBoundary:
         self.Vx = Vx
         self.Vy = Vy
         self.Vz = Vz
-        self.carac = 1.e-2
+        self.carac = self.caracLength
         small = [Vx, Vy, Vz]
         small.sort()
         self.is_small_strain = is_smallstrain
@@ -360,50 +256,44 @@ class PeriodicBoundary:
         nodesref1 = () #a.allSets[s1].referencePoints
         nodesref2 = () #a.allSets[s2].referencePoints
 
-        rem = [0.]*len(nodes1)
-        nodes2elem = range(len(nodes2))
+        coords1 = np.array([n.coordinates for n in nodes1])
+        coords2 = np.array([n.coordinates for n in nodes2])
+        rem = np.zeros(len(nodes1), dtype=bool)
         if(s3 != ""):
-            for n3 in a.allSets[s3].nodes:
-                j = 0
-                for n1 in nodes1:
-                    if(self.NodeDist(n1, n3) < 1.e-8):
-                        rem[j] = 1
-                    j = j+1
+            coords3 = np.array([n.coordinates for n in a.allSets[s3].nodes])
+            i3, j3 = pair_nodes(coords1, coords3, (0., 0., 0.), 1.e-8)
+            rem[i3] = True
 
         x1_x2 = [0.]*3
         # mod = self.getCurrentModel(self.modelname)
         mod = mdb.models[self.modelname]
-        i = 0
+
+        # master/slave pairing by spatial hashing on the translated coordinates
+        pairs1, pairs2 = pair_nodes(coords1, coords2, (self.Vx, self.Vy, self.Vz), 0.1*self.carac)
 
         mytree = Tree(self.modelname)
         mytree.getCurrentGraph('Const_')
-        for n1 in nodes1:
+        for i, j in zip(pairs1, pairs2):
+            i = int(i)
+            j = int(j)
+            if(rem[i]):
+                continue
+            n1 = nodes1[i]
+            n2 = nodes2[j]
             name1 = "Num"+str(n1.label)+n1.instanceName
-            if(rem[i] == 0):
-                if(a.sets.has_key(name1) == 0):
-                    a.Set(nodes=nodes1[i:i+1], name=name1)
-                for j in nodes2elem:
-                    c2 = (nodes2[j].coordinates[0]-self.Vx, nodes2[j].coordinates[1] -
-                          self.Vy, nodes2[j].coordinates[2]-self.Vz)
-                    dist = sqrt((n1.coordinates[0]-c2[0])**2 +
-                                (n1.coordinates[1]-c2[1])**2+(n1.coordinates[2]-c2[2])**2)
-                    if(dist < 0.1*self.carac):
-                        name2 = "Num"+str(nodes2[j].label)+nodes2[j].instanceName
-                        nname2 = str(nodes2[j].label)+nodes2[j].instanceName
-                        a.Set(nodes=nodes2[j:j+1], name=name2)
-                        x1_x2[0] = n1.coordinates[0]-nodes2[j].coordinates[0]
-                        x1_x2[1] = n1.coordinates[1]-nodes2[j].coordinates[1]
-                        x1_x2[2] = n1.coordinates[2]-nodes2[j].coordinates[2]
-                        nodes2elem.remove(j)
-                        break
-                # Tree construction and checking of cycling DOF's
-                branch = [str(n1.label)+n1.instanceName, nname2]
-                if(mytree.addBranch(branch) and not mytree.iscycle()):
-                    cname = 'Const_'+str(n1.label)+n1.instanceName+'_'+str(nname2)
-                    self.MakeSingleEquation(mod, cname, name1, name2, x1_x2, dim, False)
-                else:
-                    mytree.restoreTree()
-            i = i+1
+            if(a.sets.has_key(name1) == 0):
+                a.Set(nodes=nodes1[i:i+1], name=name1)
+            name2 = "Num"+str(n2.label)+n2.instanceName
+            nname2 = str(n2.label)+n2.instanceName
+            a.Set(nodes=nodes2[j:j+1], name=name2)
+            x1_x2[0] = n1.coordinates[0]-n2.coordinates[0]
+            x1_x2[1] = n1.coordinates[1]-n2.coordinates[1]
+            x1_x2[2] = n1.coordinates[2]-n2.coordinates[2]
+            # Tree construction and checking of cycling DOF's
+            branch = [str(n1.label)+n1.instanceName, nname2]
+            if(mytree.addBranch(branch)):
+                cname = 'Const_'+str(n1.label)+n1.instanceName+'_'+str(nname2)
+                self.MakeSingleEquation(mod, cname, name1, name2, x1_x2, dim, False)
         # checking of DOF ordering to avoid undesired DOF suppression...
         self.checkMasterAndSlaves(mytree)
 
@@ -433,11 +323,9 @@ class PeriodicBoundary:
                     break
                 # Tree construction and checking of cycling DOF's
             branch = [int(nname1), int(nname2)]
-            if(myreftree.addBranch(branch) and not myreftree.iscycle()):
+            if(myreftree.addBranch(branch)):
                 cname = 'ConstRef_'+str(nname1)+'_'+str(nname2)
                 self.MakeSingleEquation(mod, cname, name1, name2, x1_x2, dim, True)
-            else:
-                myreftree.restoreTree()
         self.checkMasterAndSlaves(myreftree)
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
@@ -445,8 +333,8 @@ class PeriodicBoundary:
         # mod = getCurrentModel(self.modelname)
         mod = mdb.models[self.modelname]
         conts = mod.constraints
-        constname = conts.keys()
-        for branch in the_tree.thetree:
+        constname = set(conts.keys())
+        for branch in the_tree.chains():
             for i in range(1, len(branch)):
                 cname1 = the_tree.keyword+str(branch[i])+'_'+str(branch[i-1])+'_1'
                 cname2 = the_tree.keyword+str(branch[i])+'_'+str(branch[i-1])+'_2'
@@ -494,42 +382,9 @@ class PeriodicBoundary:
                                     str(branch[i-1])+'_'+str(branch[i])+'_6')
 
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-    def GetCarcLength(self, s1, a):
-        small = 1.e8
-        el1 = a.allSets[s1].elements
-        for el in el1:
-            tabed = el.getElemEdges()
-            for ed in tabed:
-                nds = ed.getNodes()
-                x1 = nds[0].coordinates
-                x2 = nds[1].coordinates
-                dist = sqrt((x1[0]-x2[0])**2.+(x1[1]-x2[1])**2.+(x1[2]-x2[2])**2.)
-                if(dist > 0 and small > dist):
-                    small = dist
-        return small
-    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-
-    def VerifNodeCoord(self, s1, s2, a):
-        nodes1 = a.allSets[s1].nodes  # extrait tous les noeuds du set1
-        nodes2 = a.allSets[s2].nodes  # pareil pour le set 2
-        # trouve la longueur mini d'un segment sur le maillage
-        self.carac = self.GetCarcLength(s1, a)
-        nodes2elem = range(len(nodes2))
-        for n1 in nodes1:
-            found = False
-            for j in nodes2elem:
-                c2 = (nodes2[j].coordinates[0]-self.Vx, nodes2[j].coordinates[1] -
-                      self.Vy, nodes2[j].coordinates[2]-self.Vz)
-                dist = sqrt((n1.coordinates[0]-c2[0])**2. +
-                            (n1.coordinates[1]-c2[1])**2.+(n1.coordinates[2]-c2[2])**2.)
-                if(dist < 0.1*self.carac):
-                    found = True
-                    nodes2elem.remove(j)
-                    break
-            if(not found):
-                print "The mesh periodicity is required nodeCoord"
-                return False
-        return True
+    def setCaracLength(self, carac):
+        """Smallest element edge (periodicity_check), the nodes pair within 0.1*carac"""
+        self.caracLength = carac
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
     def VerifRefCoord(self, s1, s2, a):
@@ -611,16 +466,287 @@ class MainFrame():
         pass
     
 
-def main(filePath, modelname, iteration, dimension, meshType):
+class AbaqusRunner:
+    """JobScheduler runner submitting the input files written by AbaqusJobs"""
+
+    def submit(self, name, cpus, memory):
+        if os.path.exists(name + '.log'):
+            os.remove(name + '.log')
+        mdb.JobFromInputFile(name=name, inputFileName=name + '.inp', type=ANALYSIS,
+                             atTime=None, waitMinutes=0, waitHours=0, queue=None, memory=int(memory),
+                             memoryUnits=PERCENTAGE, getMemoryFromAnalysis=True, numCpus=cpus,
+                             numDomains=cpus, userSubroutine='', scratch='',
+                             multiprocessingMode=DEFAULT, numGPUs=0)
+        mdb.jobs[name].submit(consistencyChecking=OFF)
+
+    def poll(self, name):
+        return abaqus_log_status(name)
+
+    def kill(self, name):
+        try:
+            mdb.jobs[name].kill()
+        except Exception as e:
+            print('%s could not be killed: %s' % (name, e))
+
+class AbaqusJobs:
+    """Solver backend of run_enrichment: one Abaqus job per load case.
+
+    The input of each job is written as soon as its BCs are set, then the
+    jobs run under the CPU budget (90 % of the memory shared between the
+    jobs running together) and each ODB is read when its job completes.
+    With the volume of SET-1 known from the mesh, the jobs only write RF at
+    the reference points unless fullOutput is set.
+    The job and the result of every load case go to the run state: after a
+    restart, completed load cases are skipped and the ODBs of jobs that
+    finished are read instead of being computed again.
+    With include (the embedded equations of embedded_locator.py), every
+    written input gets its *Include, so later edits of the model in CAE
+    cannot drop it.
+    A job still running (or without .log) timeout seconds after its
+    submission is killed and the iteration stops with the failed jobs.
+    """
+
+    def __init__(self, modelname, dimension, cpus=None, cpusPerJob=None, volume=None, fullOutput=False,
+                 state=None, include=None, timeout=None):
+        self.modelname = modelname
+        self.include = include
+        self.dimension = dimension
+        self.volume = volume
+        self.fullOutput = fullOutput
+        self.state = state if state is not None else RunState()
+        self.scheduler = JobScheduler(AbaqusRunner(), cpus=cpus, memory=90, cpus_per_job=cpusPerJob,
+                                      timeout=timeout)
+        self.extractor = OdbExtractor(dimension, openOdb)
+
+    def set_enrich(self, elastic_type, table):
+        elastic = {'ISOTROPIC': ISOTROPIC, 'ANISOTROPIC': ANISOTROPIC}[elastic_type]
+        mdb.models[self.modelname].materials['ENRICH'].Elastic(type=elastic, table=(tuple(table),))
+
+    def solve(self, homotot):
+        modelname = self.modelname
+        dimension = self.dimension
+        a = mdb.models[modelname].rootAssembly
+
+        region1 = a.sets['REFMACRO1']
+        region2 = a.sets['REFMACRO2']
+        if dimension == 3:
+            region3 = a.sets['REFMACRO3']
+
+        job_namess = []
+        cases = {}
+        self.setOutput()
+
+        for c in range(len(homotot)):
+            DefMat = homotot[c]
+            if self.state.case_result(c) is not None:
+                continue
+            name = self.finishedJob(c)
+            if name is not None:
+                print('load case %d: reading %s.odb of the interrupted run' % (c + 1, name))
+                self.state.case_done(c, self.readLastFrame(name))
+                continue
+
+            # First reference point BC
+            mdb.models[modelname].DisplacementBC(name='BC-1', createStepName='Step-1',
+                                               region=region1, u1=DefMat[0][0], u2=DefMat[0][1],
+                                               u3=UNSET if dimension==2 else DefMat[0][2],
+                                               ur1=UNSET, ur2=UNSET, ur3=UNSET,
+                                               amplitude=UNSET, fixed=OFF, distributionType=UNIFORM,
+                                               fieldName='', localCsys=None)
+
+            # Second reference point BC
+            mdb.models[modelname].DisplacementBC(name='BC-2', createStepName='Step-1',
+                                               region=region2, u1=DefMat[1][0], u2=DefMat[1][1],
+                                               u3=UNSET if dimension==2 else DefMat[1][2],
+                                               ur1=UNSET, ur2=UNSET, ur3=UNSET,
+                                               amplitude=UNSET, fixed=OFF, distributionType=UNIFORM,
+                                               fieldName='', localCsys=None)
+
+            # Third reference point BC - only for 3D
+            if dimension == 3:
+                mdb.models[modelname].DisplacementBC(name='BC-3', createStepName='Step-1',
+                                                   region=region3, u1=DefMat[2][0], u2=DefMat[2][1],
+                                                   u3=DefMat[2][2], ur1=UNSET, ur2=UNSET, ur3=UNSET,
+                                                   amplitude=UNSET, fixed=OFF, distributionType=UNIFORM,
+                                                   fieldName='', localCsys=None)
+
+            name = self.state.next_job()
+            self.state.set_case_job(c, name)
+            cases[name] = c
+            job_namess.append(name)
+
+            self.writeJob(name)
+
+        def collect(name):
+            result = self.readLastFrame(name)
+            self.state.case_done(cases[name], result)
+            return result
+
+        if job_namess:
+            self.runJobs(job_namess, collect)
+        return [self.state.case_result(c) for c in range(len(homotot))]
+
+    def finishedJob(self, case):
+        """Job of a load case whose ODB was completed before a restart"""
+        name = self.state.case_job(case)
+        if name is not None and abaqus_log_status(name) == COMPLETED and os.path.exists(name + '.odb'):
+            return name
+        return None
+
+    def setOutput(self):
+        model = mdb.models[self.modelname]
+        if self.fullOutput or self.volume is None:
+            model.fieldOutputRequests['F-Output-1'].setValues(
+                variables=('S', 'U', 'RF', 'IVOL', 'EE', 'SENER'))
+            return
+        a = model.rootAssembly
+        if 'REFMACRO' not in a.sets.keys():
+            a.SetByBoolean(name='REFMACRO',
+                           sets=tuple(a.sets['REFMACRO%d' % (k + 1)] for k in range(self.dimension)))
+        model.fieldOutputRequests['F-Output-1'].setValues(variables=('RF',), region=a.sets['REFMACRO'])
+
+    def writeJob(self, name):
+        mdb.Job(name=name, model=self.modelname, description='', type=ANALYSIS,
+                atTime=None, waitMinutes=0, waitHours=0, queue=None, memory=90,
+                memoryUnits=PERCENTAGE, getMemoryFromAnalysis=True, numCpus=1,
+                echoPrint=OFF, modelPrint=OFF, contactPrint=OFF, historyPrint=OFF, userSubroutine='',
+                scratch='', resultsFormat=ODB, multiprocessingMode=DEFAULT,
+                numGPUs=0)  # explicitPrecision=SINGLE, nodalOutputPrecision=SINGLE,
+        mdb.jobs[name].writeInput(consistencyChecking=OFF)
+        if self.include is not None:
+            includeInput(name + '.inp', self.include)
+
+    def runJobs(self, names, collect):
+        done = self.scheduler.run(names, collect)
+        failed = ['%s (%s%s)' % (n, done[n]['status'], ', ' + done[n]['error'] if done[n]['error'] else '')
+                  for n in names if done[n]['status'] != COMPLETED]
+        if failed:
+            raise RuntimeError('Abaqus jobs %s did not complete' % ', '.join(failed))
+        return done
+
+    def readLastFrame(self, name):
+        return self.extractor.extract(name + '.odb', volume=self.volume)[0]
+
+class AbaqusLoadCases(AbaqusJobs):
+    """Solver backend running all the load cases in one job: Step-1 is a linear
+    perturbation step with one load case per homotot entry, so the stiffness
+    is decomposed once per iteration"""
+
+    def solve(self, homotot):
+        modelname = self.modelname
+        dimension = self.dimension
+        model = mdb.models[modelname]
+        a = model.rootAssembly
+        if all(self.state.case_result(c) is not None for c in range(len(homotot))):
+            return [self.state.case_result(c) for c in range(len(homotot))]
+
+        caseNames = []
+        for c in range(len(homotot)):
+            DefMat = homotot[c]
+            bcs = []
+            for k in range(dimension):
+                bcName = 'BC-%d-%d' % (c + 1, k + 1)
+                model.DisplacementBC(name=bcName, createStepName='Step-1',
+                                     region=a.sets['REFMACRO%d' % (k + 1)], u1=DefMat[k][0], u2=DefMat[k][1],
+                                     u3=UNSET if dimension==2 else DefMat[k][2],
+                                     ur1=UNSET, ur2=UNSET, ur3=UNSET,
+                                     amplitude=UNSET, fixed=OFF, distributionType=UNIFORM,
+                                     fieldName='', localCsys=None)
+                bcs.append((bcName, 1.0))
+            caseName = 'LC-%d' % (c + 1)
+            model.steps['Step-1'].LoadCase(name=caseName, boundaryConditions=tuple(bcs))
+            caseNames.append(caseName)
+
+        self.setOutput()
+
+        def readLoadCases(name):
+            results = self.extractor.extract(name + '.odb', caseNames, self.volume)
+            for c in range(len(results)):
+                self.state.case_done(c, results[c])
+            return results
+
+        name = self.finishedJob('all')
+        if name is not None:
+            print('reading %s.odb of the interrupted run' % name)
+            return readLoadCases(name)
+        name = self.state.next_job()
+        self.state.set_case_job('all', name)
+        self.writeJob(name)
+        return self.runJobs([name], readLoadCases)[name]['result']
+
+def isotropicMaterial(modelname, name):
+    """(E, nu) of an isotropic material of the model"""
+    elastic = mdb.models[modelname].materials[name].elastic
+    if elastic.type != ISOTROPIC:
+        raise ValueError('The initial estimate needs an isotropic %s material' % name)
+    return tuple(elastic.table[0][:2])
+
+def includeInput(inputFile, path):
+    """Add *Include, input=path before *End Assembly in a written job input"""
+    with open(inputFile) as f:
+        lines = f.readlines()
+    for i, line in enumerate(lines):
+        if line.lower().startswith('*end assembly'):
+            lines.insert(i, '*Include, input=%s\n' % path)
+            with open(inputFile, 'w') as f:
+                f.writelines(lines)
+            return
+    raise ValueError('No *End Assembly in %s' % inputFile)
+
+def removeEmbeddedRegions(modelname):
+    """Delete the EmbeddedRegion constraints of the model, replaced by included equations"""
+    constraints = mdb.models[modelname].constraints
+    for name in list(constraints.keys()):
+        if hasattr(constraints[name], 'embeddedRegion'):
+            del constraints[name]
+            print('EmbeddedRegion %s removed, the embedded constraints are included' % name)
+
+def main(filePath, modelname, iteration, dimension, meshType, loadCases=False, cpus=0, cpusPerJob=0, tolerance=0.,
+         acceleration='none', relaxation=1.0, initialGuess='matrix', warmStart='', fullOutput=False,
+         resultsStore='', resume=False, embeddedEquations='', meshTolerance=False, jobTimeout=0.):
     """
     Main function for periodic boundary conditions
     Args:
         filePath: Path to the input file
         modelname: Name of the model
-        iteration: Number of iterations
+        iteration: Number of iterations (maximum count when tolerance is given)
         dimension: 2 for 2D analysis, 3 for 3D analysis
         meshType: 4 for embedded mesh, 5 for conforming mesh
+        loadCases: run all the load cases of an iteration in one job
+            (linear perturbation step with load cases) instead of one job each
+        cpus: CPU budget of the jobs of an iteration, 0 for all the cores
+        cpusPerJob: threads of each job, 0 to share cpus evenly between the jobs
+        tolerance: stop once the relative change of the homogenized stiffness
+            between two iterations is below it (0: always run every iteration)
+        acceleration: update of ENRICH between iterations, 'none' (plain
+            substitution), 'aitken' or 'anderson'
+        relaxation: under-relaxation factor of the update (1: none)
+        initialGuess: ENRICH before the first iteration, 'matrix' (copy of
+            MATRIX), 'voigt', 'reuss', 'hs' (mean of the Hashin-Shtrikman
+            bounds) or 'mt' (Mori-Tanaka) from the phase volumes
+        warmStart: PBC-*.dat of a previous RVE to start ENRICH from (takes
+            precedence over initialGuess)
+        fullOutput: keep S, U, IVOL, EE and SENER on the whole model in the
+            ODBs; otherwise only RF of the reference points is written, the
+            volume coming from the mesh of the .inp
+        resultsStore: SQLite results store of the campaign (see results_store)
+            recording the iterations, volumes, mesh size and stage times
+        resume: continue an interrupted run from PBC-modelname-nD-state.json
+            (completed iterations and load cases, finished ODBs) instead of
+            starting again
+        embeddedEquations: include file of the embedded constraints written
+            by embedded_locator.py (NAME-embedded.inp); it replaces the
+            EmbeddedRegion, whose host search Abaqus redoes in every job:
+            any EmbeddedRegion of the model is deleted and the file is
+            included in each job input once it is written
+        meshTolerance: pair the periodic nodes within 0.1 times the smallest
+            element edge measured by periodicity_check instead of the fixed
+            1e-3
+        jobTimeout: time limit of each Abaqus job in hours, 0 for none; a
+            job still running or without .log after it is killed and the
+            run stops
     """
+    start = time.time()
     if filePath != '':
         working_folder = os.path.abspath(os.path.join(filePath,os.pardir))
         os.chdir(working_folder)
@@ -629,23 +755,6 @@ def main(filePath, modelname, iteration, dimension, meshType):
         text_file_name = os.path.join(working_folder,name[0:-6]+'.e2a')
     
 
-    # Define deformation matrices based on dimension
-    if dimension == 2:
-        homotot = [
-            [(0.1, 0.0, 0.0), (0.0, 0.0, 0.0)],           # xx
-            [(0.0, 0.0, 0.0), (0.0, 0.1, 0.0)],           # yy
-            [(0.0, 0.05, 0.0), (0.05, 0.0, 0.0)]          # xy
-        ]
-    else:  # 3D case
-        homotot = [
-            [(0.1, 0.0, 0.0), (0.0, 0.0, 0.0), (0.0, 0.0, 0.0)],    # xx
-            [(0.0, 0.0, 0.0), (0.0, 0.1, 0.0), (0.0, 0.0, 0.0)],    # yy
-            [(0.0, 0.0, 0.0), (0.0, 0.0, 0.0), (0.0, 0.0, 0.1)],    # zz
-            [(0.0, 0.05, 0.0), (0.05, 0.0, 0.0), (0.0, 0.0, 0.0)],  # xy
-            [(0.0, 0.0, 0.05), (0.0, 0.0, 0.0), (0.05, 0.0, 0.0)],  # xz
-            [(0.0, 0.0, 0.0), (0.0, 0.0, 0.05), (0.0, 0.05, 0.0)]   # yz
-        ]
-
     with open(text_file_name, 'r') as f:
         lines = f.readlines()
     long = float(lines[0])
@@ -665,6 +774,12 @@ def main(filePath, modelname, iteration, dimension, meshType):
 
     modelname = name[0:-6]
     print modelname
+
+    # a mesh that is not periodic stops here, before any constraint or job
+    check = verify_periodicity(filePath, dimension)
+    print(format_report(check))
+    if not check['periodic']:
+        raise ValueError('The mesh of %s is not periodic, see the nodes without partner above' % filePath)
     
     
     a = mdb.models[modelname].rootAssembly
@@ -776,6 +891,8 @@ def main(filePath, modelname, iteration, dimension, meshType):
     #RF3 = a.ReferencePoint(point=(minx + (long + 2 * ep) * 1.3, miny, minz))
 
     periodicBoundary = PeriodicBoundary(modelname)
+    if meshTolerance:
+        periodicBoundary.setCaracLength(check['length'])
 
     r1 = a.referencePoints
     f1 = a.instances['RVEPLUS-1'].nodes
@@ -789,29 +906,43 @@ def main(filePath, modelname, iteration, dimension, meshType):
         periodicBoundary.setRefpoint2(RP2=r1[6])
         periodicBoundary.setRefpoint3(RP3=r1[7])
 
-    # periodicity in X direction
-    periodicBoundary.setGroup1(set1=a.allSets['NMINX'].nodes)
-    periodicBoundary.setGroup2(set2=a.allSets['NMAXX'].nodes)
-    periodicBoundary.Periodic(is_smallstrain=False, dim=dimension, 
-                            Vx=(long + 2 * ep), Vy=0, Vz=0)
-    # periodicity in Y direction
-    periodicBoundary.setGroup1(set1=a.allSets['NMINY'].nodes)
-    periodicBoundary.setGroup2(set2=a.allSets['NMAXY'].nodes)
-    periodicBoundary.Periodic(is_smallstrain=False, dim=dimension, 
-                            Vx=0, Vy=(larg + 2 * ep), Vz=0)
-
-    if dimension == 3:
-        # periodicity in Z direction
-        periodicBoundary.setGroup1(set1=a.allSets['NMINZ'].nodes)
-        periodicBoundary.setGroup2(set2=a.allSets['NMAXZ'].nodes)
-        periodicBoundary.Periodic(is_smallstrain=False, dim=dimension,
-                                Vx=0, Vy=0, Vz=(haut + 2 * ep))
+    # equations already written in the deck by create_model_inp.main_combine(equations=True)
+    hasEquations = False
+    for c in mdb.models[modelname].constraints.values():
+        if(type(c).__name__ == 'Equation'):
+            hasEquations = True
+            break
+
+    if hasEquations:
+        print 'Periodic equations found in the input file, PBC generation skipped'
+    else:
+        # periodicity in X direction
+        periodicBoundary.setGroup1(set1=a.allSets['NMINX'].nodes)
+        periodicBoundary.setGroup2(set2=a.allSets['NMAXX'].nodes)
+        periodicBoundary.Periodic(is_smallstrain=False, dim=dimension, 
+                                Vx=(long + 2 * ep), Vy=0, Vz=0)
+        # periodicity in Y direction
+        periodicBoundary.setGroup1(set1=a.allSets['NMINY'].nodes)
+        periodicBoundary.setGroup2(set2=a.allSets['NMAXY'].nodes)
+        periodicBoundary.Periodic(is_smallstrain=False, dim=dimension, 
+                                Vx=0, Vy=(larg + 2 * ep), Vz=0)
+
+        if dimension == 3:
+            # periodicity in Z direction
+            periodicBoundary.setGroup1(set1=a.allSets['NMINZ'].nodes)
+            periodicBoundary.setGroup2(set2=a.allSets['NMAXZ'].nodes)
+            periodicBoundary.Periodic(is_smallstrain=False, dim=dimension,
+                                    Vx=0, Vy=0, Vz=(haut + 2 * ep))
 
     ###########################################
 
-    mdb.models[modelname].StaticStep(name='Step-1', previous='Initial')
-    mdb.models[modelname].steps['Step-1'].setValues(maxNumInc=1000, minInc=0.000001, initialInc=0.001,
-                                                    matrixSolver=DIRECT, matrixStorage=UNSYMMETRIC, amplitude=STEP)
+    if loadCases:
+        mdb.models[modelname].StaticLinearPerturbationStep(name='Step-1', previous='Initial',
+                                                           matrixSolver=DIRECT)
+    else:
+        mdb.models[modelname].StaticStep(name='Step-1', previous='Initial')
+        mdb.models[modelname].steps['Step-1'].setValues(maxNumInc=1000, minInc=0.000001, initialInc=0.001,
+                                                        matrixSolver=DIRECT, matrixStorage=UNSYMMETRIC, amplitude=STEP)
 
     a = mdb.models[modelname].rootAssembly
     ###########################################
@@ -841,190 +972,57 @@ def main(filePath, modelname, iteration, dimension, meshType):
         a.Instance(name='EMBEDDED-1', part=p1, dependent=ON)
         c1 = a.instances['EMBEDDED-1'].cells
         a.Set(cells=c1, name='Set-cells-fiber')
-        region1 = a.sets['EMBEDDED-1.Set-2']
-        region2 = a.sets['RVEPLUS-1.Set-1']
-        mdb.models[modelname].EmbeddedRegion(name='Constraint-1',
-                                            embeddedRegion=region1, hostRegion=region2,
-                                            weightFactorTolerance=1e-06, absoluteTolerance=0.0,
-                                            fractionalTolerance=0.1, toleranceMethod=FRACTIONAL)
-
-
-
-
-    ite_job = 1
-    if dimension == 2:
-        idx = [0, 3, 1]
+        if embeddedEquations == '':
+            region1 = a.sets['EMBEDDED-1.Set-2']
+            region2 = a.sets['RVEPLUS-1.Set-1']
+            mdb.models[modelname].EmbeddedRegion(name='Constraint-1',
+                                                embeddedRegion=region1, hostRegion=region2,
+                                                weightFactorTolerance=1e-06, absoluteTolerance=0.0,
+                                                fractionalTolerance=0.1, toleranceMethod=FRACTIONAL)
+
+
+
+
+    include = None
+    if embeddedEquations != '':
+        removeEmbeddedRegions(modelname)
+        include = os.path.abspath(embeddedEquations)
+        print('Embedded constraints read from %s' % embeddedEquations)
+
+    volumes = model_volumes(filePath)
+    print('volume of SET-1: %g' % volumes['SET-1'])
+    state = RunState(state_path(working_folder, modelname, dimension), resume)
+    timeout = jobTimeout * 3600. if jobTimeout > 0 else None
+    if loadCases:
+        backend = AbaqusLoadCases(modelname, dimension, cpus or None, cpusPerJob or None,
+                                  volumes['SET-1'], fullOutput, state, include, timeout)
     else:
-        idx = [0, 4, 8, 1, 2, 5]
-
-    for i in range(iteration):
-        C = []        
-        if i > 0:
-            name = 'PBC-%s-%d-%dD.dat' % (name[0:-4], i, dimension)
-            f = open(name, 'r')
-            data = f.read()
-            splitdata = (data.split())
-            floatdata = []
-            for uniqueName in splitdata:
-                floatdata.append(float(uniqueName))
-
-            if dimension == 3:
-                sd = np.reshape(floatdata, (6, 6))
-                s11 = sd[0][0]
-                s12 = sd[0][1]
-                s22 = sd[1][1]
-                s13 = sd[0][2]
-                s23 = sd[1][2]
-                s33 = sd[2][2]
-                s14 = sd[0][3]
-                s24 = sd[1][3]
-                s34 = sd[2][3]
-                s44 = sd[3][3]
-                s15 = sd[0][4]
-                s25 = sd[1][4]
-                s35 = sd[2][4]
-                s45 = sd[3][4]
-                s55 = sd[4][4]
-                s16 = sd[0][5]
-                s26 = sd[1][5]
-                s36 = sd[2][5]
-                s46 = sd[3][5]
-                s56 = sd[4][5]
-                s66 = sd[5][5]
-                f.close()
-            
-                mdb.models[modelname].materials['ENRICH'].Elastic(type=ANISOTROPIC, table=((
-                                                                 s11, s12, s22, s13, s23, s33,
-                                                                 s14, s24, s34, s44, s15, s25,
-                                                                 s35, s45, s55, s16, s26, s36,
-                                                                 s46, s56, s66),))
-            else:
-                sd = np.reshape(floatdata, (3, 3))
-                s11 = sd[0][0]
-                s12 = sd[0][1]
-                s22 = sd[1][1]
-                s13 = sd[0][2]
-                s23 = sd[1][2]
-                s33 = sd[2][2]
-                f.close()
-                E1 = s11 - ((s12 * s12) / s22);
-                E2 = s22 - ((s12 * s12) / s11);
-                E3 = (s11 * s22 - (s12 * s12)) / s22;
-                E4 = (s11 * s22 - (s12 * s12)) / s11;
-                Emed = (E1 + E2 + E3 + E4) / 4;
-
-                NU1 = s12 / s22;
-                NU2 = s12 / s11;
-                NU3 = ((s12 * s12) / (s11 * s22)) ** 0.5;
-                NUmed = (NU1 + NU2 + NU3) / 3.;
-                print(Emed, NUmed)
-
-
-                mdb.models[modelname].materials['ENRICH'].Elastic(type=ISOTROPIC, table=((Emed, NUmed),))
-            
-
-        a = mdb.models[modelname].rootAssembly
-
-        region1 = a.sets['REFMACRO1']
-        region2 = a.sets['REFMACRO2']
-        if dimension == 3:
-            region3 = a.sets['REFMACRO3']
-
-        job_namess = []
-
-        for DefMat in homotot:
-            # First reference point BC
-            mdb.models[modelname].DisplacementBC(name='BC-1', createStepName='Step-1',
-                                               region=region1, u1=DefMat[0][0], u2=DefMat[0][1], 
-                                               u3=UNSET if dimension==2 else DefMat[0][2], 
-                                               ur1=UNSET, ur2=UNSET, ur3=UNSET,
-                                               amplitude=UNSET, fixed=OFF, distributionType=UNIFORM, 
-                                               fieldName='', localCsys=None)
-
-            # Second reference point BC
-            mdb.models[modelname].DisplacementBC(name='BC-2', createStepName='Step-1',
-                                               region=region2, u1=DefMat[1][0], u2=DefMat[1][1], 
-                                               u3=UNSET if dimension==2 else DefMat[1][2], 
-                                               ur1=UNSET, ur2=UNSET, ur3=UNSET,
-                                               amplitude=UNSET, fixed=OFF, distributionType=UNIFORM, 
-                                               fieldName='', localCsys=None)
-
-            # Third reference point BC - only for 3D
-            if dimension == 3:
-                mdb.models[modelname].DisplacementBC(name='BC-3', createStepName='Step-1',
-                                                   region=region3, u1=DefMat[2][0], u2=DefMat[2][1], 
-                                                   u3=DefMat[2][2], ur1=UNSET, ur2=UNSET, ur3=UNSET,
-                                                   amplitude=UNSET, fixed=OFF, distributionType=UNIFORM, 
-                                                   fieldName='', localCsys=None)
-
-            mdb.models[modelname].fieldOutputRequests['F-Output-1'].setValues(
-                variables=('S', 'U', 'RF', 'IVOL', 'EE', 'SENER'))
-
-            name = 'Job-' + str(ite_job)
-            job_namess.append(name)
-
-            mdb.Job(name=name, model=modelname, description='', type=ANALYSIS,
-                    atTime=None, waitMinutes=0, waitHours=0, queue=None, memory=90,
-                    memoryUnits=PERCENTAGE, getMemoryFromAnalysis=True, numCpus=1,
-                    echoPrint=OFF, modelPrint=OFF, contactPrint=OFF, historyPrint=OFF, userSubroutine='',
-                    scratch='', resultsFormat=ODB, multiprocessingMode=DEFAULT,
-                    numGPUs=0)  # explicitPrecision=SINGLE, nodalOutputPrecision=SINGLE,
-            mdb.jobs[name].submit(consistencyChecking=OFF)
-            ite_job = ite_job + 1
-
-        for result in job_namess:
-            mdb.jobs[name].waitForCompletion()
-            odb = openOdb(result + '.odb')
-            lastFrame = odb.steps['Step-1'].frames[-1]
-            first_set = odb.rootAssembly.instances['ASSEMBLY']
-            allFields = lastFrame.fieldOutputs
-
-            elsetname = 'SET-1'
-
-            phase = odb.rootAssembly.elementSets[elsetname]  # faire l'iteration pour les deux sets de RVE et envelope
-            jacobien = lastFrame.fieldOutputs['IVOL']
-            jac = jacobien.getSubset(position=INTEGRATION_POINT, region=phase)
-            det = jac.values
-
-            # Calculate volume
-            b = 0
-            for t in det:
-                b = b + t.data
-
-            if (allFields.has_key('RF')):
-                ReactionForce = allFields['RF']
-                ite = 0
-                data = []
-                
-                # Adjust data collection based on dimension
-                if dimension == 2:
-                    max_ref_points = 2
-                    components_per_point = 3  # only x and y components
-                else:  # 3D case
-                    max_ref_points = 3
-                    components_per_point = 3  # x, y, and z components
-
-                for value in ReactionForce.values:
-                    if (value.nodeLabel <= max_ref_points) and (ite < components_per_point):
-                        for val in value.data:
-                            data.append(10 * val / b)
-                        ite = ite + 1
-
-            sorteddata = []
-            for d in range(len(idx)):
-                sorteddata.append(abs(data[idx[d]]))
-            C.append(sorteddata)
-            odb.close()
-
-        # Write results to file
-        f = open('PBC-%s-%d-%dD.dat' % (name[0:-4], i + 1, dimension), 'w')
-        for val in C:
-            for subval in val:
-                f.write(str(subval) + ' ')
-            f.write('\n')
-        f.close()
-        print
-        'finished : ' + modelname
+        backend = AbaqusJobs(modelname, dimension, cpus or None, cpusPerJob or None,
+                             volumes['SET-1'], fullOutput, state, include, timeout)
+    if acceleration == 'none':
+        acceleration = None
+    initial = None
+    if warmStart != '':
+        initial = warm_start(warmStart, dimension)
+    elif initialGuess != 'matrix':
+        rveVolume, inclusionVolume = phase_volumes(volumes)
+        initial = initial_enrich(initialGuess, rveVolume, inclusionVolume,
+                                 isotropicMaterial(modelname, 'MATRIX'), isotropicMaterial(modelname, 'EMBEDDED'),
+                                 dimension)
+    store = None
+    if resultsStore != '':
+        store = ResultsStore(resultsStore)
+        store.rve_id(modelname, working_folder, dimension)
+        store.add_quantities(modelname, 'volume', volumes)
+        store.add_quantities(modelname, 'mesh', {'nodes': len(p.nodes), 'elements': len(p.elements)})
+    setup = time.time() - start
+    run_enrichment(backend, iteration, dimension, modelname, tol=tolerance,
+                   acceleration=acceleration, relaxation=relaxation, initial=initial, store=store,
+                   state=state)
+    if store is not None:
+        store.add_quantities(modelname, 'timing', {'setup': setup, 'enrichment': time.time() - start - setup})
+        store.close()
+    print('finished : ' + modelname)
 
 
 
@@ -0,0 +1,129 @@
+# Verification de la periodicite du maillage avant tout calcul, sur les
+# tableaux du .inp: longueur caracteristique (plus petite arete) calculee sur
+# la connectivite en une passe, appariement des faces NMIN*/NMAX* par grille
+# (pbc_tools.pair_nodes), noeuds sans partenaire et statistiques des ecarts.
+# Remplace les recherches O(n^2) de VerifNodeCoord / GetCarcLength.
+#
+#     python periodicity_check.py NAME-model.inp
+#     python periodicity_check.py NAME-VER.inp --factor 0.1
+
+from __future__ import division, print_function
+
+import argparse
+import sys
+
+import numpy as np
+
+from inp_reader import element_blocks, element_family, read_model
+from pbc_tools import pair_nodes
+
+AXES = ['X', 'Y', 'Z']
+# node pairs of the edges of each element family
+EDGES = {
+    'tri3': [(0, 1), (1, 2), (2, 0)],
+    'quad4': [(0, 1), (1, 2), (2, 3), (3, 0)],
+    'tet4': [(0, 1), (1, 2), (2, 0), (0, 3), (1, 3), (2, 3)],
+    'hex8': [(0, 1), (1, 2), (2, 3), (3, 0), (4, 5), (5, 6), (6, 7), (7, 4),
+             (0, 4), (1, 5), (2, 6), (3, 7)],
+}
+FACTOR = 0.1  # pairing tolerance / characteristic length, as in PeriodicBoundary
+
+
+def characteristic_length(coords, blocks):
+    """Smallest non-zero element edge of [(family, connectivity as node rows)]"""
+    small = np.inf
+    for family, conn in blocks:
+        edges = np.array(EDGES[family])
+        vectors = coords[conn[:, edges[:, 1]]] - coords[conn[:, edges[:, 0]]]
+        lengths = np.sqrt((vectors ** 2).sum(axis=-1))
+        lengths = lengths[lengths > 0]
+        if len(lengths):
+            small = min(small, float(lengths.min()))
+    return small
+
+
+def face_pairs(coords, rows_min, rows_max, translation, tol):
+    """Pairing of the nodes of a NMIN face with the nodes of the NMAX face shifted by -translation.
+
+    Returns the unmatched rows of each face and the distances of the pairs.
+    """
+    i, j = pair_nodes(coords[rows_min], coords[rows_max], translation, tol)
+    distance = np.sqrt(((coords[rows_min[i]] - (coords[rows_max[j]] - translation)) ** 2).sum(axis=1))
+    unmatched_min = np.setdiff1d(np.arange(len(rows_min)), i)
+    unmatched_max = np.setdiff1d(np.arange(len(rows_max)), j)
+    return rows_min[unmatched_min], rows_max[unmatched_max], distance
+
+
+def verify_periodicity(path, dimension=None, factor=FACTOR):
+    """Periodicity report of the host mesh of a deck (RVEPLUS part, or the whole -VER.inp).
+
+    The faces are the NMINX..NMAXZ node sets when the deck has them, the
+    nodes on the bounding box otherwise; the period is the extent of the
+    mesh. Returns a dict with the characteristic length, the tolerance,
+    'periodic' and, per axis, the pair count, the unmatched node labels of
+    both faces and the max / mean / rms distance of the pairs.
+    """
+    part = read_model(path).host()
+    if dimension is None:
+        dimension = max(element_family(element_type)[1] for element_type in part.elements)
+    blocks = [(family, conn) for family, ids, conn in element_blocks(part, dimension)]
+    coords = part.coords.copy()
+    coords[:, dimension:] = 0.
+    length = characteristic_length(coords, blocks)
+    tol = factor * length
+    lo = coords.min(axis=0)
+    hi = coords.max(axis=0)
+
+    report = {'length': length, 'tolerance': tol, 'periodic': True, 'axes': {}}
+    for k in range(dimension):
+        names = ['NMIN' + AXES[k], 'NMAX' + AXES[k]]
+        if all(name in part.nodeSets for name in names):
+            rows_min, rows_max = [part.node_rows(part.nodeSets[name]) for name in names]
+        else:
+            rows_min = np.nonzero(np.abs(coords[:, k] - lo[k]) <= tol)[0]
+            rows_max = np.nonzero(np.abs(coords[:, k] - hi[k]) <= tol)[0]
+        translation = np.zeros(3)
+        translation[k] = hi[k] - lo[k]
+        unmatched_min, unmatched_max, distance = face_pairs(coords, rows_min, rows_max, translation, tol)
+        axis = {'pairs': len(distance),
+                'unmatched_min': part.node_ids[unmatched_min], 'unmatched_max': part.node_ids[unmatched_max],
+                'max': float(distance.max()) if len(distance) else 0.,
+                'mean': float(distance.mean()) if len(distance) else 0.,
+                'rms': float(np.sqrt((distance ** 2).mean())) if len(distance) else 0.}
+        if len(unmatched_min) or len(unmatched_max):
+            report['periodic'] = False
+        report['axes'][AXES[k]] = axis
+    return report
+
+
+def format_report(report, show=10):
+    lines = ['characteristic length %.6g, tolerance %.6g' % (report['length'], report['tolerance'])]
+    for name in sorted(report['axes']):
+        axis = report['axes'][name]
+        lines.append('%s: %d pairs, distance max %.3e mean %.3e rms %.3e, unmatched %d on NMIN%s, %d on NMAX%s'
+                     % (name, axis['pairs'], axis['max'], axis['mean'], axis['rms'],
+                        len(axis['unmatched_min']), name, len(axis['unmatched_max']), name))
+        for side in ('min', 'max'):
+            labels = axis['unmatched_' + side]
+            if len(labels):
+                lines.append('    N%s%s without partner: %s%s' % (side.upper(), name, labels[:show].tolist(),
+                                                                ' ...' if len(labels) > show else ''))
+    lines.append('mesh periodic' if report['periodic'] else 'mesh NOT periodic')
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Check the periodicity of an RVE mesh before any job')
+    parser.add_argument('inp', help='NAME-model.inp or NAME-VER.inp')
+    parser.add_argument('--dimension', type=int, choices=[2, 3], default=None,
+                        help='default: from the element types')
+    parser.add_argument('--factor', type=float, default=FACTOR,
+                        help='pairing tolerance as a fraction of the smallest edge (default %g)' % FACTOR)
+    args = parser.parse_args(argv)
+    report = verify_periodicity(args.inp, args.dimension, args.factor)
+    print(format_report(report))
+    return 0 if report['periodic'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
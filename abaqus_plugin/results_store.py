@@ -0,0 +1,184 @@
+# Base de resultats d'une campagne d'homogeneisation (SQLite): rigidite et
+# variation relative de chaque iteration de chaque VER, volumes, statistiques
+# du maillage et temps des etapes. Les statistiques sur tous les VER se font
+# sur des tableaux numpy. Les anciens fichiers PBC-*-i-nD.dat s'importent.
+#
+#     python results_store.py campaign.db import rve_folder1 rve_folder2 ...
+#     python results_store.py campaign.db stats
+
+from __future__ import division, print_function
+
+import argparse
+import glob
+import os
+import re
+import sqlite3
+import time
+
+import numpy as np
+
+from enrichment import read_stiffness, relative_change
+
+DAT_NAME = re.compile(r'^PBC-(.+)-(\d+)-([23])D\.dat$')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rve (
+    id INTEGER PRIMARY KEY,
+    name TEXT UNIQUE NOT NULL,
+    folder TEXT,
+    dimension INTEGER,
+    created REAL
+);
+CREATE TABLE IF NOT EXISTS iteration (
+    rve_id INTEGER NOT NULL REFERENCES rve(id),
+    iteration INTEGER NOT NULL,
+    stiffness TEXT NOT NULL,
+    change REAL,
+    seconds REAL,
+    PRIMARY KEY (rve_id, iteration)
+);
+CREATE TABLE IF NOT EXISTS quantity (
+    rve_id INTEGER NOT NULL REFERENCES rve(id),
+    category TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value REAL,
+    PRIMARY KEY (rve_id, category, name)
+);
+"""
+
+
+class ResultsStore(object):
+    """Results of every RVE of a campaign in one SQLite file.
+
+    iteration: stiffness (space separated, row by row as in the .dat files),
+        relative change and wall time of each enrichment iteration;
+    quantity: any other scalar of an RVE by category, e.g. 'volume'
+        (SET-1, MATRIX, ...), 'mesh' (nodes, elements) or 'timing' (stage
+        seconds).
+    """
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+
+    def rve_id(self, name, folder=None, dimension=None):
+        """Id of an RVE, created on first use"""
+        row = self.db.execute('SELECT id FROM rve WHERE name = ?', (name,)).fetchone()
+        if row is not None:
+            if folder is not None or dimension is not None:
+                self.db.execute('UPDATE rve SET folder = COALESCE(?, folder), dimension = COALESCE(?, dimension) '
+                                'WHERE id = ?', (folder, dimension, row[0]))
+            return row[0]
+        cursor = self.db.execute('INSERT INTO rve (name, folder, dimension, created) VALUES (?, ?, ?, ?)',
+                                 (name, folder, dimension, time.time()))
+        return cursor.lastrowid
+
+    def add_iteration(self, name, iteration, C, change=None, seconds=None, dimension=None):
+        rve = self.rve_id(name, dimension=dimension)
+        text = ' '.join(repr(float(v)) for v in np.ravel(C))
+        self.db.execute('INSERT OR REPLACE INTO iteration VALUES (?, ?, ?, ?, ?)',
+                        (rve, iteration, text, change, seconds))
+        self.db.commit()
+
+    def add_quantities(self, name, category, values):
+        """Record a dict name -> value under a category"""
+        rve = self.rve_id(name)
+        self.db.executemany('INSERT OR REPLACE INTO quantity VALUES (?, ?, ?, ?)',
+                            [(rve, category, key, float(value)) for key, value in values.items()])
+        self.db.commit()
+
+    def names(self):
+        return [row[0] for row in self.db.execute('SELECT name FROM rve ORDER BY name')]
+
+    def history(self, name):
+        """[(iteration, change, seconds)] of an RVE"""
+        return self.db.execute('SELECT iteration, change, seconds FROM iteration JOIN rve ON rve.id = rve_id '
+                               'WHERE name = ? ORDER BY iteration', (name,)).fetchall()
+
+    def stiffness(self, iteration=None, dimension=3):
+        """(names, (n, size, size) array) of the RVEs of one dimension, at the
+        given iteration or at their last one"""
+        if iteration is None:
+            rows = self.db.execute(
+                'SELECT name, stiffness FROM iteration JOIN rve ON rve.id = rve_id '
+                'WHERE dimension = ? AND iteration = (SELECT MAX(iteration) FROM iteration i '
+                'WHERE i.rve_id = rve.id) ORDER BY name', (dimension,)).fetchall()
+        else:
+            rows = self.db.execute(
+                'SELECT name, stiffness FROM iteration JOIN rve ON rve.id = rve_id '
+                'WHERE dimension = ? AND iteration = ? ORDER BY name', (dimension, iteration)).fetchall()
+        size = 3 if dimension == 2 else 6
+        values = np.array([np.array(text.split(), dtype=float) for name, text in rows]).reshape(-1, size, size)
+        return [name for name, text in rows], values
+
+    def quantities(self, category, name):
+        """(RVE names, values) of one quantity over the campaign"""
+        rows = self.db.execute('SELECT rve.name, value FROM quantity JOIN rve ON rve.id = rve_id '
+                               'WHERE category = ? AND quantity.name = ? ORDER BY rve.name',
+                               (category, name)).fetchall()
+        return [r[0] for r in rows], np.array([r[1] for r in rows], dtype=float)
+
+    def statistics(self, iteration=None, dimension=3):
+        """Mean, standard deviation, min and max of the stiffness over the RVEs"""
+        names, C = self.stiffness(iteration, dimension)
+        if not len(names):
+            return {'count': 0}
+        return {'count': len(names), 'mean': C.mean(axis=0), 'std': C.std(axis=0),
+                'min': C.min(axis=0), 'max': C.max(axis=0)}
+
+
+def import_dat(store, folder):
+    """Record the PBC-name-i-nD.dat files of a folder; returns the RVE names"""
+    found = {}
+    for path in glob.glob(os.path.join(folder, 'PBC-*-*D.dat')):
+        match = DAT_NAME.match(os.path.basename(path))
+        if match is None:
+            continue
+        name, iteration, dimension = match.group(1), int(match.group(2)), int(match.group(3))
+        found.setdefault((name, dimension), []).append((iteration, path))
+    for (name, dimension), files in found.items():
+        store.rve_id(name, os.path.abspath(folder), dimension)
+        previous = None
+        for iteration, path in sorted(files):
+            C = read_stiffness(path, dimension)
+            change = None
+            if previous is not None:
+                change = relative_change(C, previous)
+            previous = C
+            store.add_iteration(name, iteration, C, change)
+    return sorted(name for name, dimension in found)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Results store of a homogenization campaign')
+    parser.add_argument('store', help='SQLite file')
+    sub = parser.add_subparsers(dest='command')
+    imp = sub.add_parser('import', help='import the PBC-*.dat files of RVE folders')
+    imp.add_argument('folders', nargs='+')
+    stats = sub.add_parser('stats', help='stiffness statistics over the RVEs')
+    stats.add_argument('--iteration', type=int, default=None, help='default: last iteration of each RVE')
+    stats.add_argument('--dimension', type=int, choices=[2, 3], default=3)
+    args = parser.parse_args(argv)
+
+    store = ResultsStore(args.store)
+    if args.command == 'import':
+        for folder in args.folders:
+            names = import_dat(store, folder)
+            print('%s: %d RVEs' % (folder, len(names)))
+    elif args.command == 'stats':
+        result = store.statistics(args.iteration, args.dimension)
+        print('%d RVEs' % result['count'])
+        if result['count']:
+            np.set_printoptions(precision=4, suppress=True)
+            for key in ('mean', 'std', 'min', 'max'):
+                print(key)
+                print(result[key])
+    store.close()
+
+
+if __name__ == '__main__':
+    main()
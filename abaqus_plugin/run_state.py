@@ -0,0 +1,111 @@
+# Etat d'un calcul d'enrichissement pour pouvoir le reprendre apres un arret:
+# iterations terminees, materiau ENRICH de l'iteration en cours, etat de
+# l'acceleration (Aitken, Anderson), job et resultat de chaque cas de charge. Sauvegarde dans PBC-<modele>-nD-state.json
+# apres chaque etape.
+
+from __future__ import division, print_function
+
+import json
+import os
+
+
+def state_path(folder, prefix, dimension):
+    return os.path.join(folder, 'PBC-%s-%dD-state.json' % (prefix, dimension))
+
+
+class RunState(object):
+    """Completed iterations and load cases of a run, saved as JSON.
+
+    Without a path the state only lives in memory (nothing to resume).
+    The FixedPointUpdate state (Aitken factor, Anderson history) is saved
+    with the ENRICH table it produced, so a resumed run takes the same
+    iterates as an uninterrupted one.
+    """
+    def __init__(self, path=None, resume=True):
+        self.path = path
+        self.data = {'history': [], 'iteration': None, 'enrich': None, 'updater': None, 'cases': {},
+                     'next_job': 1}
+        if path is not None and os.path.exists(path):
+            if resume:
+                f = open(path, 'r')
+                self.data.update(json.load(f))
+                f.close()
+            else:
+                os.remove(path)
+
+    def save(self):
+        if self.path is None:
+            return
+        tmp = self.path + '.tmp'
+        f = open(tmp, 'w')
+        json.dump(self.data, f, indent=1)
+        f.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)  # os.rename does not replace on Windows
+        os.rename(tmp, self.path)
+
+    @property
+    def history(self):
+        return self.data['history']
+
+    @property
+    def current(self):
+        """(elastic type, table) of the last ENRICH update, None for the copy of MATRIX"""
+        if self.data['enrich'] is None:
+            return None
+        return self.data['enrich'][0], tuple(self.data['enrich'][1])
+
+    @property
+    def updater(self):
+        """FixedPointUpdate.state() saved with the last ENRICH update, None before any"""
+        return self.data['updater']
+
+    def pending_enrich(self, iteration):
+        """ENRICH already chosen for an interrupted iteration, None otherwise"""
+        if self.data['iteration'] == iteration and not self.iteration_done(iteration):
+            return self.current
+        return None
+
+    def iteration_done(self, iteration):
+        return any(entry['iteration'] == iteration for entry in self.history)
+
+    def begin(self, iteration, enrich, updater=None):
+        """Start (or resume) an iteration with this ENRICH definition and updater state"""
+        if self.data['iteration'] != iteration:
+            self.data['iteration'] = iteration
+            self.data['cases'] = {}
+        if enrich is not None:
+            self.data['enrich'] = [enrich[0], [float(v) for v in enrich[1]]]
+        if updater is not None:
+            self.data['updater'] = updater
+        self.save()
+
+    def end(self, entry):
+        """Record a completed iteration (the run_enrichment history entry)"""
+        self.history.append(entry)
+        self.data['cases'] = {}
+        self.save()
+
+    def next_job(self):
+        """Name of the next job, numbered across iterations and restarts"""
+        name = 'Job-%d' % self.data['next_job']
+        self.data['next_job'] += 1
+        self.save()
+        return name
+
+    def case_job(self, case):
+        return self.data['cases'].get(str(case), {}).get('job')
+
+    def set_case_job(self, case, job):
+        self.data['cases'].setdefault(str(case), {})['job'] = job
+        self.save()
+
+    def case_result(self, case):
+        """(reactions, volume) of a completed load case of the current iteration"""
+        result = self.data['cases'].get(str(case), {}).get('result')
+        return None if result is None else (result[0], result[1])
+
+    def case_done(self, case, result):
+        reactions, volume = result
+        self.data['cases'].setdefault(str(case), {})['result'] = [[float(v) for v in reactions], float(volume)]
+        self.save()
@@ -1,5 +1,8 @@
 import os
+import re
+import sys
 import json
+import time
 import numpy as np
 from multiprocessing import Pool, cpu_count
 
@@ -16,36 +19,128 @@ def load_rve_config(json_path):
             })
         return particles, data['box_size']
 
-def get_node_coordinates(unv_path):
-    """Extract node coordinates from UNV file."""
-    nodes = {}
+DELIMITER = re.compile(r'^\s*-1\s*$', re.M)
+BEAM_TYPES = ('11', '21', '22', '23', '24')  # 2412 records with an extra orientation line
+
+
+def read_unv(unv_path):
+    """Read the nodes (2411) and the 2D elements (2412) of a UNV file in one pass.
+
+    Returns node ids, (n, 2) node coordinates and, for the triangles (91)
+    and quads (94) in file order: element ids, types, group ids (physical
+    property column) and a (m, 4) connectivity padded with -1.
+    """
     with open(unv_path, 'r') as f:
-        lines = f.readlines()
-        i = 0
-        while i < len(lines):
-            line = lines[i].strip()
-            if line == '2411':
-                i += 1
-                while i < len(lines) and lines[i].strip() != '-1':
-                    node_data = lines[i].strip().split()
-                    if len(node_data) >= 1:
-                        node_id = int(node_data[0])
-                        i += 1
-                        coord_line = lines[i].strip().replace('D', 'E')
-                        coords = coord_line.split()
-                        if len(coords) >= 3:
-                            nodes[node_id] = np.array([float(coords[0]), float(coords[1])])
-                    i += 1
-            i += 1
-    return nodes
-
-def is_point_in_sphere(point, sphere):
-    """Check if point is inside a sphere (circle in 2D)."""
-    return np.linalg.norm(np.array([point[0] - sphere['x'], point[1] - sphere['y']])) <= sphere['radius']
-
-def is_point_outside_box(point, box_size):
-    """Check if point is outside the bounding box."""
-    return not (0 <= point[0] <= box_size and 0 <= point[1] <= box_size)
+        text = f.read()
+    node_ids = np.zeros(0, dtype=np.int64)
+    coords = np.zeros((0, 2))
+    elem_ids, elem_types, elem_groups, conn = [], [], [], []
+
+    bounds = [m.start() for m in DELIMITER.finditer(text)]
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        block = text[start:end].split('\n', 2)
+        if len(block) < 3:
+            continue
+        dataset = block[1].strip()
+        if dataset == '2411':
+            lines = [l for l in block[2].split('\n') if l.strip()]
+            labels = np.array(' '.join(lines[0::2]).split(), dtype=float).reshape(-1, 4)
+            xyz = np.array(' '.join(lines[1::2]).replace('D', 'E').split(), dtype=float).reshape(-1, 3)
+            node_ids = np.concatenate([node_ids, labels[:, 0].astype(np.int64)])
+            coords = np.concatenate([coords, xyz[:, :2]])
+        elif dataset == '2412':
+            lines = block[2].split('\n')
+            k = 0
+            while k < len(lines):
+                fields = lines[k].split()
+                k += 1
+                if len(fields) < 6:
+                    continue
+                elem_type = fields[1]
+                count = int(fields[5])
+                if elem_type in BEAM_TYPES:
+                    k += 1
+                nodes = []
+                while len(nodes) < count and k < len(lines):
+                    nodes.extend(lines[k].split())
+                    k += 1
+                if elem_type == '91' or elem_type == '94':
+                    elem_ids.append(int(fields[0]))
+                    elem_types.append(int(elem_type))
+                    elem_groups.append(int(fields[2]))
+                    conn.append([int(n) for n in nodes[:4]] + [-1] * (4 - len(nodes[:4])))
+    return (node_ids, coords, np.array(elem_ids, dtype=np.int64), np.array(elem_types, dtype=np.int64),
+            np.array(elem_groups, dtype=np.int64), np.array(conn, dtype=np.int64).reshape(-1, 4))
+
+
+def element_centroids(node_ids, coords, conn):
+    """Mean of the node coordinates of each element (-1 padding ignored)"""
+    order = np.argsort(node_ids, kind='mergesort')
+    used = conn >= 0
+    pos = np.searchsorted(node_ids[order], conn[used])
+    if np.any(pos >= len(order)) or np.any(node_ids[order][np.minimum(pos, len(order)-1)] != conn[used]):
+        raise KeyError('element node missing from dataset 2411')
+    rows = np.zeros(conn.shape, dtype=np.int64)
+    rows[used] = order[pos]
+    xy = coords[rows] * used[:, :, None]
+    return xy.sum(axis=1) / used.sum(axis=1)[:, None]
+
+
+def locate_in_circles(points, cx, cy, radius):
+    """1-based index of the first circle holding each point, 0 when none does.
+
+    The circles are hashed on a grid of cell size max(radius), so each point
+    only tests the few circles overlapping its cell: O(points + circles).
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    cx = np.asarray(cx, dtype=float)
+    cy = np.asarray(cy, dtype=float)
+    radius = np.asarray(radius, dtype=float)
+    found = np.zeros(len(points), dtype=np.int64)
+    if len(points) == 0 or len(cx) == 0:
+        return found
+
+    h = max(float(radius.max()), 1e-12)
+    x0 = float((cx - radius).min())
+    y0 = float((cy - radius).min())
+    i0 = np.floor((cx - radius - x0) / h).astype(np.int64)
+    i1 = np.floor((cx + radius - x0) / h).astype(np.int64)
+    j0 = np.floor((cy - radius - y0) / h).astype(np.int64)
+    j1 = np.floor((cy + radius - y0) / h).astype(np.int64)
+    nx = int(i1.max()) + 1
+    ny = int(j1.max()) + 1
+
+    # one (cell, circle) entry per cell overlapped by the bounding box of a circle
+    nj = j1 - j0 + 1
+    cells = (i1 - i0 + 1) * nj
+    circle = np.repeat(np.arange(len(cx)), cells)
+    local = np.arange(cells.sum()) - np.repeat(np.cumsum(cells) - cells, cells)
+    keys = (j0[circle] + local % nj[circle]) * nx + i0[circle] + local // nj[circle]
+    order = np.lexsort((circle, keys))
+    keys = keys[order]
+    circle = circle[order]
+
+    pi = np.floor((points[:, 0] - x0) / h).astype(np.int64)
+    pj = np.floor((points[:, 1] - y0) / h).astype(np.int64)
+    valid = (pi >= 0) & (pi < nx) & (pj >= 0) & (pj < ny)
+    pk = pj * nx + pi
+    lo = np.searchsorted(keys, pk, side='left')
+    hi = np.searchsorted(keys, pk, side='right')
+    hi[~valid] = lo[~valid]
+
+    best = np.empty(len(points), dtype=np.int64)
+    best.fill(len(cx))
+    for r in range(int((hi - lo).max())):
+        rows = np.nonzero(hi - lo > r)[0]
+        cand = circle[lo[rows] + r]
+        dx = points[rows, 0] - cx[cand]
+        dy = points[rows, 1] - cy[cand]
+        inside = np.sqrt(dx*dx + dy*dy) <= radius[cand]
+        better = inside & (cand < best[rows])
+        best[rows[better]] = cand[better]
+    found[best < len(cx)] = best[best < len(cx)] + 1
+    return found
+
 
 def process_unv_file(unv_path):
     """Process a single UNV file."""
@@ -55,89 +150,43 @@ def process_unv_file(unv_path):
             return None
 
         particles, box_size = load_rve_config(json_path)
-        nodes = get_node_coordinates(unv_path)
-        groups = {}
-        envelope_elements = []
-        
-        with open(unv_path, 'r') as f:
-            lines = f.readlines()
-            i = 0
-            found_section = False
-            while i < len(lines):
-                line = lines[i].strip()
-                if line == '2412':
-                    found_section = True
-                    i += 1
-                    continue
-                if line == '-1':
-                    found_section = False
-                
-                if found_section:
-                    try:
-                        elem_data = line.split()
-                        if len(elem_data) >= 6 and (elem_data[1] == '91' or elem_data[1] == '94'):
-                            elem_id = int(elem_data[0])
-                            elem_type = elem_data[1]
-                            group_id = int(elem_data[2])
-                            
-                            i += 1
-                            node_ids = [int(x) for x in lines[i].strip().split()]
-                            node_coords = [nodes[node_id] for node_id in node_ids]
-                            element_center = np.mean(node_coords, axis=0)
-                            
-                            is_envelope = (elem_type == '94' or 
-                                         (elem_type == '91' and is_point_outside_box(element_center, box_size)))
-                            
-                            if is_envelope:
-                                envelope_elements.append(elem_id)
-                            else:
-                                if group_id not in groups:
-                                    groups[group_id] = {
-                                        'elements': [],
-                                        'sample_element_nodes': node_ids,
-                                        'assigned_inclusion': None
-                                    }
-                                groups[group_id]['elements'].append(elem_id)
-                    except (ValueError, IndexError):
-                        pass
-                i += 1
+        node_ids, coords, elem_ids, elem_types, elem_groups, conn = read_unv(unv_path)
+        centers = element_centroids(node_ids, coords, conn)
 
-        final_groups = {}
-        for group_id, group_data in groups.items():
-            try:
-                epicenter = np.mean([nodes[node_id] for node_id in group_data['sample_element_nodes']], axis=0)
-                for i, sphere in enumerate(particles, 1):
-                    if is_point_in_sphere(epicenter, sphere):
-                        group_data['assigned_inclusion'] = i
-                        break
-            except KeyError:
-                continue
+        outside = ~((centers[:, 0] >= 0) & (centers[:, 0] <= box_size) &
+                    (centers[:, 1] >= 0) & (centers[:, 1] <= box_size))
+        is_envelope = (elem_types == 94) | ((elem_types == 91) & outside)
+        envelope_elements = elem_ids[is_envelope]
+
+        # each group is assigned from the centroid of its first element
+        inner = np.nonzero(~is_envelope)[0]
+        group_ids, first = np.unique(elem_groups[inner], return_index=True)
+        assigned = locate_in_circles(centers[inner[first]],
+                                     [p['x'] for p in particles], [p['y'] for p in particles],
+                                     [p['radius'] for p in particles])
+        group_of = np.searchsorted(group_ids, elem_groups[inner])
+        # elements listed group by group, groups in order of first appearance
+        rank = np.argsort(np.argsort(first, kind='mergesort'), kind='mergesort')
+        listed = inner[np.lexsort((inner, rank[group_of]))]
+        inclusion = assigned[np.searchsorted(group_ids, elem_groups[listed])]
 
-        for inclusion_num in range(1, len(particles) + 1):
-            inclusion_elements = []
-            for group_data in groups.values():
-                if group_data['assigned_inclusion'] == inclusion_num:
-                    inclusion_elements.extend(group_data['elements'])
-            if inclusion_elements:
-                final_groups[inclusion_num] = {
-                    'elements': inclusion_elements,
-                    'name': f'Inclusion_{inclusion_num}'
-                }
-
-        matrix_elements = []
-        for group_data in groups.values():
-            if group_data['assigned_inclusion'] is None:
-                matrix_elements.extend(group_data['elements'])
+        final_groups = {}
+        for inclusion_num in np.unique(inclusion[inclusion > 0]).tolist():
+            final_groups[inclusion_num] = {
+                'elements': elem_ids[listed[inclusion == inclusion_num]].tolist(),
+                'name': f'Inclusion_{inclusion_num}'
+            }
 
+        matrix_elements = elem_ids[listed[inclusion == 0]].tolist()
         if matrix_elements:
             final_groups[len(particles) + 1] = {
                 'elements': matrix_elements,
                 'name': 'Matrix'
             }
 
-        if envelope_elements:
+        if len(envelope_elements):
             final_groups[len(particles) + 2] = {
-                'elements': envelope_elements,
+                'elements': envelope_elements.tolist(),
                 'name': 'Envelope'
             }
 
@@ -169,19 +218,27 @@ def write_2477_section(unv_path, groups):
         f.write('    -1\n')
 
 def main():
-    base_dir = r"C:/temp/RVE_model"
+    base_dir = sys.argv[1] if len(sys.argv) > 1 else r"C:/temp/RVE_model"
     unv_files = []
     for root, _, files in os.walk(base_dir):
         unv_files.extend([os.path.join(root, f) for f in files if f.endswith('.unv')])
-    
-    with Pool(processes=cpu_count()) as pool:
-        results = pool.map(process_unv_file, unv_files)
-    
-    # Minimal error reporting
+
+    start = time.time()
+    processes = cpu_count()
+    # a few chunks per worker: less dispatch overhead, still balanced
+    chunksize = max(1, len(unv_files) // (4 * processes))
+    with Pool(processes=processes) as pool:
+        results = list(pool.imap_unordered(process_unv_file, unv_files, chunksize=chunksize))
+
     errors = [r for r in results if isinstance(r, str) and r.startswith('Error')]
+    skipped = [r for r in results if r is None]
+    print(f"{len(unv_files)} UNV files: {len(results) - len(errors) - len(skipped)} processed, "
+          f"{len(skipped)} without RVE definition, {len(errors)} errors "
+          f"({time.time() - start:.1f} s, {processes} workers, chunks of {chunksize})")
     if errors:
         with open('processing_errors.log', 'w') as f:
             f.write('\n'.join(errors))
+        print('Errors written to processing_errors.log')
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -10,7 +10,17 @@ ABAQUS_PLUGIN_DIR = r"C:\SIMULIA\Abaqus\6.14-1\code\python2.7\lib\abaqus_plugins
 FILES_TO_SYNC = [
     "envelope_Enrichment_homtoolsDB.py",
     "envelope_Enrichment_homtools_plugin.py",
-    "periodicBoundary_env.py"
+    "periodicBoundary_env.py",
+    "pbc_tools.py",
+    "enrichment.py",
+    "job_scheduler.py",
+    "initial_guess.py",
+    "odb_extraction.py",
+    "inp_reader.py",
+    "mesh_volumes.py",
+    "results_store.py",
+    "run_state.py",
+    "periodicity_check.py"
 ]
 
 def sync_plugin():
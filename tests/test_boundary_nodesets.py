@@ -0,0 +1,47 @@
+import numpy as np
+
+from boundary_nodesets import classify_boundary, edge_and_corner_sets, format_nsets
+
+
+def cube_grid(n=3):
+    """labels and coordinates of an n x n x n node grid of the box [0, 2] x [0, 1] x [0, 1]"""
+    grid = np.stack(np.meshgrid(*[np.linspace(0., 1., n)] * 3, indexing='ij'), axis=-1).reshape(-1, 3)
+    grid[:, 0] *= 2.
+    return np.arange(1, len(grid) + 1), grid
+
+
+def test_faces_edges_and_corners_3d():
+    labels, coords = cube_grid()
+    sets = classify_boundary(labels, coords, [0., 0., 0.], [2., 1., 1.])
+    for name in ('NMINX', 'NMAXX', 'NMINY', 'NMAXY', 'NMINZ', 'NMAXZ'):
+        assert len(sets[name]) == 9
+    assert sets['NMINX'].tolist() == labels[coords[:, 0] == 0.].tolist()
+    # 12 edges of one node each, corners left out, and 8 corners
+    edges = [name for name in sets if name.count('_') == 1]
+    corners = [name for name in sets if name.count('_') == 2]
+    assert len(edges) == 12 and all(len(sets[name]) == 1 for name in edges)
+    assert len(corners) == 8 and all(len(sets[name]) == 1 for name in corners)
+    corner = labels[(coords == [2., 0., 1.]).all(axis=1)]
+    assert sets['NMAXX_MINY_MAXZ'].tolist() == corner.tolist()
+    assert corner[0] not in sets['NMAXX_MINY'] and corner[0] not in sets['NMINY_MAXZ']
+
+
+def test_relative_tolerance_2d():
+    labels = np.array([1, 2, 3, 4, 5])
+    coords = np.array([[0., 0.], [1000., 0.], [1000., 500. + 1e-7], [0., 500.], [500., 250.]])
+    sets = classify_boundary(labels, coords, [0., 0.], [1000., 500.], dimension=2)
+    # 1e-7 is within 1e-8 of the largest bound, the interior node is on no face
+    assert sets['NMAXY'].tolist() == [3, 4]
+    assert sorted(name for name in sets if '_' in name) == ['NMAXX_MAXY', 'NMAXX_MINY', 'NMINX_MAXY', 'NMINX_MINY']
+    assert sets['NMAXX_MAXY'].tolist() == [3]
+    assert all(5 not in labels_k for labels_k in sets.values())
+    sets = classify_boundary(labels, coords, [0., 0.], [1000., 500.], dimension=2, tol=1e-9)
+    assert sets['NMAXY'].tolist() == [4]
+
+
+def test_edge_sets_from_given_faces():
+    faces = {'NMINX': [1, 2], 'NMAXX': [3, 4], 'NMINY': [1, 3], 'NMAXY': [2, 4]}
+    sets = edge_and_corner_sets(faces, 2)
+    assert sets['NMINX_MINY'].tolist() == [1] and sets['NMAXX_MAXY'].tolist() == [4]
+    text = format_nsets({'NMINX': faces['NMINX'], 'EMPTY': []}, instance='RVEPLUS-1')
+    assert text == '*Nset, nset=NMINX, instance=RVEPLUS-1\n1, 2\n'
@@ -0,0 +1,72 @@
+import io
+
+import numpy as np
+import scipy.sparse as sp
+
+from embedded_locator import BoundingVolumeHierarchy, host_weights, write_embedded_equations
+
+
+def brute_force(points, lo, hi):
+    inside = np.all((points[:, None] >= lo[None]) & (points[:, None] <= hi[None]), axis=2)
+    return set(zip(*np.nonzero(inside)))
+
+
+def test_hierarchy_matches_brute_force():
+    rng = np.random.RandomState(0)
+    points = rng.uniform(0., 10., (300, 3))
+    for n in (0, 5, 8, 9, 200):  # no box, one leaf, a partial last level
+        lo = rng.uniform(0., 9., (n, 3))
+        hi = lo + rng.uniform(0.1, 2., (n, 3))
+        pp, box = BoundingVolumeHierarchy(lo, hi, leaf_size=8).query(points)
+        assert set(zip(pp.tolist(), box.tolist())) == brute_force(points, lo, hi)
+
+
+def square_mesh(n=3):
+    """n x n unit quads (quad4), and the same square in 2 n**2 triangles (tri3)"""
+    x, y = np.meshgrid(np.arange(n + 1.), np.arange(n + 1.), indexing='xy')
+    coords = np.column_stack([x.ravel(), y.ravel()])
+    a = np.array([j * (n + 1) + i for j in range(n) for i in range(n)])
+    quads = np.column_stack([a, a + 1, a + n + 2, a + n + 1])
+    tris = np.concatenate([quads[:, [0, 1, 2]], quads[:, [0, 2, 3]]])
+    return coords, quads, tris
+
+
+def test_host_weights_interpolate_positions():
+    coords, quads, tris = square_mesh()
+    rng = np.random.RandomState(1)
+    points = np.concatenate([rng.uniform(0., 3., (50, 2)), [[1., 1.], [3.05, 1.5], [4., 4.], [-1., 0.5]]])
+    for family, conn in (('quad4', quads), ('tri3', tris)):
+        W, outside = host_weights(points, coords, [(family, np.arange(len(conn)) + 1, conn)])
+        # within tol (0.1 of the element) the point is clamped on the boundary
+        assert outside.tolist() == [52, 53]
+        inner = np.arange(52)
+        assert np.allclose(np.asarray(W[inner].sum(axis=1)).ravel(), 1.)
+        assert np.allclose(W[:50].dot(coords), points[:50])
+        clamped = W[51].dot(coords).ravel()
+        assert np.isclose(clamped[0], 3.) and 1. <= clamped[1] <= 2.
+        assert W[outside].nnz == 0
+        # every weight of a point on its host element's nodes
+        for i in range(50):
+            cols = W[i].indices
+            assert any(set(cols) <= set(row) for row in conn)
+
+
+def test_host_weights_mixed_blocks():
+    coords, quads, tris = square_mesh(2)
+    blocks = [('quad4', np.array([1, 2]), quads[:2]), ('tri3', np.array([3, 4, 5, 6]), tris[[2, 3, 6, 7]])]
+    points = np.array([[0.5, 0.5], [1.5, 1.5], [0.25, 1.75]])
+    W, outside = host_weights(points, coords, blocks)
+    assert len(outside) == 0 and np.allclose(W.dot(coords), points)
+    assert W[0].nnz == 4 and W[1].nnz == 3
+
+
+def test_small_weights_are_dropped_and_rescaled():
+    W = sp.csr_matrix(np.array([[0.5, 0.5 - 1e-8, 1e-8], [0., 0., 0.]]))
+    f = io.StringIO()
+    count = write_embedded_equations(f, [7, 8], [11, 12, 13], W, 2)
+    assert count == 2  # the second node has no host
+    lines = f.getvalue().splitlines()
+    assert lines[:3] == ['** Constraint: embedded elements', '*Equation', '3']
+    terms = [t.strip() for t in lines[3].split(',')]
+    assert terms[:3] == ['EMBEDDED-1.7', '1', '1.'] and terms[3:5] == ['RVEPLUS-1.11', '1']
+    assert abs(float(terms[5]) + 0.5) < 1e-8 and 'RVEPLUS-1.13' not in lines[3]
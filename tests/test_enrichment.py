@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from enrichment import read_stiffness, run_enrichment, stress_index
+from run_state import RunState, state_path
+
+
+class Interrupted(Exception):
+    pass
+
+
+class IsotropicBackend(object):
+    """2D backend whose homogenized moduli are a contraction of the ENRICH ones.
+
+    The map is nonlinear so that the Anderson history changes the iterates;
+    stop makes the solve number stop raise, as a killed run.
+    """
+    def __init__(self, stop=None):
+        self.enrich = (1., 0.2)  # copy of MATRIX
+        self.tables = []
+        self.solves = 0
+        self.stop = stop
+
+    def set_enrich(self, elastic_type, table):
+        self.enrich = tuple(table)
+        self.tables.append(self.enrich)
+
+    def solve(self, homotot):
+        self.solves += 1
+        if self.solves == self.stop:
+            raise Interrupted()
+        E, nu = self.enrich
+        E, nu = 4. + 0.6 * E - 0.02 * E**2, 0.3 + 0.4 * (nu - 0.3) + 0.1 * (nu - 0.3)**2
+        C = E / (1. - nu**2) * np.array([[1., nu, 0.], [nu, 1., 0.], [0., 0., (1. - nu) / 2.]])
+        results = []
+        for row in C:
+            rf = np.zeros(4)
+            rf[stress_index(2)] = row / 10.
+            results.append((rf, 1.))
+        return results
+
+
+@pytest.mark.parametrize('acceleration', ['anderson', 'aitken'])
+def test_resume_keeps_the_acceleration(tmp_path, acceleration):
+    straight, folder = tmp_path / 'straight', tmp_path / 'resumed'
+    straight.mkdir()
+    folder.mkdir()
+    reference = IsotropicBackend()
+    run_enrichment(reference, 7, 2, 'rve', str(straight), acceleration=acceleration, relaxation=0.8,
+                   state=RunState(state_path(str(straight), 'rve', 2)))
+
+    path = state_path(str(folder), 'rve', 2)
+    killed = IsotropicBackend(stop=5)
+    with pytest.raises(Interrupted):
+        run_enrichment(killed, 7, 2, 'rve', str(folder), acceleration=acceleration, relaxation=0.8,
+                       state=RunState(path))
+    resumed = IsotropicBackend()
+    history = run_enrichment(resumed, 7, 2, 'rve', str(folder), acceleration=acceleration, relaxation=0.8,
+                             state=RunState(path, resume=True))
+
+    assert len(history) == 7
+    # the interrupted iteration 5 starts again with its table, then the updates go on
+    assert np.allclose(killed.tables + resumed.tables[1:], reference.tables)
+    for i in range(1, 8):
+        assert np.allclose(read_stiffness(str(folder / ('PBC-rve-%d-2D.dat' % i)), 2),
+                           read_stiffness(str(straight / ('PBC-rve-%d-2D.dat' % i)), 2))
@@ -0,0 +1,61 @@
+import json
+import os
+
+from envelope_cache import INFO_FILE, EnvelopeCache, cache_key
+
+
+def store(cache, tmp_path, ep, size=100):
+    key, params = cache_key([0., 0., 0.], [1., 1., 1.], ep, 0.1, 3, '4.11')
+    mesh = tmp_path / ('mesh%g.inp' % ep)
+    mesh.write_text('*Node\n' + 'x' * size)
+    e2a = tmp_path / 'ver.e2a'
+    e2a.write_text('')
+    cache.put(key, params, str(mesh), str(e2a), {'NMINX': [1, 2], 'NMAXX': [3, 4]},
+              {0: ([1, 2], [3, 4])})
+    return key
+
+
+def test_put_and_get(tmp_path):
+    cache = EnvelopeCache(str(tmp_path / 'cache'))
+    assert cache.get(cache_key([0.] * 3, [1.] * 3, 0.5, 0.1, 3, '4.11')[0]) is None
+    key = store(cache, tmp_path, 0.5)
+    entry = cache.get(key)
+    assert open(entry['mesh']).read().startswith('*Node')
+    assert entry['nodesets']['NMAXX'].tolist() == [3, 4]
+    assert [a.tolist() for a in entry['pairs'][0]] == [[1, 2], [3, 4]]
+    assert entry['info']['params']['ep'] == repr(0.5)
+    # the key only depends on the parameters, floats compared exactly
+    assert cache_key([0.] * 3, [1.] * 3, 0.5, 0.1, 3, '4.11')[0] == key
+    assert cache_key([0.] * 3, [1.] * 3, 0.5 + 1e-12, 0.1, 3, '4.11')[0] != key
+
+
+def test_hit_updates_last_used_atomically(tmp_path):
+    cache = EnvelopeCache(str(tmp_path / 'cache'))
+    key = store(cache, tmp_path, 0.5)
+    info_path = os.path.join(cache.root, key, INFO_FILE)
+    with open(info_path) as f:
+        before = json.load(f)['last_used']
+    entry = cache.get(key)
+    assert entry['info']['last_used'] >= before
+    assert sorted(os.listdir(os.path.join(cache.root, key))) == ['info.json', 'mesh.inp', 'sets.npz', 'ver.e2a']
+
+
+def test_truncated_info_is_a_miss(tmp_path):
+    cache = EnvelopeCache(str(tmp_path / 'cache'))
+    key = store(cache, tmp_path, 0.5)
+    with open(os.path.join(cache.root, key, INFO_FILE), 'w') as f:
+        f.write('{"params": {')
+    assert cache.get(key) is None
+    assert cache.entries() == []
+
+
+def test_evict_least_recently_used(tmp_path):
+    cache = EnvelopeCache(str(tmp_path / 'cache'), max_bytes=10 ** 9)
+    keys = [store(cache, tmp_path, ep, size=4000) for ep in (0.1, 0.2, 0.3)]
+    cache.get(keys[0])  # the first entry becomes the most recently used
+    sizes = dict((key, size) for key, size, info in cache.entries())
+    assert [key for key, size, info in cache.entries()] == [keys[1], keys[2], keys[0]]
+    cache.max_bytes = sizes[keys[0]] + sizes[keys[2]]
+    assert cache.evict() == 1
+    assert cache.get(keys[1]) is None and cache.get(keys[0]) is not None and cache.get(keys[2]) is not None
+    assert cache.clear() == 2 and not os.path.exists(cache.root)
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from fe_elements import batch_stiffness, elastic_matrix, plane_stress
+from inp_reader import element_volumes
+
+D3 = elastic_matrix('ISOTROPIC', [1., 0.3])
+D2 = plane_stress(D3)
+ELEMENTS = [
+    ('tet4', np.array([[0., 0., 0.], [2., 0., 0.], [0., 1., 0.], [0., 0., 3.]]), [0, 2, 1, 3], D3),
+    ('quad4', np.array([[0., 0.], [2., 0.], [2.5, 1.], [0., 1.]]), [0, 3, 2, 1], D2),
+    ('tri3', np.array([[0., 0.], [2., 0.], [0., 1.]]), [0, 2, 1], D2),
+]
+
+
+@pytest.mark.parametrize('family, xe, inverted, D', ELEMENTS)
+def test_inverted_connectivity_same_stiffness_and_volume(family, xe, inverted, D):
+    d = xe.shape[1]
+    ke, volume = batch_stiffness(family, np.array([xe, xe[inverted]]), D)
+    # same element, its nodes listed the other way round
+    dofs = (d * np.array(inverted)[:, None] + np.arange(d)).ravel()
+    assert np.allclose(ke[1], ke[0][np.ix_(dofs, dofs)])
+    assert volume[0] > 0 and np.isclose(volume[1], volume[0])
+    assert np.allclose(element_volumes(family, np.array([xe, xe[inverted]])), volume)
+    # one D per element takes the same path
+    ke_each, volume_each = batch_stiffness(family, np.array([xe, xe[inverted]]), np.array([D, D]))
+    assert np.allclose(ke_each, ke) and np.allclose(volume_each, volume)
+
+
+def test_degenerate_element_raises():
+    xe = np.array([[[0., 0.], [1., 0.], [2., 0.]]])
+    with np.errstate(divide='ignore', invalid='ignore'), pytest.raises(ValueError):
+        batch_stiffness('tri3', xe, D2)
@@ -0,0 +1,92 @@
+import json
+
+import numpy as np
+
+from find_elem_groups_unv import element_centroids, locate_in_circles, process_unv_file, read_unv
+
+
+def first_circle(points, cx, cy, radius):
+    """Nested loop of the former group assignment, for reference"""
+    found = np.zeros(len(points), dtype=np.int64)
+    for i, (x, y) in enumerate(points):
+        for k in range(len(cx)):
+            if np.hypot(x - cx[k], y - cy[k]) <= radius[k]:
+                found[i] = k + 1
+                break
+    return found
+
+
+def test_locate_in_circles_matches_the_loop():
+    rng = np.random.RandomState(1)
+    cx, cy = rng.uniform(0., 10., 40), rng.uniform(0., 10., 40)
+    radius = rng.uniform(0.2, 1.5, 40)  # overlapping circles: the first one wins
+    points = rng.uniform(-1., 11., (500, 2))
+    found = locate_in_circles(points, cx, cy, radius)
+    assert np.array_equal(found, first_circle(points, cx, cy, radius))
+    assert (found == 0).any() and (found > 0).any()
+
+
+def test_locate_in_circles_edge_cases():
+    assert locate_in_circles(np.zeros((0, 2)), [0.], [0.], [1.]).tolist() == []
+    assert locate_in_circles([[0., 0.]], [], [], []).tolist() == [0]
+    # on the circle counts as inside
+    assert locate_in_circles([[1., 0.], [1.01, 0.]], [0.], [0.], [1.]).tolist() == [1, 0]
+
+
+def node_line(label, x, y):
+    return '%10d%10d%10d%10d\n%25s%25s%25s\n' % (label, 1, 1, 11, ('%.16E' % x).replace('E', 'D'),
+                                                 ('%.16E' % y).replace('E', 'D'), '0.0D+00')
+
+
+UNV_ELEMENTS = """    -1
+  2412
+         1        91         1         1         7         3
+         1         2         5
+         2        21         2         1         7         2
+         0         1         1
+         1         2
+         3        91         1         1         7         3
+         2         3         5
+         4        91         2         1         7         3
+         3         4         5
+         5        94         3         1         7         4
+         1         2         3         4
+    -1
+"""
+
+
+def unv_text():
+    nodes = [(1, 0., 0.), (2, 2., 0.), (3, 2., 2.), (4, 0., 2.), (5, 1.5, 1.)]
+    return '    -1\n  2411\n' + ''.join(node_line(*n) for n in nodes) + '    -1\n' + UNV_ELEMENTS
+
+
+def test_read_unv(tmp_path):
+    path = tmp_path / 'RVE_model_1.unv'
+    path.write_text(unv_text())
+    node_ids, coords, elem_ids, elem_types, elem_groups, conn = read_unv(str(path))
+    assert node_ids.tolist() == [1, 2, 3, 4, 5] and np.allclose(coords[4], [1.5, 1.])
+    # the beam record and its orientation line are skipped
+    assert elem_ids.tolist() == [1, 3, 4, 5] and elem_types.tolist() == [91, 91, 91, 94]
+    assert elem_groups.tolist() == [1, 1, 2, 3]
+    assert conn[0].tolist() == [1, 2, 5, -1]
+    centers = element_centroids(node_ids, coords, conn)
+    assert np.allclose(centers[0], [3.5 / 3., 1. / 3.]) and np.allclose(centers[3], [1., 1.])
+
+
+def test_groups_written_as_2477(tmp_path):
+    path = tmp_path / 'RVE_model_1.unv'
+    path.write_text(unv_text())
+    definition = {'particles': {'x': [5., 1.2], 'y': [5., 0.4], 'radius': [1., 0.3]}, 'box_size': 2.}
+    (tmp_path / 'RVE_definition_1.json').write_text(json.dumps(definition))
+    assert process_unv_file(str(path)) == str(path)
+    section = path.read_text().split('  2477\n')[1]
+    # group 1 (first element centroid in particle 2) -> Inclusion_2, group 2 -> Matrix,
+    # the quad -> Envelope
+    assert 'Inclusion_2' in section and 'Inclusion_1' not in section
+    lines = section.splitlines()
+    assert lines[0].split()[0] == '2' and lines[0].split()[-1] == '2'
+    assert lines[2].split() == ['8', '1', '0', '0', '8', '3', '0', '0']
+    assert lines[3].split()[0] == '3' and lines[4].strip() == 'Matrix'
+    assert lines[6].split()[0] == '4' and lines[7].strip() == 'Envelope'
+    assert lines[8].split()[1] == '5'
+    assert process_unv_file(str(tmp_path / 'RVE_model_2.unv')) is None
@@ -0,0 +1,96 @@
+import numpy as np
+
+from enrichment import load_cases, stiffness_row, stress_index
+from homogenization_solver import RVESolver, read_model, solve_model
+from mesh_volumes import VOLUMES, model_volumes
+from results_store import ResultsStore
+from unv_to_inp_model import UnvData, write_inp_model
+
+
+def unv_square(n=4):
+    """n x n quads of a unit square in UNV form, the outer ring in the envelope"""
+    unv = UnvData()
+    for j in range(n + 1):
+        for i in range(n + 1):
+            unv.add_node(j * (n + 1) + i + 1, [i / float(n), j / float(n), 0.])
+    for j in range(n):
+        for i in range(n):
+            label = j * n + i + 1
+            a = j * (n + 1) + i + 1
+            unv.add_element(label, '94', [a, a + 1, a + n + 2, a + n + 1])
+            ring = i in (0, n - 1) or j in (0, n - 1)
+            unv.add_to_group('ENVELOPE' if ring else 'MATRIX', label)
+    return unv
+
+
+def test_read_unv_to_inp_model_deck(tmp_path):
+    path = str(tmp_path / 'sq-model.inp')
+    write_inp_model(unv_square(), path)
+    deck = read_model(path)
+    host = deck.parts['RVEPLUS']
+    # the part-level *Elset, elset=SET-1, instance=RVEPLUS-1 belongs to the part
+    assert np.array_equal(host.elemsets['SET-1'], np.arange(1, 17))
+    assert len(host.elemsets['MATRIX']) == 4 and len(host.elemsets['ENVELOPE']) == 12
+    assert 'NMINX' in host.nodeSets and 'REFMACRO1' in deck.assembly.nodeSets
+
+    solver = RVESolver(deck)
+    results = solver.solve(load_cases(2))
+    C = [stiffness_row(rf, volume, stress_index(2)) for rf, volume in results]
+    E, nu = 1., 0.2  # default MATRIX, ENRICH being its copy
+    expected = E / (1. - nu**2) * np.array([[1., nu, 0.], [nu, 1., 0.], [0., 0., (1. - nu) / 2.]])
+    assert np.allclose(C, expected, atol=1e-10)
+
+
+def test_read_model_skips_unknown_instance(tmp_path, capsys):
+    path = str(tmp_path / 'sq-model.inp')
+    write_inp_model(unv_square(2), path)
+    with open(path) as f:
+        text = f.read()
+    text = text.replace('*End Assembly', '*Elset, elset=OTHER, instance=MISSING-1\n1, 2\n*End Assembly')
+    with open(path, 'w') as f:
+        f.write(text)
+    deck = read_model(path)
+    assert 'OTHER' not in deck.parts['RVEPLUS'].elemsets
+    assert 'unknown instance MISSING-1' in capsys.readouterr().out
+
+
+def test_volume_schema_of_both_solvers(tmp_path):
+    path = str(tmp_path / 'sq-model.inp')
+    write_inp_model(unv_square(), path)
+    with open(path) as f:
+        text = f.read()
+    with open(path, 'w') as f:
+        f.write(text.replace('*End Part', '*Elset, elset=INCLUSION-1\n6, 7\n*End Part', 1))
+    store_path = str(tmp_path / 'results.db')
+    # as periodicBoundary_env.main records them, then the Python solver
+    store = ResultsStore(store_path)
+    store.rve_id('plugin', str(tmp_path), 2)
+    store.add_quantities('plugin', 'volume', model_volumes(path))
+    store.close()
+    solve_model(path, iteration=1, store_path=store_path)
+
+    store = ResultsStore(store_path)
+    rows = store.db.execute("SELECT DISTINCT quantity.name FROM quantity WHERE category = 'volume'").fetchall()
+    assert sorted(r[0] for r in rows) == sorted(VOLUMES)
+    for name, expected in zip(VOLUMES, [1., 2. / 16, 12. / 16, 2. / 16, 0., 0.]):
+        names, values = store.quantities('volume', name)
+        assert names == ['plugin', 'sq'] and np.allclose(values, expected)
+    store.close()
+
+
+def test_condensed_schur_kept_factorized(tmp_path, monkeypatch):
+    import homogenization_solver
+    path = str(tmp_path / 'sq-model.inp')
+    write_inp_model(unv_square(6), path)
+    cases = load_cases(2)
+    reference = RVESolver(read_model(path)).solve(cases)
+    dense = RVESolver(read_model(path), condense=True)
+    results = [dense.solve(cases)]
+    monkeypatch.setattr(homogenization_solver, 'SCHUR_DENSE_LIMIT', 0)
+    factorized = RVESolver(read_model(path), condense=True)
+    results.append(factorized.solve(cases))
+    for result in results:
+        for (rf, volume), (rf0, volume0) in zip(result, reference):
+            assert np.allclose(rf, rf0, rtol=1e-7, atol=1e-9) and np.isclose(volume, volume0)
+    assert dense.correction is None and factorized.correction is not None
+    assert factorized.pcg_log and factorized.pcg_log[0]['iterations'] > 0
@@ -0,0 +1,42 @@
+import numpy as np
+
+from initial_guess import bulk_shear, estimate, initial_enrich, phase_fractions, young_poisson
+from mesh_volumes import phase_volumes
+
+MATRIX = (3., 0.35)
+FIBRE = (70., 0.22)
+
+
+def test_moduli_round_trip():
+    for dimension in (2, 3):
+        E, nu = young_poisson(*bulk_shear(3., 0.35, dimension), dimension=dimension)
+        assert np.isclose(E, 3.) and np.isclose(nu, 0.35)
+
+
+def test_plane_stress_hashin_shtrikman():
+    f = 0.3
+    phases = phase_fractions(1., f, MATRIX, FIBRE, 2)
+    (f0, K0, G0), (f1, K1, G1) = phases
+    # 2D bounds with the stiffer phase as reference medium (Hashin 1965)
+    K_upper = K1 + f0 / (1. / (K0 - K1) + f1 / (K1 + G1))
+    G_upper = G1 + f0 / (1. / (G0 - G1) + f1 * (K1 + 2.*G1) / (2.*G1 * (K1 + G1)))
+    K_lower = K0 + f1 / (1. / (K1 - K0) + f0 / (K0 + G0))
+    G_lower = G0 + f1 / (1. / (G1 - G0) + f0 * (K0 + 2.*G0) / (2.*G0 * (K0 + G0)))
+    assert np.allclose(estimate('hs', phases, 2), ((K_upper + K_lower) / 2., (G_upper + G_lower) / 2.))
+    assert np.allclose(estimate('mt', phases, 2), (K_lower, G_lower))
+    # bounded by Voigt and Reuss, and not the 3D estimate
+    E2 = young_poisson(*estimate('mt', phases, 2), dimension=2)[0]
+    assert young_poisson(*estimate('reuss', phases, 2), dimension=2)[0] < E2
+    assert E2 < young_poisson(*estimate('voigt', phases, 2), dimension=2)[0]
+    assert not np.isclose(E2, young_poisson(*estimate('mt', phase_fractions(1., f, MATRIX, FIBRE), 3))[0])
+
+
+def test_embedded_fibres_counted_once():
+    # fibres of the EMBEDDED part lie over MATRIX elements of the host
+    volumes = {'SET-1': 10., 'MATRIX': 4., 'ENVELOPE': 6., 'INCLUSION': 0., 'VOID': 0., 'EMBEDDED': 1.}
+    rve_volume, inclusion_volume = phase_volumes(volumes)
+    assert (rve_volume, inclusion_volume) == (4., 1.)
+    assert np.isclose(phase_fractions(rve_volume, inclusion_volume, MATRIX, FIBRE)[1][0], 0.25)
+    volumes.update(MATRIX=3., INCLUSION=1., EMBEDDED=0.)  # the same fibres meshed in the host
+    assert phase_volumes(volumes) == (4., 1.)
+    assert initial_enrich('voigt', 4., 1., MATRIX, FIBRE, 2) != initial_enrich('voigt', 4., 1., MATRIX, FIBRE, 3)
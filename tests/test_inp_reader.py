@@ -0,0 +1,69 @@
+import numpy as np
+
+from inp_reader import element_volumes, read_model
+from mesh_volumes import model_volumes
+
+VER = """*Heading
+** mesh without parts, as a -VER.inp
+*Node
+1, 0., 0.
+2, 2., 0.
+3, 2., 1.
+4, 0., 1.
+5, 3., 0.
+*Element, type=CPS4R, ELSET=Matrix
+1, 1, 2, 3, 4
+*Element, type=CPS3, ELSET=Envelope
+2, 2, 5, 3
+*Nset, nset=Nminx
+1, 4
+"""
+
+MODEL = """*Part, name=RVEplus
+*Node
+1, 0., 0., 0.
+2, 1., 0., 0.
+3, 0., 1., 0.
+4, 0., 0., 1.
+5, 1., 1., 1.
+*Element, type=C3D4
+1, 1, 2, 3, 4
+2, 2, 3, 4, 5
+*Elset, elset=MATRIX
+1
+*End Part
+*Assembly, name=Assembly
+*Instance, name=RVEplus-1, part=RVEplus
+*End Instance
+*Elset, elset=ENVELOPE, instance=RVEplus-1
+2
+*End Assembly
+"""
+
+
+def test_element_volumes():
+    quad = np.array([[[0., 0.], [2., 0.], [3., 1.], [0., 2.]]])
+    assert np.isclose(element_volumes('quad4', quad)[0], 4.)
+    tet = np.array([[[0., 0., 0.], [0., 1., 0.], [1., 0., 0.], [0., 0., 1.]]])  # negative orientation
+    assert np.isclose(element_volumes('tet4', tet)[0], 1. / 6.)
+    tri = np.array([[[0., 0., 5.], [1., 0., 5.], [0., 1., 5.]]])  # (x, y, z) coordinates
+    assert np.isclose(element_volumes('tri3', tri)[0], 0.5)
+
+
+def test_read_model_without_parts(tmp_path):
+    path = tmp_path / 'sq-VER.inp'
+    path.write_text(VER)
+    mesh = read_model(str(path)).host()
+    assert mesh.node_ids.tolist() == [1, 2, 3, 4, 5]
+    assert sorted(mesh.elements) == ['CPS3', 'CPS4R']
+    assert mesh.elemsets['MATRIX'].tolist() == [1] and mesh.elemsets['ENVELOPE'].tolist() == [2]
+    assert mesh.nodeSets['NMINX'].tolist() == [1, 4]
+
+
+def test_model_volumes(tmp_path):
+    path = tmp_path / 'tet-model.inp'
+    path.write_text(MODEL)
+    volumes = model_volumes(str(path))
+    assert np.isclose(volumes['MATRIX'], 1. / 6.)
+    assert np.isclose(volumes['ENVELOPE'], 1. / 3.)
+    assert np.isclose(volumes['SET-1'], 0.5)
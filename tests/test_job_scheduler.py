@@ -0,0 +1,73 @@
+import os
+import sys
+
+import job_scheduler
+from job_scheduler import ABORTED, COMPLETED, FAILED, TIMEOUT, JobScheduler, LocalRunner, resolve_command
+
+
+def test_local_runner_failing_process():
+    # one job exits with 3, the other succeeds: the wait loop collects both
+    script = 'import sys; sys.exit(3 if "%(name)s" == "bad" else 0)'
+    runner = LocalRunner([sys.executable, '-c', script])
+    finished = []
+    results = JobScheduler(runner, cpus=2, poll_interval=0.01).run(['bad', 'good'], finished.append)
+    assert results['bad']['status'] == ABORTED
+    assert results['bad']['result'] is None
+    assert results['good']['status'] == COMPLETED
+    assert finished == ['good']
+    assert runner.processes == {}
+
+
+def test_timeout_kills_the_job():
+    script = 'import time; time.sleep(30 if "%(name)s" == "slow" else 0)'
+    runner = LocalRunner([sys.executable, '-c', script])
+    finished = []
+    results = JobScheduler(runner, cpus=2, poll_interval=0.01, timeout=2.).run(['slow', 'fast'], finished.append)
+    assert results['slow']['status'] == TIMEOUT and results['slow']['seconds'] < 10.
+    assert results['fast']['status'] == COMPLETED and finished == ['fast']
+    assert runner.processes == {}
+
+
+class SilentRunner(object):
+    """Jobs whose .log never appears: poll never gives a status"""
+    def submit(self, name, cpus, memory):
+        pass
+
+    def poll(self, name):
+        return None
+
+
+def test_timeout_without_kill():
+    results = JobScheduler(SilentRunner(), cpus=1, poll_interval=0.01, timeout=0.05).run(['a', 'b'])
+    assert [results[name]['status'] for name in 'ab'] == [TIMEOUT, TIMEOUT]
+
+
+def test_on_finished_error_does_not_orphan_the_others():
+    runner = LocalRunner([sys.executable, '-c', 'pass'])
+
+    def read(name):
+        if name == 'b':
+            raise IOError('no ODB for %s' % name)
+        return name.upper()
+
+    results = JobScheduler(runner, cpus=1, poll_interval=0.01).run(['a', 'b', 'c'], read)
+    assert results['b']['status'] == FAILED and 'no ODB for b' in results['b']['error']
+    assert results['b']['result'] is None
+    assert [results[name]['result'] for name in 'ac'] == ['A', 'C']
+    assert results['a']['status'] == COMPLETED and results['a']['error'] == ''
+    assert runner.processes == {}
+
+
+def test_resolve_command_batch_file(tmp_path, monkeypatch):
+    (tmp_path / 'abaqus.bat').write_text(u'@echo off\n')
+    monkeypatch.setattr(job_scheduler.os, 'name', 'nt')
+    monkeypatch.setenv('PATH', str(tmp_path))
+    monkeypatch.setenv('PATHEXT', '.COM;.EXE;.BAT;.CMD')
+    path = os.path.join(str(tmp_path), 'abaqus.bat')
+    assert resolve_command(['abaqus', 'job=a', 'interactive']) == ['cmd', '/c', path, 'job=a', 'interactive']
+    assert resolve_command(['missing', 'x']) == ['missing', 'x']
+
+
+def test_resolve_command_posix(monkeypatch):
+    monkeypatch.setattr(job_scheduler.os, 'name', 'posix')
+    assert resolve_command(['abaqus', 'python']) == ['abaqus', 'python']
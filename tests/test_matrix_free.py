@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+import scipy.sparse as sp
+
+from matrix_free import ElementOperator, ReducedOperator, pcg, solve_cases
+
+
+def strip_model(n=6, d=2, seed=0):
+    """n four-node elements in a strip of 2 (n + 1) nodes, random SPD element matrices"""
+    rng = np.random.RandomState(seed)
+    nodes = np.array([[i, i + 1, n + 2 + i, n + 1 + i] for i in range(n)])
+    dofs = (d * nodes[:, :, None] + np.arange(d)).reshape(n, -1)
+    a = rng.uniform(-1., 1., (n, 4 * d, 4 * d))
+    ke = np.einsum('mij,mkj->mik', a, a) + 0.1 * np.eye(4 * d)
+    ndof = d * 2 * (n + 1)
+    K = np.zeros((ndof, ndof))
+    for e in range(n):
+        K[np.ix_(dofs[e], dofs[e])] += ke[e]
+    return ElementOperator([(dofs, ke), (dofs[:0], ke[:0])], ndof), K
+
+
+def periodic_maps(nodes, d=2):
+    """T ties the last node to the first and a middle node to its neighbours
+    (weights 0.5, as an embedded node); G prescribes the first node"""
+    free = [node for node in range(1, nodes - 1) if node != 3]
+    column = dict((node, c) for c, node in enumerate(free))
+    links = [(node, column[node], 1.) for node in free]
+    links += [(3, column[2], 0.5), (3, column[4], 0.5), (nodes - 1, column[1], 1.)]
+    rows, cols, vals = zip(*links)
+    Tn = sp.csr_matrix((vals, (rows, cols)), shape=(nodes, len(free)))
+    G = sp.csr_matrix((np.ones(d), (np.arange(d), np.arange(d))), shape=(d * nodes, d))
+    return sp.kron(Tn, sp.identity(d)).tocsr(), G
+
+
+def test_element_operator_matches_the_assembled_matrix():
+    operator, K = strip_model()
+    x = np.random.RandomState(1).uniform(size=(K.shape[0], 3))
+    assert np.allclose(operator.dot(x[:, 0]), K.dot(x[:, 0]))
+    assert np.allclose(operator.dot(x), K.dot(x))
+    blocks = operator.node_blocks(2)
+    for node in range(K.shape[0] // 2):
+        assert np.allclose(blocks[node], K[2 * node:2 * node + 2, 2 * node:2 * node + 2])
+
+
+@pytest.mark.parametrize('preconditioner', ['jacobi', 'block'])
+def test_pcg_matches_the_dense_solve(preconditioner):
+    operator, K = strip_model()
+    T, G = periodic_maps(K.shape[0] // 2)
+    reduced = ReducedOperator(operator, T, G, 2, preconditioner)
+    h = np.array([0.3, -0.2])
+    Td, Gd = T.toarray(), G.toarray()
+    expected = np.linalg.solve(Td.T.dot(K).dot(Td), -Td.T.dot(K).dot(Gd.dot(h)))
+    x, residuals = pcg(reduced, reduced.rhs(h), tol=1e-12)
+    assert np.allclose(x, expected, atol=1e-9) and residuals[-1] <= 1e-12
+    u = Td.dot(x) + Gd.dot(h)
+    assert np.allclose(reduced.reactions(x, h), Gd.T.dot(K).dot(u), atol=1e-9)
+
+
+def test_block_preconditioner_inverts_the_tree_blocks():
+    operator, K = strip_model()
+    T, G = periodic_maps(K.shape[0] // 2)
+    block = ReducedOperator(operator, T, G, 2, 'block')
+    jacobi = ReducedOperator(operator, T, G, 2, 'jacobi')
+    # node blocks of K summed over each periodic tree, weights squared
+    Tn = T[::2, ::2].toarray()
+    summed = np.einsum('nr,nij->rij', Tn**2, operator.node_blocks(2))
+    assert np.allclose(np.einsum('nij,njk->nik', block.inverse, summed), np.eye(2))
+    assert np.allclose(jacobi.inverse[:, 0, 0] * summed[:, 0, 0], 1.) and np.all(jacobi.inverse[:, 0, 1] == 0.)
+    with pytest.raises(ValueError):
+        ReducedOperator(operator, T, G, 2, 'ilu')
+
+
+def test_pcg_zero_rhs_and_maxiter():
+    operator, K = strip_model()
+    T, G = periodic_maps(K.shape[0] // 2)
+    reduced = ReducedOperator(operator, T, G, 2)
+    x, residuals = pcg(reduced, np.zeros(T.shape[1]))
+    assert not x.any() and residuals == [0.]
+    with pytest.raises(RuntimeError):
+        pcg(reduced, reduced.rhs(np.array([1., 0.])), maxiter=1)
+
+
+def test_solve_cases_restarts_from_the_previous_solution():
+    operator, K = strip_model()
+    T, G = periodic_maps(K.shape[0] // 2)
+    reduced = ReducedOperator(operator, T, G, 2)
+    H = np.array([[1., 0.], [0., 1.]])
+    X, R, log = solve_cases(reduced, H, tol=1e-12)
+    assert [case['case'] for case in log] == [1, 2] and all(case['iterations'] > 0 for case in log)
+    X2, R2, log2 = solve_cases(reduced, H, X0=X, tol=1e-10)
+    assert all(case['iterations'] == 0 for case in log2)
+    assert np.allclose(X2, X) and np.allclose(R2, R)
@@ -0,0 +1,160 @@
+import numpy as np
+
+from odb_extraction import OdbExtractor, field_array, field_sum
+
+
+# Stand-ins shaped as the odbAccess objects: FieldBulkData blocks hold float32
+# arrays per instance and element type, FieldValue objects one value each.
+
+class Instance(object):
+    def __init__(self, name):
+        self.name = name
+
+
+class OdbSet(object):
+    """Assembly set: labels of its nodes or elements per instance name"""
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+        self.instanceNames = sorted(labels)
+
+
+class FieldBulkData(object):
+    def __init__(self, instance, data, nodeLabels=None, elementLabels=None, integrationPoints=None):
+        self.instance = instance
+        self.data = np.asarray(data, dtype=np.float32)
+        self.nodeLabels = None if nodeLabels is None else np.asarray(nodeLabels, dtype=np.int32)
+        self.elementLabels = None if elementLabels is None else np.asarray(elementLabels, dtype=np.int32)
+        self.integrationPoints = None if integrationPoints is None else np.asarray(integrationPoints, dtype=np.int32)
+
+    def labels(self):
+        return self.nodeLabels if self.nodeLabels is not None else self.elementLabels
+
+
+class FieldValue(object):
+    def __init__(self, instance, label, data):
+        self.instance = instance
+        self.nodeLabel = self.elementLabel = label
+        self.data = data
+
+
+class FieldOutput(object):
+    def __init__(self, blocks, bulk=True):
+        self.blocks = blocks
+        self.bulk = bulk
+
+    @property
+    def bulkDataBlocks(self):
+        return self.blocks if self.bulk else []
+
+    @property
+    def values(self):
+        values = []
+        for block in self.blocks:
+            for label, row in zip(block.labels(), block.data):
+                values.append(FieldValue(block.instance, int(label),
+                                         float(row[0]) if len(row) == 1 else tuple(row.tolist())))
+        return values
+
+    def getSubset(self, region):
+        blocks = []
+        for block in self.blocks:
+            wanted = region.labels.get(block.instance.name if block.instance else None, [])
+            keep = np.isin(block.labels(), wanted)
+            if keep.any():
+                rows = dict(data=block.data[keep])
+                if block.nodeLabels is not None:
+                    rows['nodeLabels'] = block.nodeLabels[keep]
+                else:
+                    rows['elementLabels'] = block.elementLabels[keep]
+                    rows['integrationPoints'] = block.integrationPoints[keep]
+                blocks.append(FieldBulkData(block.instance, **rows))
+        return FieldOutput(blocks, self.bulk)
+
+
+class LoadCase(object):
+    def __init__(self, name):
+        self.name = name
+
+
+class Frame(object):
+    def __init__(self, name, fieldOutputs):
+        self.loadCase = LoadCase(name) if name else None
+        self.fieldOutputs = fieldOutputs
+
+
+class Odb(object):
+    def __init__(self, nodeSets, elementSets, frames):
+        self.rootAssembly = type('OdbAssembly', (), {'nodeSets': nodeSets, 'elementSets': elementSets})()
+        self.steps = {'Step-1': type('OdbStep', (), {'frames': frames})()}
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+HOST = Instance('RVEPLUS-1')
+EMBEDDED = Instance('EMBEDDED-1')
+
+
+def ivol():
+    """IVOL of two element types in the host and one in the embedded part, two points per element"""
+    return FieldOutput([
+        FieldBulkData(HOST, [[0.1], [0.1], [0.2], [0.2]], elementLabels=[1, 1, 2, 2], integrationPoints=[1, 2, 1, 2]),
+        FieldBulkData(HOST, [[0.3], [0.3]], elementLabels=[3, 3], integrationPoints=[1, 2]),
+        FieldBulkData(EMBEDDED, [[5.], [5.]], elementLabels=[1, 1], integrationPoints=[1, 2]),
+    ])
+
+
+def rf(scale):
+    """RF of the host nodes, then of the assembly reference points (instance None)"""
+    return FieldOutput([
+        FieldBulkData(HOST, [[9., 9., 9.]] * 3, nodeLabels=[1, 2, 3]),
+        FieldBulkData(EMBEDDED, [[7., 7., 7.]], nodeLabels=[1]),
+        FieldBulkData(None, scale * np.array([[1., 2., 3.], [4., 5., 6.], [7., 8., 9.]]), nodeLabels=[1, 2, 3]),
+    ])
+
+
+def odb(bulk=True):
+    refs = dict(('REFMACRO%d' % k, OdbSet('REFMACRO%d' % k, {None: [k]})) for k in (1, 2, 3))
+    set1 = OdbSet('SET-1', {'RVEPLUS-1': [1, 2, 3]})
+    fields = [ivol(), rf(1.), rf(2.)]
+    for field in fields:
+        field.bulk = bulk
+    frames = [Frame(None, {'IVOL': fields[0], 'RF': fields[1]}),
+              Frame('LC1', {'IVOL': fields[0], 'RF': fields[1]}),
+              Frame('LC2', {'IVOL': fields[0], 'RF': fields[2]})]
+    return Odb(refs, {'SET-1': set1}, frames)
+
+
+def test_bulk_blocks_over_instances():
+    field = ivol()
+    assert np.isclose(field_sum(field), 11.2)
+    assert field_array(field).shape == (8, 1)
+    subset = field.getSubset(region=OdbSet('SET-1', {'RVEPLUS-1': [1, 2, 3]}))
+    assert len(subset.bulkDataBlocks) == 2
+    assert np.isclose(field_sum(subset), 1.2)
+
+
+def test_values_fallback():
+    bulk, values = ivol(), ivol()
+    values.bulk = False
+    assert values.bulkDataBlocks == []
+    assert np.isclose(field_sum(values), field_sum(bulk))
+    assert np.allclose(field_array(values), field_array(bulk))
+    bulk, values = rf(1.), rf(1.)
+    values.bulk = False
+    assert np.allclose(field_array(values), field_array(bulk))
+
+
+def test_extract_load_cases():
+    for bulk in (True, False):
+        model = odb(bulk)
+        extractor = OdbExtractor(3, opener=lambda path: model)
+        cases = extractor.extract('Job-1.odb', ['LC1', 'LC2'])
+        assert model.closed
+        assert np.allclose(cases[0][0], np.arange(1., 10.))
+        assert np.allclose(cases[1][0], 2 * np.arange(1., 10.))
+        assert np.isclose(cases[0][1], 1.2) and np.isclose(cases[1][1], 1.2)
+        reactions, volume = extractor.extract('Job-1.odb', volume=2.)[0]
+        assert np.allclose(reactions, 2 * np.arange(1., 10.)) and volume == 2.  # last frame
@@ -0,0 +1,28 @@
+import numpy as np
+
+from pbc_equations import face_sets_tolerance, insert_equations, periodic_links
+
+
+def square_grid(n=3):
+    """(labels, coords, NMIN*/NMAX* node sets) of an n x n node grid of a 2 x 1 rectangle"""
+    x, y = np.meshgrid(np.linspace(0., 2., n), np.linspace(0., 1., n), indexing='ij')
+    coords = np.column_stack([x.ravel(), y.ravel(), np.zeros(n * n)])
+    labels = np.arange(1, n * n + 1)
+    node_sets = {'NMINX': labels[coords[:, 0] == 0.], 'NMAXX': labels[coords[:, 0] == 2.],
+                 'NMINY': labels[coords[:, 1] == 0.], 'NMAXY': labels[coords[:, 1] == 1.]}
+    return labels, coords, node_sets
+
+
+def test_insert_equations_default_tolerance(tmp_path):
+    labels, coords, node_sets = square_grid()
+    path = tmp_path / 'sq-model.inp'
+    path.write_text('*Assembly, name=Assembly\n*End Assembly\n')
+    count = insert_equations(str(path), labels, coords, node_sets)
+    dependent, independent, dx = periodic_links(labels, coords, node_sets)
+    assert count == 2 * len(dependent) and len(dependent) == 5  # 3 pairs in x, 3 in y, one corner cycle
+    text = path.read_text()
+    assert text.index('*Equation') < text.index('*End Assembly')
+    # x offsets of 2 and y offsets of 1 get a REFMACRO term, the zero ones none
+    assert 'RefMacro1, 1, -2' in text and 'RefMacro1, 2, -1' in text
+    assert 'RefMacro1, 2, -0' not in text and 'RefMacro1, 1, -0' not in text
+    assert np.isclose(face_sets_tolerance(labels, coords, node_sets), 0.05)
@@ -0,0 +1,100 @@
+import numpy as np
+
+from pbc_tools import DofForest, pair_labels, pair_nodes
+
+
+def face_grid(n, x):
+    """n x n nodes of the face x = const of the unit cube"""
+    y, z = np.meshgrid(np.linspace(0., 1., n), np.linspace(0., 1., n), indexing='ij')
+    return np.column_stack([np.full(n * n, x), y.ravel(), z.ravel()])
+
+
+def test_pairs_within_tolerance_only():
+    c1 = np.array([[0., 0., 0.], [0., 1., 0.], [0., 2., 0.]])
+    c2 = c1 + [1., 0., 0.]
+    c2[1, 1] += 0.009  # within tol
+    c2[2, 1] += 0.011  # beyond tol
+    idx1, idx2 = pair_nodes(c1, c2, [1., 0., 0.], 0.01)
+    assert idx1.tolist() == [0, 1] and idx2.tolist() == [0, 1]
+
+
+def test_shuffled_faces_3d():
+    c1 = face_grid(6, 0.)
+    perm = np.random.RandomState(0).permutation(len(c1))
+    c2 = face_grid(6, 2.)[perm]
+    idx1, idx2 = pair_nodes(c1, c2, [2., 0., 0.], 1e-6)
+    assert np.array_equal(idx1, np.arange(len(c1)))
+    assert np.array_equal(perm[idx2], idx1)
+
+
+def test_translation_2d():
+    c1 = np.array([[0., 0.], [0.5, 0.], [1., 0.]])
+    c2 = c1[::-1] + [0., 3.]
+    idx1, idx2 = pair_nodes(c1, c2, [0., 3.], 1e-8)
+    assert idx1.tolist() == [0, 1, 2] and idx2.tolist() == [2, 1, 0]
+    # 2D coordinates and translation are padded with z = 0
+    labels1, labels2 = pair_labels([10, 11, 12], c1, [20, 21, 22], c2, (0., 3.), 1e-8)
+    assert labels1.tolist() == [10, 11, 12] and labels2.tolist() == [22, 21, 20]
+
+
+def test_duplicate_coordinates_first_match_wins():
+    # two nodes of set 1 at the same place compete for one node of set 2
+    c1 = np.array([[0., 0., 0.], [0., 0., 0.], [0., 1., 0.]])
+    c2 = np.array([[1., 0., 0.], [1., 1., 0.]])
+    idx1, idx2 = pair_nodes(c1, c2, [1., 0., 0.], 1e-6)
+    assert idx1.tolist() == [0, 2] and idx2.tolist() == [0, 1]
+    # duplicates in set 2: the first one is taken
+    c2 = np.array([[1., 1., 0.], [1., 0., 0.], [1., 0., 0.]])
+    idx1, idx2 = pair_nodes(c1[[0, 2]], c2, [1., 0., 0.], 1e-6)
+    assert idx1.tolist() == [0, 1] and idx2.tolist() == [1, 0]
+
+
+def test_empty_sets():
+    for c1, c2 in ((np.zeros((0, 3)), face_grid(2, 1.)), (face_grid(2, 0.), np.zeros((0, 3)))):
+        idx1, idx2 = pair_nodes(c1, c2, [1., 0., 0.], 1e-6)
+        assert len(idx1) == 0 and len(idx2) == 0
+
+
+def test_union_by_rank():
+    forest = DofForest()
+    assert forest.addBranch(['a', 'b'])  # equal ranks: a becomes the root
+    assert forest.find('b') == 'a' and forest.rank['a'] == 1
+    assert forest.addBranch(['c', 'a'])  # the lower tree goes under the higher one
+    assert forest.find('c') == 'a' and forest.rank['a'] == 1 and forest.rank['c'] == 0
+
+
+def test_path_compression():
+    forest = DofForest()
+    for node in 'abcd':
+        forest.find(node)
+    # a chain d -> c -> b -> a, as left by unions without rank
+    forest.parent.update({'b': 'a', 'c': 'b', 'd': 'c'})
+    assert forest.find('d') == 'a'
+    assert all(forest.parent[node] == 'a' for node in 'bcd')
+
+
+def test_corner_shared_by_faces_is_constrained_once():
+    # the corners of a square are paired along x, then along y: the last
+    # pair closes a cycle and must be refused
+    forest = DofForest()
+    assert forest.addBranch(['1', '2'])  # x: (0, 0) - (1, 0)
+    assert forest.addBranch(['4', '3'])  # x: (0, 1) - (1, 1)
+    assert forest.addBranch(['1', '4'])  # y: (0, 0) - (0, 1)
+    assert not forest.addBranch(['2', '3'])  # y: (1, 0) - (1, 1), already linked
+    roots = forest.roots()
+    assert len(set(roots.values())) == 1 and sorted(roots) == ['1', '2', '3', '4']
+
+
+def test_chains_eliminate_each_dof_once():
+    forest = DofForest()
+    pairs = [('1', '2'), ('3', '4'), ('1', '3'), ('2', '4'), ('5', '6'), ('6', '7'), ('5', '7'), ('8', '1')]
+    accepted = [p for p in pairs if forest.addBranch(list(p))]
+    assert len(accepted) == 6
+    chains = forest.chains()
+    dependent = [d for d, i in chains]
+    assert len(chains) == len(accepted) and len(set(dependent)) == len(dependent)
+    # the independent node of each tree is never eliminated, every other node is
+    roots = forest.roots()
+    assert set(dependent) == set(node for node in roots if roots[node] != node)
+    for d, i in chains:
+        assert roots[d] == roots[i]
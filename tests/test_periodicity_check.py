@@ -0,0 +1,85 @@
+import numpy as np
+
+from periodicity_check import characteristic_length, main, verify_periodicity
+from unv_to_inp_model import UnvData, write_inp_model
+
+
+def square_model(path, n=4, shift=0.):
+    """n x n quads of a unit square as a -model.inp, the node (1, 0.5) moved by shift along y"""
+    unv = UnvData()
+    for j in range(n + 1):
+        for i in range(n + 1):
+            y = j / float(n) + (shift if (i, 2 * j) == (n, n) else 0.)
+            unv.add_node(j * (n + 1) + i + 1, [i / float(n), y, 0.])
+    for j in range(n):
+        for i in range(n):
+            a = j * (n + 1) + i + 1
+            unv.add_element(j * n + i + 1, '94', [a, a + 1, a + n + 2, a + n + 1])
+            unv.add_to_group('MATRIX', j * n + i + 1)
+    write_inp_model(unv, path)
+    return path
+
+
+def cube_ver(path, n=3, shift=0.):
+    """n**3 unit hexahedra as a -VER.inp without node sets, the last node moved by shift along x"""
+    grid = np.arange(n + 1.)
+    z, y, x = np.meshgrid(grid, grid, grid, indexing='ij')
+    coords = np.column_stack([x.ravel(), y.ravel(), z.ravel()])
+    coords[-1, 0] += shift
+    index = lambda i, j, k: k * (n + 1) ** 2 + j * (n + 1) + i + 1
+    with open(path, 'w') as f:
+        f.write('*Node\n')
+        for label, c in enumerate(coords, 1):
+            f.write('%d, %.6f, %.6f, %.6f\n' % (label, c[0], c[1], c[2]))
+        f.write('*Element, type=C3D8R, ELSET=Matrix\n')
+        label = 1
+        for k in range(n):
+            for j in range(n):
+                for i in range(n):
+                    nodes = [index(i, j, k), index(i + 1, j, k), index(i + 1, j + 1, k), index(i, j + 1, k),
+                             index(i, j, k + 1), index(i + 1, j, k + 1), index(i + 1, j + 1, k + 1),
+                             index(i, j + 1, k + 1)]
+                    f.write('%d, %s\n' % (label, ', '.join(str(node) for node in nodes)))
+                    label += 1
+    return path
+
+
+def test_characteristic_length_skips_degenerate_edges():
+    coords = np.array([[0., 0.], [2., 0.], [2., 0.], [0., 3.]])
+    assert characteristic_length(coords, [('tri3', np.array([[0, 1, 3], [1, 2, 3]]))]) == 2.
+    assert characteristic_length(coords, []) == np.inf
+
+
+def test_periodic_square(tmp_path):
+    report = verify_periodicity(square_model(str(tmp_path / 'sq-model.inp')))
+    assert report['periodic'] and np.isclose(report['length'], 0.25) and np.isclose(report['tolerance'], 0.025)
+    for name in ('X', 'Y'):
+        axis = report['axes'][name]
+        assert axis['pairs'] == 5 and len(axis['unmatched_min']) == 0 and axis['max'] < 1e-12
+
+
+def test_perturbed_square(tmp_path):
+    path = square_model(str(tmp_path / 'sq-model.inp'), shift=0.05)
+    report = verify_periodicity(path)
+    assert not report['periodic'] and np.isclose(report['length'], 0.2)
+    x = report['axes']['X']
+    # node 15 at (1, 0.55) has no partner, nor its mirror, node 11 at (0, 0.5)
+    assert x['pairs'] == 4 and x['unmatched_min'].tolist() == [11] and x['unmatched_max'].tolist() == [15]
+    assert len(report['axes']['Y']['unmatched_min']) == 0
+    assert main([path]) == 1
+    # within the tolerance the pair is kept and the distance reported
+    report = verify_periodicity(square_model(str(tmp_path / 'small-model.inp'), shift=0.01))
+    assert report['periodic'] and np.isclose(report['axes']['X']['max'], 0.01)
+
+
+def test_cube_without_node_sets(tmp_path):
+    path = cube_ver(str(tmp_path / 'cube-VER.inp'))
+    report = verify_periodicity(path)
+    assert report['periodic'] and sorted(report['axes']) == ['X', 'Y', 'Z']
+    assert all(axis['pairs'] == 16 for axis in report['axes'].values())
+    assert main([path]) == 0
+    report = verify_periodicity(cube_ver(str(tmp_path / 'bad-VER.inp'), shift=0.2))
+    # the moved corner leaves the bounding box: the X faces are no longer found,
+    # the Y and Z faces lose the corner
+    assert not report['periodic']
+    assert report['axes']['Y']['unmatched_max'].tolist() == [64]